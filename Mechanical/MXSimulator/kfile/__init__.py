@@ -0,0 +1,14 @@
+"""
+MX Digital Twin - LS-DYNA k-file tools
+
+core       : mesh tables, card writers and the .kdump mesh dump (IronPython + CPython)
+meshdata   : MeshData readers -> core tables (IronPython + CPython)
+contacts   : contact regions -> master/slave segment sets, whole-part sides
+transform  : spatial index, coincident-node merge, id compaction / RCM renumbering
+incremental: content-hashed *INCLUDE files rewritten only when changed (.kmanifest.json)
+snapshot   : mesh snapshot cache keyed by a mesh signature (.kdump)
+instrument : per-phase export timing / memory profile (.kprofile.json)
+reader     : streaming .k reader + referential-integrity validator
+bench      : export phase benchmark on a synthetic MeshData (CPython)
+cli        : headless exporter, run as  python -m kfile --help
+"""
@@ -0,0 +1,5 @@
+import sys
+
+from kfile.cli import main
+
+sys.exit(main())
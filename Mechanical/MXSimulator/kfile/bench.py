@@ -0,0 +1,455 @@
+# encoding: utf-8
+"""
+Export K-File benchmark (CPython 3).
+
+Drives the export phases of ExportKFileDialog - nodes, elements,
+materials, sets, contacts - against a synthetic MeshData stand-in, so
+scalability can be measured without a Mechanical session:
+
+    cd Mechanical/MXSimulator
+    python -m kfile bench --sizes 10k,100k,1M --kinds hex,tet
+    python -m kfile bench --baseline bench.json --save    # record
+    python -m kfile bench --baseline bench.json           # compare
+
+Each phase times the MeshData read (kfile.meshdata and kfile.contacts,
+the same code the dialog runs) and the card writer (kfile.core)
+separately and records the Python heap high-water mark (tracemalloc, in
+a separate pass). With --baseline every phase is compared against the
+stored numbers; a phase that got slower or bigger than --tolerance is
+reported and the exit status is 1.
+"""
+
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from kfile import contacts
+from kfile import core
+from kfile import meshdata
+
+
+ELEM_SIZE = 0.001    # m; one grid cell
+PHASES = ('nodes', 'elements', 'materials', 'sets', 'contacts')
+
+# Kuhn split of a cube into 6 tets sharing the 0-7 diagonal; corner bit
+# 1 = +x, 2 = +y, 4 = +z, so neighbouring cubes stay conforming.
+_KUHN = [(0, 1, 3, 7), (0, 1, 5, 7), (0, 2, 3, 7),
+         (0, 2, 6, 7), (0, 4, 5, 7), (0, 4, 6, 7)]
+
+# region id -> (body index, block face); see SyntheticMeshData
+_REGIONS = {1: (0, 'bottom'), 2: (1, 'top'), 3: (0, 'top'),
+            4: (1, 'bottom'), 5: (0, 'x0'), 6: (1, 'x0')}
+
+
+# ── Synthetic MeshData ────────────────────────────────────────────────────
+
+class _Node(object):
+    __slots__ = ('Id', 'X', 'Y', 'Z')
+
+    def __init__(self, nid, x, y, z):
+        self.Id, self.X, self.Y, self.Z = nid, x, y, z
+
+
+class _Element(object):
+    __slots__ = ('Id', 'PartId', 'NodeIds', 'ElementType')
+
+    def __init__(self, eid, pid, nids, etype):
+        self.Id, self.PartId, self.NodeIds, self.ElementType = eid, pid, nids, etype
+
+
+class _RegionNodes(object):
+    """KeyValuePair<int, IList<int>> as returned by GetNodeIdsFromRegionIds."""
+    __slots__ = ('Key', 'Value')
+
+    def __init__(self, key, value):
+        self.Key, self.Value = key, value
+
+
+class SyntheticMeshData(object):
+    """
+    MeshData stand-in: two stacked nx x ny x nz_body blocks (bodies 1, 2)
+    with their own nodes, so the shared face is a real contact interface.
+    Nodes and elements are built on demand in NodeById / ElementById,
+    like the proxies the Mechanical API hands out, so a 5M element mesh
+    costs no memory until the reader stores it.
+
+    Geometry regions (GetNodeIdsFromRegionIds):
+      1 body 1 bottom   2 body 2 top
+      3 body 1 top      4 body 2 bottom     (bonded interface)
+      5 body 1 x = 0    6 body 2 x = 0
+    """
+
+    def __init__(self, kind, nx, ny, nz_body):
+        self.kind = kind
+        self.nx, self.ny, self.nzb = nx, ny, nz_body
+        self.per_cell = 6 if kind == 'tet' else 1
+        self._etype = 'kTet4' if kind == 'tet' else 'kHex8'
+        self._nodes_body = (nx + 1) * (ny + 1) * (nz_body + 1)
+        self._cells_body = nx * ny * nz_body
+        self.api_calls = 0
+
+    @classmethod
+    def for_size(cls, kind, n_elems):
+        """Block whose element count is close to n_elems."""
+        cells = max(2, n_elems // (6 if kind == 'tet' else 1))
+        n = max(1, int(round(cells ** (1.0 / 3.0))))
+        nz_body = max(1, int(round(cells / float(2 * n * n))))
+        return cls(kind, n, n, nz_body)
+
+    @property
+    def NodeCount(self):
+        return 2 * self._nodes_body
+
+    @property
+    def ElementCount(self):
+        return 2 * self._cells_body * self.per_cell
+
+    def _nid(self, body, i, j, k):
+        return 1 + body * self._nodes_body + i + (self.nx + 1) * (j + (self.ny + 1) * k)
+
+    def NodeById(self, nid):
+        self.api_calls += 1
+        body, r = divmod(nid - 1, self._nodes_body)
+        if not 0 <= body < 2:
+            raise KeyError(nid)
+        r, i = divmod(r, self.nx + 1)
+        k, j = divmod(r, self.ny + 1)
+        return _Node(nid, i * ELEM_SIZE, j * ELEM_SIZE,
+                     (k + body * self.nzb) * ELEM_SIZE)
+
+    def ElementById(self, eid):
+        self.api_calls += 1
+        body, r = divmod(eid - 1, self._cells_body * self.per_cell)
+        if not 0 <= body < 2:
+            raise KeyError(eid)
+        cell, t = divmod(r, self.per_cell)
+        r, i = divmod(cell, self.nx)
+        k, j = divmod(r, self.ny)
+        c = [self._nid(body, i + (b & 1), j + ((b >> 1) & 1), k + (b >> 2))
+             for b in range(8)]
+        if self.kind == 'tet':
+            nids = [c[b] for b in _KUHN[t]]
+        else:
+            nids = [c[0], c[1], c[3], c[2], c[4], c[5], c[7], c[6]]
+        return _Element(eid, body + 1, nids, self._etype)
+
+    def _region(self, rid):
+        body, face = _REGIONS[rid]
+        if face == 'x0':
+            return [self._nid(body, 0, j, k)
+                    for k in range(self.nzb + 1) for j in range(self.ny + 1)]
+        k = self.nzb if face == 'top' else 0
+        return [self._nid(body, i, j, k)
+                for j in range(self.ny + 1) for i in range(self.nx + 1)]
+
+    def GetNodeIdsFromRegionIds(self, region_ids):
+        self.api_calls += 1
+        for rid in region_ids:
+            if rid not in _REGIONS:
+                raise KeyError(rid)
+        return [_RegionNodes(rid, self._region(rid)) for rid in region_ids]
+
+
+# ── Synthetic model tree ──────────────────────────────────────────────────
+
+class _Location(object):
+    def __init__(self, ids):
+        self.Ids = ids
+
+
+class _NamedSelection(object):
+    def __init__(self, name, ids):
+        self.Name, self.Location = name, _Location(ids)
+
+    def Generate(self):
+        pass
+
+
+class _ContactRegion(object):
+    def __init__(self, name, source, target, contact_type, mu=0.0):
+        self.Name, self.ContactType, self.FrictionCoefficient = name, contact_type, mu
+        self.SourceLocation, self.TargetLocation = _Location(source), _Location(target)
+
+
+class _Folder(object):
+    def __init__(self, children):
+        self._children = children
+
+    def GetChildren(self, category, recursive):
+        return list(self._children)
+
+
+class SyntheticModel(object):
+    """Model stand-in with the NS and contact regions of SyntheticMeshData."""
+
+    def __init__(self):
+        self.NamedSelections = _Folder([
+            _NamedSelection("Fixed", [1]),
+            _NamedSelection("Load", [2]),
+            _NamedSelection("Sides", [5, 6]),
+        ])
+        self.Connections = _Folder([
+            _ContactRegion("Bonded_1_2", [3], [4], "Bonded"),
+            _ContactRegion("Frictional_sides", [5], [6], "Frictional", 0.2),
+        ])
+        self.body_pid_map = {"Body_1": 1, "Body_2": 2}
+        # (mid, comment, rho, E, nu) in mm-tonne-s, as _read_materials returns
+        self.mat_rows = [(1, "Body_1: Structural Steel", 7.85e-9, 2.0e5, 0.3),
+                         (2, "Body_2: Aluminum Alloy", 2.77e-9, 7.1e4, 0.33)]
+
+
+# ── Phases ────────────────────────────────────────────────────────────────
+
+class _PhaseTimer(object):
+    """Wall time of the read and write halves of one phase + heap peak."""
+
+    def __init__(self, trace):
+        self.trace = trace
+        self.result = {}
+
+    def run(self, name, read, write):
+        if self.trace:
+            tracemalloc.reset_peak()
+        t0 = time.perf_counter()
+        data = read()
+        t1 = time.perf_counter()
+        write(data)
+        t2 = time.perf_counter()
+        row = {'read_s': round(t1 - t0, 4), 'write_s': round(t2 - t1, 4),
+               'total_s': round(t2 - t0, 4)}
+        if self.trace:
+            row['peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 1048576.0, 2)
+        self.result[name] = row
+        return data
+
+
+def _export_phases(kind, n_elems, threads, trace, path):
+    """Export one synthetic mesh phase by phase -> (timer, mesh, node/elem counts)."""
+    mesh = SyntheticMeshData.for_size(kind, n_elems)
+    model = SyntheticModel()
+    timer = _PhaseTimer(trace)
+    tables = {}
+
+    def read_sets():
+        # Same batching as _prefetch_region_nodes + _read_named_selections
+        resolver = meshdata.RegionNodeResolver(mesh)
+        ns_list = model.NamedSelections.GetChildren(None, True)
+        cr_list = model.Connections.GetChildren(None, True)
+        for ns in ns_list:
+            ns.Generate()
+            resolver.request(ns.Location.Ids)
+        for cr in cr_list:
+            resolver.request(cr.SourceLocation.Ids)
+            resolver.request(cr.TargetLocation.Ids)
+        resolver.resolve()
+        tables['resolver'] = resolver
+        return [(ns.Name, resolver.nodes(ns.Location.Ids)) for ns in ns_list]
+
+    def read_contacts():
+        # Same steps as the dialog's contacts + part_sides phases
+        surface_faces = core.extract_boundary_faces(tables['elements'])
+        regions = contacts.read_contact_regions(
+            model.Connections.GetChildren(None, True), tables['resolver'])
+        pairs = contacts.pair_contacts(regions, surface_faces, tables['nodes'])
+        contacts.mark_whole_part_sides(tables['elements'], surface_faces, pairs)
+        return surface_faces, pairs
+
+    if trace:
+        tracemalloc.start()
+    try:
+        with core.KFileWriter(path) as out:
+            for line in core.deck_header("mm-tonne-s"):
+                out.append(line)
+            tables['nodes'] = timer.run(
+                'nodes', lambda: meshdata.read_nodes(mesh),
+                lambda t: core.write_nodes(out, t, 1000.0, threads))
+            tables['elements'] = timer.run(
+                'elements', lambda: meshdata.read_elements(mesh),
+                lambda t: core.write_elements_parts(
+                    out, t, model.body_pid_map, threads))
+            timer.run('materials', lambda: model.mat_rows,
+                      lambda rows: core.write_materials(out, rows))
+            timer.run('sets', read_sets,
+                      lambda ns_sets: core.write_named_selections(out, ns_sets))
+            timer.run('contacts', read_contacts,
+                      lambda data: core.write_contacts(out, data[0], data[1]))
+            out.append("*END")
+    finally:
+        if trace:
+            tracemalloc.stop()
+    return timer, mesh, len(tables['nodes']), len(tables['elements'])
+
+
+def run_case(kind, n_elems, threads, trace, out_dir):
+    """
+    Time one synthetic export; returns the case record. tracemalloc slows
+    allocation-heavy phases several-fold, so peak memory comes from a
+    second, traced pass and never skews the timings.
+    """
+    path = os.path.join(out_dir, "{0}_{1}.k".format(kind, n_elems))
+    t0 = time.perf_counter()
+    timer, mesh, n_nodes, n_read = _export_phases(kind, n_elems, threads, False, path)
+    elapsed = time.perf_counter() - t0
+    record = {
+        'kind': kind, 'nodes': n_nodes, 'elements': n_read,
+        'api_calls': mesh.api_calls, 'total_s': round(elapsed, 4),
+        'file_mb': round(os.path.getsize(path) / 1048576.0, 2),
+        'phases': timer.result,
+    }
+    if trace:
+        traced = _export_phases(kind, n_elems, threads, True, path)[0]
+        for name, row in traced.result.items():
+            record['phases'][name]['peak_mb'] = row['peak_mb']
+        record['peak_mb'] = max(row['peak_mb'] for row in traced.result.values())
+    return record
+
+
+# ── Baselines ─────────────────────────────────────────────────────────────
+
+def parse_size(text):
+    """'10k' -> 10000, '1.5M' -> 1500000."""
+    text = text.strip().lower()
+    mult = {'k': 1000, 'm': 1000000}.get(text[-1:], 1)
+    if mult > 1:
+        text = text[:-1]
+    return int(float(text) * mult)
+
+
+def environment(threads, trace):
+    return {'python': platform.python_implementation() + " " + platform.python_version(),
+            'platform': platform.platform(), 'cpus': os.cpu_count(),
+            'threads': threads, 'tracemalloc': trace}
+
+
+def compare(cases, baseline, tolerance, min_seconds=0.05, min_mb=1.0):
+    """
+    Rows of (case, phase, metric, now, base, delta %) for every metric
+    that exceeds its baseline by more than tolerance (and by more than the
+    absolute noise floor min_seconds / min_mb).
+    """
+    regressions = []
+    for name, case in sorted(cases.items()):
+        base = baseline.get('cases', {}).get(name)
+        if not base:
+            continue
+        rows = [(phase, case['phases'][phase], base['phases'].get(phase, {}))
+                for phase in PHASES]
+        rows.append(('(all)', case, base))
+        for phase, now, ref in rows:
+            for metric, floor in (('total_s', min_seconds), ('peak_mb', min_mb)):
+                if metric not in now or not ref.get(metric):
+                    continue
+                delta = now[metric] - ref[metric]
+                if delta > floor and delta > tolerance * ref[metric]:
+                    regressions.append((name, phase, metric, now[metric],
+                                        ref[metric], 100.0 * delta / ref[metric]))
+    return regressions
+
+
+def format_table(cases, baseline):
+    base_cases = (baseline or {}).get('cases', {})
+    lines = ["{0:<14}{1:<10}{2:>9}{3:>9}{4:>9}{5:>9}{6:>10}{7:>9}".format(
+        "case", "phase", "read s", "write s", "total s", "peak MB", "base s", "delta")]
+    for name, case in sorted(cases.items(), key=lambda kv: kv[1]['elements']):
+        for phase in PHASES:
+            p = case['phases'][phase]
+            ref = base_cases.get(name, {}).get('phases', {}).get(phase, {})
+            base_s, delta = "", ""
+            if ref.get('total_s'):
+                base_s = "{0:.3f}".format(ref['total_s'])
+                delta = "{0:+.0f}%".format(
+                    100.0 * (p['total_s'] - ref['total_s']) / ref['total_s'])
+            lines.append("{0:<14}{1:<10}{2:>9.3f}{3:>9.3f}{4:>9.3f}{5:>9}{6:>10}{7:>9}".format(
+                name, phase, p['read_s'], p['write_s'], p['total_s'],
+                p.get('peak_mb', "-"), base_s, delta))
+    return lines
+
+
+def cmd_bench(args):
+    sizes = [(s.strip(), parse_size(s)) for s in args.sizes.split(',') if s.strip()]
+    kinds = [k.strip() for k in args.kinds.split(',') if k.strip()]
+    for k in kinds:
+        if k not in ('hex', 'tet'):
+            print("ERROR: unknown mesh kind '{0}' (hex, tet)".format(k))
+            return 2
+    trace = not args.no_memory
+
+    baseline = None
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('environment', {}).get('tracemalloc') != trace:
+            print("WARNING: baseline was recorded with tracemalloc={0}; "
+                  "timings are not comparable".format(not trace))
+
+    out_dir = args.keep or tempfile.mkdtemp(prefix="kbench_")
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+    cases = {}
+    try:
+        for kind in kinds:
+            for label, n in sizes:
+                name = "{0}-{1}".format(kind, label)
+                print("{0}: running...".format(name))
+                case = run_case(kind, n, args.threads, trace, out_dir)
+                print("{0}: {1} elements, {2} nodes, {3:.2f} s, {4} MB deck".format(
+                    name, case['elements'], case['nodes'], case['total_s'],
+                    case['file_mb']))
+                cases[name] = case
+    finally:
+        if not args.keep:
+            shutil.rmtree(out_dir, ignore_errors=True)
+
+    print("")
+    for line in format_table(cases, baseline):
+        print(line)
+
+    status = 0
+    if baseline is not None:
+        regressions = compare(cases, baseline, args.tolerance)
+        print("")
+        if regressions:
+            print("REGRESSIONS (> {0:.0f}% over baseline):".format(100 * args.tolerance))
+            for name, phase, metric, now, ref, pct in regressions:
+                print("  {0:<14}{1:<10}{2:<8}{3:>10} vs {4:<10}{5:+.0f}%".format(
+                    name, phase, metric, now, ref, pct))
+            status = 1
+        else:
+            print("No regressions against {0}".format(args.baseline))
+
+    if args.save:
+        if not args.baseline:
+            print("ERROR: --save needs --baseline FILE")
+            return 2
+        stored = baseline if baseline is not None else {'version': 1, 'cases': {}}
+        stored['environment'] = environment(args.threads, trace)
+        stored['recorded'] = time.strftime("%Y-%m-%d %H:%M:%S")
+        stored['cases'].update(cases)
+        with open(args.baseline, 'w') as f:
+            json.dump(stored, f, indent=1, sort_keys=True)
+        print("Baseline saved: {0} ({1} cases)".format(
+            args.baseline, len(stored['cases'])))
+    return status
+
+
+def add_parser(sub):
+    p = sub.add_parser("bench", help="time the export phases on synthetic meshes")
+    p.add_argument("--sizes", default="10k,100k",
+                   help="comma-separated element counts, e.g. 10k,100k,1M,5M")
+    p.add_argument("--kinds", default="hex,tet", help="hex, tet or both")
+    p.add_argument("--threads", type=int, default=1,
+                   help="formatting worker processes (default: 1)")
+    p.add_argument("--baseline", help="baseline JSON to compare against (and --save to)")
+    p.add_argument("--save", action="store_true",
+                   help="store this run's numbers in --baseline")
+    p.add_argument("--tolerance", type=float, default=0.2,
+                   help="allowed slowdown / growth before a regression (default: 0.2)")
+    p.add_argument("--no-memory", action="store_true",
+                   help="skip tracemalloc (faster, no peak memory figures)")
+    p.add_argument("--keep", metavar="DIR", help="keep the written decks in DIR")
+    p.set_defaults(func=cmd_bench)
+    return p
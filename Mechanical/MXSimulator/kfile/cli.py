@@ -0,0 +1,184 @@
+# encoding: utf-8
+"""
+Headless LS-DYNA k-file exporter (CPython 3).
+
+Turns a mesh dump written by Export K-File ("Also write mesh dump") into
+the same deck Mechanical would write, without a Mechanical session:
+
+    cd Mechanical/MXSimulator
+    python -m kfile export model.kdump -o model.k [--include] [--threads 8]
+
+python -m kfile check model.k validates a written deck (see kfile.reader);
+python -m kfile bench times the export phases on synthetic meshes
+(see kfile.bench).
+
+Card formatting runs in forked worker processes when --threads > 1.
+NumPy, when installed, vectorises the dump integrity check and the
+*NODE card scaling / formatting.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from kfile import bench, core, reader, transform
+
+
+def _dangling_node_refs(dump):
+    """Node ids referenced by elements or sets but missing from *NODE."""
+    refs = [dump.elem_table.conn]
+    if dump.ns_sets:
+        refs += [ids for _name, ids in dump.ns_sets]
+    if dump.surface_faces is not None:
+        refs.append(dump.surface_faces.nodes)
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+    if np is not None:
+        known = np.frombuffer(dump.node_table.ids, dtype=np.intc)
+        used = np.unique(np.concatenate(
+            [np.frombuffer(a, dtype=np.intc) for a in refs if len(a)] or
+            [np.zeros(0, dtype=np.intc)]))
+        missing = np.setdiff1d(used[used != 0], known, assume_unique=True)
+        return [int(n) for n in missing]
+    known = set(dump.node_table.ids)
+    used = set()
+    for a in refs:
+        used.update(a)
+    used.discard(0)   # padding in triangle faces
+    return sorted(used - known)
+
+
+def cmd_export(args):
+    t0 = time.time()
+    dump = core.read_dump(args.dump)
+    out_path = args.output or os.path.splitext(args.dump)[0] + ".k"
+    print("Dump: {0} nodes, {1} elements, {2} parts ({3})".format(
+        len(dump.node_table), len(dump.elem_table), len(dump.body_pid_map),
+        dump.unit_label))
+
+    missing = _dangling_node_refs(dump)
+    if missing:
+        print("ERROR: {0} referenced node ids missing from the dump, e.g. {1}".format(
+            len(missing), missing[:10]))
+        return 1
+
+    node_table, elem_table = dump.node_table, dump.elem_table
+    ns_sets, surface_faces, contacts = dump.ns_sets, dump.surface_faces, dump.contacts
+    if args.merge_tol and contacts:
+        merger, contacts = transform.merge_bonded_contacts(
+            node_table, surface_faces, contacts, args.merge_tol / 1000.0, log=print)
+        if merger.n_merged:
+            if merger.apply(elem_table):
+                print("WARNING: elements collapsed by the merge"
+                      " - reduce --merge-tol")
+            node_table, elem_table = merger.node_table, merger.elem_table
+            if ns_sets is not None:
+                ns_sets = [(name, merger.node_ids(ids)) for name, ids in ns_sets]
+            surface_faces = merger.boundary_faces(surface_faces)
+            # Merged faces are interior now: list every side segment by segment
+            for c in contacts:
+                c['slave_pid'] = c['master_pid'] = 0
+    if args.renumber or args.rcm:
+        renum = transform.Renumbering(node_table, elem_table, rcm=args.rcm)
+        node_table, elem_table = renum.node_table, renum.elem_table
+        if ns_sets is not None:
+            ns_sets = [(name, renum.node_ids(ids)) for name, ids in ns_sets]
+        if surface_faces is not None:
+            surface_faces = renum.boundary_faces(surface_faces)
+        print("Renumbered{0}: bandwidth {1} -> {2}, profile {3} -> {4}".format(
+            " (RCM)" if renum.rcm else "",
+            renum.before[0], renum.after[0], renum.before[1], renum.after[1]))
+
+    contact_data = (surface_faces, contacts) if contacts is not None else None
+    sections = core.deck_sections(
+        node_table, elem_table, dump.body_pid_map, dump.scale,
+        args.threads, dump.mat_rows, ns_sets, contact_data,
+        not args.no_compact_sets)
+    header = core.deck_header(dump.unit_label)
+    out_dir = os.path.dirname(os.path.abspath(out_path))
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+    if args.include:
+        written = core.write_include_deck(out_path, header, sections, args.threads)
+    else:
+        written = core.write_deck(out_path, header, sections)
+    for f in written:
+        print("Saved: {0:.1f} KB  ->  {1}".format(os.path.getsize(f) / 1024.0, f))
+    print("Done in {0:.2f} s".format(time.time() - t0))
+    if args.check:
+        return _report(reader.validate(reader.read_deck(out_path, args.threads)))
+    return 0
+
+
+def _report(report):
+    print(report.summary())
+    for msg in report.warnings:
+        print("WARNING: " + msg)
+    for msg in report.errors:
+        print("ERROR: " + msg)
+    print("OK" if report.ok else "{0} error(s)".format(len(report.errors)))
+    return 0 if report.ok else 1
+
+
+def cmd_check(args):
+    t0 = time.time()
+    try:
+        deck = reader.read_deck(args.deck, args.workers)
+    except (IOError, OSError, ValueError) as ex:
+        print("ERROR: cannot read {0}: {1}".format(args.deck, ex))
+        return 1
+    t1 = time.time()
+    report = reader.validate(deck)
+    status = _report(report)
+    print("Read {0:.2f} s, validated {1:.2f} s".format(t1 - t0, time.time() - t1))
+    return status
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m kfile", description="MX Digital Twin LS-DYNA k-file tools")
+    sub = parser.add_subparsers(dest="command")
+
+    p = sub.add_parser("export", help="write a .k deck from a .kdump mesh dump")
+    p.add_argument("dump", help="mesh dump written by Export K-File")
+    p.add_argument("-o", "--output", help="output .k path (default: next to the dump)")
+    p.add_argument("--include", action="store_true",
+                   help="master deck + one *INCLUDE file per section")
+    p.add_argument("--threads", type=int, default=os.cpu_count() or 1,
+                   help="formatting worker processes (default: CPU count)")
+    p.add_argument("--no-compact-sets", action="store_true",
+                   help="list every node id instead of *SET_NODE_LIST_GENERATE ranges")
+    p.add_argument("--merge-tol", type=float, metavar="MM",
+                   help="merge coincident nodes of bonded (tied) contacts within MM millimeters")
+    p.add_argument("--renumber", action="store_true",
+                   help="compact node / element ids to 1..N")
+    p.add_argument("--rcm", action="store_true",
+                   help="renumber nodes in Reverse Cuthill-McKee order (implies --renumber)")
+    p.add_argument("--check", action="store_true",
+                   help="validate the written deck (same as the check command)")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("check", help="validate node / set / part references of a .k deck")
+    p.add_argument("deck", help=".k deck (its *INCLUDE files are followed)")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                   help="processes parsing *NODE / *ELEMENT blocks (default: CPU count)")
+    p.set_defaults(func=cmd_check)
+
+    bench.add_parser(sub)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not getattr(args, "func", None):
+        parser.print_help()
+        return 2
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
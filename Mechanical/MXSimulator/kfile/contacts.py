@@ -0,0 +1,196 @@
+# encoding: utf-8
+"""
+MX Digital Twin - contact regions -> segment sets
+
+Reads Mechanical Contact Regions into plain dicts, pairs each side with
+the boundary faces it covers (finer mesh = slave) and marks sides that
+are exactly one part's boundary. Shared by ExportKFileDialog and the
+export benchmark, so both time and write the same contact cards.
+IronPython + CPython; the model objects are only duck-typed.
+"""
+
+from array import array
+
+from kfile import core
+from kfile import meshdata
+
+
+# Contact sides whose mean edge lengths differ more than this are logged
+DENSITY_MISMATCH = 3.0
+
+SEG_ID_START = 100   # well above the *SET_NODE_TITLE ids
+
+
+def _no_log(msg):
+    pass
+
+
+# ── Contact regions ───────────────────────────────────────────────────────
+
+def region_nodes(selection_info, resolver):
+    """Sorted node ids of a SelectionInfo region (resolver cache)."""
+    try:
+        region_ids = list(selection_info.Ids)
+        if not region_ids:
+            return array('i')
+        return resolver.nodes(region_ids)
+    except Exception:
+        return array('i')
+
+
+def in_node_table(cr, node_table, resolver):
+    """True when both sides of a contact region lie inside node_table."""
+    try:
+        return all(meshdata.contains_all(node_table,
+                                         resolver.nodes(list(getattr(cr, loc).Ids)))
+                   for loc in ('SourceLocation', 'TargetLocation'))
+    except Exception:
+        return False
+
+
+def read_contact_regions(cr_list, resolver, subset_table=None, log=None):
+    """
+    Read Contact Regions into plain dicts for pair_contacts: name, kw, mu,
+    seg_id and the sorted node ids of each side. Region nodes come from a
+    resolver that already has every side's region ids resolved.
+    subset_table: when a body subset is exported, its NodeTable; contacts
+    with a side outside it are skipped.
+    """
+    log = log or _no_log
+    seg_id = SEG_ID_START
+    regions = []
+    for cr in cr_list:
+        try:
+            cr_name = cr.Name
+        except Exception:
+            cr_name = "Contact_{0}".format(seg_id // 2)
+        if subset_table is not None and not in_node_table(cr, subset_table, resolver):
+            log("  [CONTACT] {0}: extends outside the subset (skipped)".format(
+                cr_name))
+            seg_id += 2
+            continue
+        try:
+            source = region_nodes(cr.SourceLocation, resolver)
+            target = region_nodes(cr.TargetLocation, resolver)
+        except Exception as ex:
+            log("  [CONTACT] Geometry read failed for {0}: {1}".format(
+                cr_name, ex))
+            seg_id += 2
+            continue
+
+        ct = ""
+        try:
+            ct = str(cr.ContactType)
+        except Exception:
+            pass
+        kw = ("*CONTACT_TIED_SURFACE_TO_SURFACE"
+              if 'Bonded' in ct
+              else "*CONTACT_AUTOMATIC_SURFACE_TO_SURFACE")
+        mu = 0.0
+        if 'Frictional' in ct:
+            try:
+                mu = float(cr.FrictionCoefficient)
+            except Exception:
+                mu = 0.3
+        regions.append({'name': cr_name, 'kw': kw, 'mu': mu, 'seg_id': seg_id,
+                        'source': source, 'target': target})
+        seg_id += 2
+    return regions
+
+
+# ── Segment sets ──────────────────────────────────────────────────────────
+
+def pair_contacts(regions, surface_faces, node_table, log=None):
+    """
+    Build the segment sets of read_contact_regions output.
+    Returns a list of contact dicts for core.write_contacts; master/slave
+    is decided here (finer mesh = slave). Tables only.
+    """
+    log = log or _no_log
+    if not regions:
+        return []
+
+    # Edge lengths of all boundary faces, once; each side aggregates from it
+    edges = core.FaceEdgeStats(surface_faces, node_table)
+
+    contacts = []
+    for reg in regions:
+        cr_name, seg_id = reg['name'], reg['seg_id']
+        contact_faces = meshdata.region_faces(surface_faces, reg['source'])
+        target_faces  = meshdata.region_faces(surface_faces, reg['target'])
+        if not contact_faces and not target_faces:
+            log("  [CONTACT] No segments matched: " + cr_name)
+            continue
+
+        # Master/Slave: finer mesh (smaller mean edge length) = Slave
+        stats_c = edges.region(contact_faces)
+        stats_t = edges.region(target_faces)
+        size_c = stats_c[0] if stats_c[3] else 1.0
+        size_t = stats_t[0] if stats_t[3] else 1.0
+        if size_c <= size_t:
+            slave_faces,  slave_id  = contact_faces, seg_id
+            master_faces, master_id = target_faces,  seg_id + 1
+            log("  {0}: Contact=Slave(size={1:.5f}), Target=Master".format(
+                cr_name, size_c))
+        else:
+            master_faces, master_id = contact_faces, seg_id
+            slave_faces,  slave_id  = target_faces,  seg_id + 1
+            log("  {0}: Contact=Master, Target=Slave(size={1:.5f})".format(
+                cr_name, size_t))
+        _log_edge_stats(log, cr_name, stats_c, stats_t)
+
+        kw = reg['kw']
+        contacts.append({
+            'name': cr_name, 'kw': kw, 'mu': reg['mu'],
+            'slave_id': slave_id, 'slave': slave_faces,
+            'master_id': master_id, 'master': master_faces,
+        })
+        log("  -> {0} (SSID={1} MSID={2})".format(kw, slave_id, master_id))
+
+    return contacts
+
+
+def _log_edge_stats(log, cr_name, stats_c, stats_t):
+    """Log per-side edge length mean/min/max (mm); warn when the two
+    sides' mean edge lengths differ by more than DENSITY_MISMATCH."""
+    for side, (mean, lo, hi, n) in (("Contact", stats_c), ("Target", stats_t)):
+        if n:
+            log("    {0}: edge mean {1:.4g} / min {2:.4g} / max {3:.4g} mm"
+                " ({4} edges)".format(side, mean * 1e3, lo * 1e3, hi * 1e3, n))
+    if stats_c[3] and stats_t[3]:
+        ratio = max(stats_c[0], stats_t[0]) / max(min(stats_c[0], stats_t[0]), 1e-30)
+        if ratio > DENSITY_MISMATCH:
+            log("  WARNING: {0}: contact/target mesh density differs {1:.1f}x"
+                " - refine the coarser side".format(cr_name, ratio))
+
+
+def mark_whole_part_sides(elem_table, surface_faces, contacts, log=None):
+    """
+    Set c['slave_pid'] / c['master_pid'] to the part id when a contact
+    side is exactly the boundary of one part, so write_contacts can
+    reference the part instead of listing every segment.
+    Runs after the bonded merge: a face whose corners now coincide with
+    another boundary face's is interior in the written deck, so it is
+    left out of the part's boundary and never matches a side.
+    """
+    log = log or _no_log
+    pids, rows, fnodes = elem_table.pids, surface_faces.rows, surface_faces.nodes
+    keys = [tuple(sorted(fnodes[4 * f:4 * f + 4])) for f in range(len(rows))]
+    shared = {}
+    for key in keys:
+        shared[key] = shared.get(key, 0) + 1
+    exterior = set(f for f in range(len(rows)) if shared[keys[f]] == 1)
+    part_faces = {}
+    for f in exterior:
+        part_faces[pids[rows[f]]] = part_faces.get(pids[rows[f]], 0) + 1
+    for c in contacts:
+        for side in ('slave', 'master'):
+            faces = set(c[side])
+            side_pids = set(pids[rows[f]] for f in faces)
+            pid = side_pids.pop() if len(side_pids) == 1 else 0
+            if pid and faces <= exterior and len(faces) == part_faces.get(pid, 0):
+                c[side + '_pid'] = pid
+                log("  {0}_{1}: whole part {2} -> part id".format(
+                    c['name'], side.upper(), pid))
+            else:
+                c[side + '_pid'] = 0
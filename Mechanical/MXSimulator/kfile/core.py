@@ -0,0 +1,1421 @@
+# encoding: utf-8
+"""
+MX Digital Twin - LS-DYNA k-file core
+
+Plain-array mesh tables, the .k card writers and the neutral mesh dump.
+Nothing here touches the Mechanical API, so the same code runs inside the
+ACT extension (IronPython, ExportKFileDialog) and in the headless CPython
+exporter (python -m kfile).
+"""
+
+import os
+import sys
+import time
+import struct
+import hashlib
+from array import array
+
+try:
+    import System
+    from System.Threading.Tasks import Parallel as _Parallel, ParallelOptions as _ParallelOptions
+except ImportError:
+    _Parallel = None
+
+try:
+    import multiprocessing as _mp
+    _mp.get_context('fork')
+except Exception:
+    _mp = None
+
+try:
+    import numpy as _np
+except ImportError:
+    _np = None
+
+
+# ── Streaming writer + helpers ────────────────────────────────────────────
+
+class ExportCancelled(Exception):
+    """Raised at the next checkpoint after Progress.cancel()."""
+
+
+class Progress(object):
+    """
+    Phase / percent / ETA of a running export, shared between the export
+    thread and the UI. KFileWriter reports node and element card lines
+    through advance() and checks for cancellation on every flush; the
+    callback is throttled to one call per interval (and per phase change).
+    Counts may be updated from several include-writer threads at once; a
+    lost increment only affects the displayed percent.
+    """
+
+    INTERVAL = 0.25    # seconds between callbacks
+
+    def __init__(self, callback=None):
+        self.phase = ""
+        self.done = 0
+        self.total = 0
+        self.cancelled = False
+        self._callback = callback
+        self._t0 = self._last = time.time()
+
+    def start(self, phase, total=0):
+        """Begin a phase; total > 0 makes it measurable (percent, ETA)."""
+        self.check()
+        self.phase, self.done, self.total = phase, 0, total
+        self._t0 = time.time()
+        self._notify(True)
+
+    def advance(self, n):
+        self.check()
+        self.done += n
+        self._notify(False)
+
+    def check(self):
+        if self.cancelled:
+            raise ExportCancelled("export cancelled")
+
+    def cancel(self):
+        self.cancelled = True
+
+    def fraction(self):
+        """0..1 of the current phase, or None if it has no total."""
+        if self.total <= 0:
+            return None
+        return min(1.0, self.done / float(self.total))
+
+    def eta(self):
+        """Seconds left in the current phase, or None if unknown yet."""
+        frac = self.fraction()
+        if not frac:
+            return None
+        return (time.time() - self._t0) * (1.0 - frac) / frac
+
+    def _notify(self, force):
+        if self._callback is None:
+            return
+        now = time.time()
+        if force or now - self._last >= self.INTERVAL:
+            self._last = now
+            self._callback(self)
+
+
+class KFileWriter(object):
+    """
+    Buffered streaming writer for .k decks.
+    Section writers call append() exactly as they would on a list; lines are
+    flushed to disk in fixed-size chunks so peak memory does not grow with
+    the mesh. Output goes to '<path>.tmp' and replaces <path> only when the
+    deck is complete, so a failed or cancelled export never leaves a
+    truncated file. With defer=True a finished deck stays at '<path>.tmp'
+    until commit_files() moves it, so several files can be replaced
+    together. Pre-formatted node / element blocks are reported to progress
+    (a Progress) when given.
+    """
+
+    CHUNK_LINES = 20000
+
+    def __init__(self, path, chunk_lines=None, progress=None, defer=False):
+        self.path = path
+        self.progress = progress
+        self.defer = defer
+        self.lines_written = 0
+        self._tmp = path + ".tmp"
+        self._chunk = chunk_lines or self.CHUNK_LINES
+        self._buf = []
+        self._f = open(self._tmp, 'w')
+
+    def append(self, line):
+        self._buf.append(line)
+        if len(self._buf) >= self._chunk:
+            self.flush()
+
+    def write_block(self, text, n_lines):
+        """Write a pre-formatted, newline-terminated block of n_lines lines."""
+        self.flush()
+        self._f.write(text)
+        self.lines_written += n_lines
+        if self.progress is not None:
+            self.progress.advance(n_lines)
+
+    def flush(self):
+        if self.progress is not None:
+            self.progress.check()
+        if self._buf:
+            self._f.write('\n'.join(self._buf))
+            self._f.write('\n')
+            self.lines_written += len(self._buf)
+            self._buf = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.flush()
+        finally:
+            self._f.close()
+        if exc_type is not None:
+            discard_files([self.path])
+        elif not self.defer:
+            commit_files([self.path])
+        return False
+
+
+def commit_files(paths):
+    """Replace each path with its finished '<path>.tmp'."""
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(path + ".tmp", path)
+
+
+def discard_files(paths):
+    """Delete the '<path>.tmp' files of an abandoned write."""
+    for path in paths:
+        try:
+            os.remove(path + ".tmp")
+        except Exception:
+            pass
+
+
+def array_bytes(a):
+    """Raw bytes of an array: tobytes() is Python 3.2+, tostring() 2.7 / IronPython."""
+    return (getattr(a, 'tobytes', None) or a.tostring)()
+
+
+def content_hash(*items):
+    """md5 hex digest over arrays (raw bytes) and plain values (repr)."""
+    h = hashlib.md5()
+    for item in items:
+        if isinstance(item, array):
+            h.update(array_bytes(item))
+        else:
+            h.update(repr(item).encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def id_runs(ids):
+    """[(first, last)] runs of consecutive ids in a sorted id sequence."""
+    runs = []
+    for nid in ids:
+        if runs and nid == runs[-1][1] + 1:
+            runs[-1][1] = nid
+        else:
+            runs.append([nid, nid])
+    return runs
+
+
+# ── LS-DYNA solid element helper ─────────────────────────────────────────
+# Returns (ELFORM for *SECTION_SOLID, 10-node Card-2 list) per manual:
+#   4-node Tet4    → ELFORM=10, Card2: N1,N2,N3,N4,N4,N4,N4,N4,0,0
+#   6-node Wedge6  → ELFORM=15, Card2: N1,N2,N3,N4,N5,N5,N6,N6,0,0
+#   8-node Hex8    → ELFORM= 1, Card2: N1..N8,0,0
+#   5-node Pyr5    → ELFORM= 1 (degenerate hex), Card2: N1..N5,N5,N5,N5,0,0
+#   Quadratic elements: degrade to linear using corner nodes only
+#   10-node Tet10  → treat as Tet4 (corners = N1-N4, indices 0-3)
+#   15-node Wedge15→ treat as Wedge6 (corners = N1-N6, indices 0-5)
+#   20-node Hex20  → treat as Hex8  (corners = N1-N8, indices 0-7)
+def solid_card2(nids):
+    n = len(nids)
+    if n == 4:
+        return 10, list(nids[:4]) + [nids[3]]*4 + [0, 0]
+    elif n == 10:
+        # Tet10 → degrade to Tet4 using corner nodes (indices 0-3)
+        return 10, list(nids[:4]) + [nids[3]]*4 + [0, 0]
+    elif n == 6:
+        # Wedge6: LS-DYNA maps N5→N5,N5 and N6→N6,N6 (§19-123)
+        return 15, [nids[0],nids[1],nids[2],nids[3],
+                    nids[4],nids[4],nids[5],nids[5], 0, 0]
+    elif n == 15:
+        # Wedge15 → degrade to Wedge6 using corner nodes (indices 0-5)
+        return 15, [nids[0],nids[1],nids[2],nids[3],
+                    nids[4],nids[4],nids[5],nids[5], 0, 0]
+    elif n == 5:
+        return 1,  list(nids[:5]) + [nids[4]]*3 + [0, 0]
+    elif n == 8:
+        return 1,  list(nids[:8]) + [0, 0]
+    elif n == 20:
+        # Hex20 → degrade to Hex8 using corner nodes (indices 0-7)
+        return 1,  list(nids[:8]) + [0, 0]
+    else:   # unknown — use up to 8 nodes padded
+        padded = (list(nids) + [nids[-1]]*8)[:8]
+        return 1, padded + [0, 0]
+
+
+# Mechanical ElementTypeEnum name -> (node count, shell). Surface types
+# (kTri*/kQuad*) are shells by name; the baseline reader only treated
+# type names containing "Shell" / "Plate" as shells, which element_type
+# still does for names outside this table. ELFORM is chosen by the
+# writers (write_part: solid_card2 / shell ELFORM 2), not here.
+ELEMENT_TYPES = {
+    'kTet4':      (4,  False),
+    'kTet10':     (10, False),
+    'kHex8':      (8,  False),
+    'kHex20':     (20, False),
+    'kWedge6':    (6,  False),
+    'kWedge15':   (15, False),
+    'kPyramid5':  (5,  False),
+    'kPyramid13': (13, False),
+    'kTri3':      (3,  True),
+    'kTri6':      (6,  True),
+    'kQuad4':     (4,  True),
+    'kQuad8':     (8,  True),
+}
+
+
+def element_type(name, n_nodes):
+    """(node count, shell) of a MeshData element type name; types outside
+    ELEMENT_TYPES are classified from the name and node count."""
+    info = ELEMENT_TYPES.get(name)
+    if info is not None:
+        return info
+    return n_nodes, "Shell" in name or "Plate" in name
+
+
+FORMAT_CHUNK = 20000    # items per formatting chunk
+
+
+def format_chunks(n, fmt_range, threads, chunk=FORMAT_CHUNK):
+    """
+    Format items [0, n) in fixed-size chunks and yield (text, n_items) in
+    order. fmt_range(lo, hi) returns the newline-terminated text of items
+    lo..hi-1. With threads > 1, waves of chunks are formatted on the .NET
+    thread pool (IronPython has no GIL) into per-chunk buffers and yielded
+    in order, so the output is byte-identical to the sequential path and
+    at most one wave is held in memory. Under CPython the chunks go to
+    forked worker processes instead, so there fmt_range must only return
+    text (side effects stay in the worker).
+    """
+    bounds = [(lo, min(lo + chunk, n)) for lo in range(0, n, chunk)]
+    if threads <= 1 or len(bounds) <= 1 or (_Parallel is None and _mp is None):
+        for lo, hi in bounds:
+            yield fmt_range(lo, hi), hi - lo
+        return
+    if _Parallel is None:
+        for item in _format_chunks_forked(bounds, fmt_range, threads):
+            yield item
+        return
+    opts = _ParallelOptions()
+    opts.MaxDegreeOfParallelism = threads
+    wave = 2 * threads
+    for w in range(0, len(bounds), wave):
+        batch = bounds[w:w + wave]
+        texts = [None] * len(batch)
+
+        def _body(i, batch=batch, texts=texts):
+            lo, hi = batch[i]
+            texts[i] = fmt_range(lo, hi)
+
+        _Parallel.For(0, len(batch), opts, System.Action[int](_body))
+        for (lo, hi), text in zip(batch, texts):
+            yield text, hi - lo
+
+
+_forked_fmt = None   # fmt_range inherited by forked workers
+
+
+def _run_forked(bounds):
+    return _forked_fmt(*bounds)
+
+
+def _format_chunks_forked(bounds, fmt_range, threads):
+    # Workers are forked after fmt_range is published, so closures and the
+    # tables they reference need no pickling; imap keeps chunk order.
+    global _forked_fmt
+    _forked_fmt = fmt_range
+    pool = _mp.get_context('fork').Pool(threads)
+    try:
+        for (lo, hi), text in zip(bounds, pool.imap(_run_forked, bounds)):
+            yield text, hi - lo
+    finally:
+        pool.terminate()
+        _forked_fmt = None
+
+
+# ── Mesh tables ───────────────────────────────────────────────────────────
+
+class NodeTable(object):
+    """
+    Compact node coordinate store (unscaled, meters).
+    Node i has id ids[i] and coordinates xyz[3i:3i+3]. After freeze(),
+    id -> index lookup is direct when ids are 1..N in order, an int array
+    when ids are reasonably dense, and a dict only for very sparse ids.
+    """
+
+    def __init__(self):
+        self.ids = array('i')
+        self.xyz = array('d')
+        self._pos = None      # array('i'): nid -> index (-1 = absent)
+        self._map = None      # dict fallback for sparse ids
+        self._identity = True
+
+    def add(self, nid, x, y, z):
+        if self._identity and nid != len(self.ids) + 1:
+            self._identity = False
+        self.ids.append(nid)
+        self.xyz.append(x)
+        self.xyz.append(y)
+        self.xyz.append(z)
+
+    def freeze(self):
+        """Build the id -> index lookup once all nodes are added."""
+        n = len(self.ids)
+        self._identity = self.ids == array('i', range(1, n + 1))
+        if self._identity or n == 0:
+            return
+        max_id = max(self.ids)
+        if max_id <= 2 * n + 1024:
+            pos = array('i', [-1]) * (max_id + 1)
+            for i, nid in enumerate(self.ids):
+                pos[nid] = i
+            self._pos = pos
+        else:
+            self._map = dict((nid, i) for i, nid in enumerate(self.ids))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, nid):
+        return self.index_of(nid) >= 0
+
+    def index_of(self, nid):
+        """Row index of node id, or -1 if absent."""
+        if self._identity:
+            return nid - 1 if 0 < nid <= len(self.ids) else -1
+        if self._pos is not None:
+            return self._pos[nid] if 0 <= nid < len(self._pos) else -1
+        return self._map.get(nid, -1)
+
+    def coords(self, nid):
+        """(x, y, z) in meters, or None if the node is absent."""
+        i = self.index_of(nid)
+        if i < 0:
+            return None
+        k = 3 * i
+        return self.xyz[k], self.xyz[k + 1], self.xyz[k + 2]
+
+
+class ElementTable(object):
+    """
+    Flat element store filled by one MeshData pass.
+    Row r: element id ids[r], part id pids[r], shell flag shell[r] and
+    node ids conn[offsets[r]:offsets[r + 1]].
+    """
+
+    def __init__(self):
+        self.ids = array('i')
+        self.pids = array('i')
+        self.shell = array('b')
+        self.conn = array('i')
+        self.offsets = array('i', [0])
+
+    def add(self, eid, pid, nids, is_shell):
+        self.conn.extend(nids)
+        self.ids.append(eid)
+        self.pids.append(pid)
+        self.shell.append(1 if is_shell else 0)
+        self.offsets.append(len(self.conn))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def nodes(self, r):
+        return self.conn[self.offsets[r]:self.offsets[r + 1]]
+
+    def rows_by_part(self):
+        """{pid: array('i') of row indices}, rows in table order."""
+        parts = {}
+        for r, pid in enumerate(self.pids):
+            rows = parts.get(pid)
+            if rows is None:
+                rows = parts[pid] = array('i')
+            rows.append(r)
+        return parts
+
+    def node_owners(self, node_table):
+        """
+        {pid: array('i') of node rows}: each node belongs to the lowest part
+        id that references it; nodes no element references go under None.
+        """
+        n = len(node_table)
+        owner = array('i', [0]) * n
+        seen = array('b', [0]) * n
+        conn, offsets, pids = self.conn, self.offsets, self.pids
+        for r in range(len(self.ids)):
+            pid = pids[r]
+            for k in range(offsets[r], offsets[r + 1]):
+                i = node_table.index_of(conn[k])
+                if i >= 0 and (not seen[i] or pid < owner[i]):
+                    owner[i] = pid
+                    seen[i] = 1
+        parts = {}
+        for i in range(n):
+            key = owner[i] if seen[i] else None
+            rows = parts.get(key)
+            if rows is None:
+                rows = parts[key] = array('i')
+            rows.append(i)
+        return parts
+
+
+class BoundaryFaces(object):
+    """
+    Boundary (exterior) faces as flat arrays.
+    Face f comes from element row rows[f] (id eids[f]); its ordered corner
+    ids are nodes[4f:4f + 4], with nodes[4f + 3] == 0 for triangles.
+    """
+
+    def __init__(self):
+        self.rows = array('i')
+        self.eids = array('i')
+        self.nodes = array('i')
+        self._start = None    # node -> face inverted index, see faces_of()
+        self._faces = None
+
+    def add(self, row, eid, corners):
+        self.rows.append(row)
+        self.eids.append(eid)
+        self.nodes.extend(corners)
+        if len(corners) == 3:
+            self.nodes.append(0)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def face_nodes(self, f):
+        k = 4 * f
+        if self.nodes[k + 3]:
+            return self.nodes[k:k + 4]
+        return self.nodes[k:k + 3]
+
+    def faces_of(self, nid):
+        """Indices of the boundary faces that contain node nid."""
+        if self._start is None:
+            self._build_node_index()
+        if 0 < nid < len(self._start) - 1:
+            return self._faces[self._start[nid]:self._start[nid + 1]]
+        return ()
+
+    def _build_node_index(self):
+        # CSR inverted index: faces containing node id n are
+        # _faces[_start[n]:_start[n + 1]]; built once, on first query.
+        nodes = self.nodes
+        top = (max(nodes) + 1) if len(nodes) else 1
+        start = array('i', [0]) * (top + 1)
+        for nid in nodes:
+            if nid:
+                start[nid + 1] += 1
+        for i in range(1, top + 1):
+            start[i] += start[i - 1]
+        fill = array('i', start)
+        faces = array('i', [0]) * start[top]
+        for k, nid in enumerate(nodes):
+            if nid:
+                faces[fill[nid]] = k >> 2
+                fill[nid] += 1
+        self._start, self._faces = start, faces
+
+
+# ── Deck assembly ─────────────────────────────────────────────────────────
+
+def deck_header(unit_label):
+    return ["*KEYWORD",
+            "$ Generated by MX Digital Twin Simulator",
+            "$ Unit system: " + unit_label,
+            "$"]
+
+
+def deck_sections(node_table, elem_table, body_pid_map, scale, threads,
+                  mat_rows=None, ns_sets=None, contact_data=None, compact_sets=False):
+    """
+    [(name, write_fn)] for the deck, in keyword order. Optional sections
+    are left out when their data is None; contact_data is
+    (surface_faces, contacts).
+    """
+    sections = [
+        ('nodes', lambda out: write_nodes(out, node_table, scale, threads)),
+        ('elements', lambda out: write_elements_parts(
+            out, elem_table, body_pid_map, threads)),
+    ]
+    if mat_rows is not None:
+        sections.append(('materials', lambda out: write_materials(out, mat_rows)))
+    if ns_sets is not None:
+        sections.append(('sets', lambda out: write_named_selections(
+            out, ns_sets, compact_sets)))
+    if contact_data is not None:
+        surface_faces, contacts = contact_data
+        sections.append(('contacts', lambda out: write_contacts(
+            out, surface_faces, contacts)))
+    return sections
+
+
+def card_lines(node_table, elem_table):
+    """*NODE + *ELEMENT data lines of a deck (the Progress total of a write)."""
+    return len(node_table) + 2 * len(elem_table) - sum(elem_table.shell)
+
+
+def write_deck(path, header, sections, progress=None):
+    """Single-file deck. Each section writes through a buffered writer that
+    flushes fixed-size chunks, so the deck is never held in memory."""
+    with KFileWriter(path, progress=progress) as out:
+        for line in header:
+            out.append(line)
+        for _name, write in sections:
+            write(out)
+        out.append("*END")
+    return [path]
+
+
+INCLUDE_SECTIONS = ('nodes', 'elements', 'materials', 'sets', 'contacts')
+
+
+def include_path(path, name):
+    return os.path.splitext(path)[0] + "_" + name + ".k"
+
+
+def write_include_deck(path, header, sections, threads, keep=(), progress=None):
+    """
+    Write each (name, write_fn) section to '<base>_<name>.k' and a master
+    deck at path that pulls them in with *INCLUDE. Sections only format
+    in-memory data, so they are written concurrently. Sections listed in
+    keep that were not rewritten are still included if their file exists.
+    No file is replaced until every include and the master are complete.
+    Returns the list of files written.
+    """
+    jobs = [(name, include_path(path, name), write)
+            for name, write in sections]
+    staged = [inc for _n, inc, _w in jobs] + [path]
+    rewritten = set(name for name, _p, _w in jobs)
+    try:
+        write_include_files(path, jobs, threads, progress, defer=True)
+        with KFileWriter(path, progress=progress, defer=True) as out:
+            for line in header:
+                out.append(line)
+            for name in INCLUDE_SECTIONS:
+                inc_path = include_path(path, name)
+                if name in rewritten or (name in keep and os.path.exists(inc_path)):
+                    out.append("*INCLUDE")
+                    out.append(os.path.basename(inc_path))
+            out.append("*END")
+    except Exception:
+        discard_files(staged)
+        raise
+    commit_files(staged)
+    return staged
+
+
+def write_include_files(path, jobs, threads, progress=None, defer=False):
+    """
+    Write (name, inc_path, write_fn) jobs, concurrently when threads > 1.
+    The files replace their targets only once all jobs have finished; if
+    any job fails, none does. With defer=True they are left as '.tmp' for
+    the caller to commit_files() together with its master deck.
+    """
+    def _write_one(i):
+        name, inc_path, write = jobs[i]
+        with KFileWriter(inc_path, progress=progress, defer=True) as out:
+            out.append("*KEYWORD")
+            out.append("$ MX Digital Twin Simulator - {0} (included by {1})".format(
+                name, os.path.basename(path)))
+            write(out)
+            out.append("*END")
+
+    staged = [inc_path for _n, inc_path, _w in jobs]
+    try:
+        if threads > 1 and len(jobs) > 1 and _Parallel is not None:
+            opts = _ParallelOptions()
+            opts.MaxDegreeOfParallelism = min(threads, len(jobs))
+            _Parallel.For(0, len(jobs), opts, System.Action[int](_write_one))
+        else:
+            for i in range(len(jobs)):
+                _write_one(i)
+    except Exception:
+        discard_files(staged)
+        raise
+    if not defer:
+        commit_files(staged)
+
+
+# ── Card writers ──────────────────────────────────────────────────────────
+
+def write_nodes(out, node_table, scale, threads, rows=None):
+    """Write *NODE section from the node table (or only the given
+    rows of it). Returns count."""
+    out.append("*NODE")
+    # Standard format: NID(I8), X(F16), Y(F16), Z(F16) — see manual §2 (I8,3F16,2I8)
+    out.append("$#     nid             x               y               z")
+    ids, xyz = node_table.ids, node_table.xyz
+    fmt = "{:8d}{:16.6E}{:16.6E}{:16.6E}".format
+    subset = rows is not None
+    if rows is None:
+        rows = range(len(ids))
+
+    def _fmt_range(lo, hi):
+        return "".join([
+            fmt(ids[i], xyz[3 * i] * scale, xyz[3 * i + 1] * scale,
+                xyz[3 * i + 2] * scale) + "\n"
+            for i in rows[lo:hi]])
+
+    if _np is not None and len(rows):
+        # Scale all coordinates in one vectorised pass and format each
+        # chunk with a single %-operation over a flat value list; the
+        # text is identical to the per-node format above.
+        np = _np
+        table = np.column_stack((
+            np.frombuffer(ids, dtype=np.intc),
+            np.frombuffer(xyz, dtype=np.float64).reshape(-1, 3) * scale))
+        if subset:
+            table = table[np.asarray(rows, dtype=np.intp)]
+        line = "%8d%16.6E%16.6E%16.6E\n"
+
+        def _fmt_range(lo, hi):
+            return (line * (hi - lo)) % tuple(table[lo:hi].ravel().tolist())
+
+    for block, n_lines in format_chunks(len(rows), _fmt_range, threads):
+        out.write_block(block, n_lines)
+    out.append("$")
+    return len(rows)
+
+
+def write_elements_parts(out, elem_table, body_pid_map, threads):
+    """
+    Write *SECTION + *PART + *ELEMENT_SOLID/SHELL blocks.
+    Returns total element count.
+    """
+    elem_by_part = elem_table.rows_by_part()
+    total = 0
+
+    # Write blocks per part
+    sec_id = 1
+    for pid in sorted(elem_by_part.keys()):
+        rows = elem_by_part[pid]
+        if not rows:
+            continue
+        write_part(out, elem_table, pid, rows, sec_id,
+                   part_name(body_pid_map, pid), threads)
+        total += len(rows)
+        sec_id += 1
+
+    return total
+
+
+def part_name(body_pid_map, pid):
+    return next((n for n, p in body_pid_map.items() if p == pid),
+                "Part_{0}".format(pid))
+
+
+def write_part(out, elem_table, pid, rows, sec_id, title, threads):
+    """Write the *SECTION + *PART + *ELEMENT block of one part (*PART heading title)."""
+    ids, conn, offsets = elem_table.ids, elem_table.conn, elem_table.offsets
+    is_shell = bool(elem_table.shell[rows[0]])
+
+    # *SECTION
+    if is_shell:
+        out.append("*SECTION_SHELL")
+        # ELFORM=2: Belytschko-Tsay (most common shell element)
+        out.append("$#   secid    elform      shrf       nip")
+        out.append("{:10d}{:10d}{:10.4f}{:10d}".format(sec_id, 2, 1.0, 3))
+        out.append("$#      t1        t2        t3        t4")
+        out.append("{:10.4f}{:10.4f}{:10.4f}{:10.4f}".format(1.0, 1.0, 1.0, 1.0))
+    else:
+        # Detect ELFORM from first element's node count
+        elform, _ = solid_card2(elem_table.nodes(rows[0]))
+        out.append("*SECTION_SOLID")
+        out.append("$#   secid    elform")
+        out.append("{:10d}{:10d}".format(sec_id, elform))
+
+    # *PART
+    out.append("*PART")
+    out.append(title)
+    out.append("$#    pid     secid       mid")
+    out.append("{:10d}{:10d}{:10d}".format(pid, sec_id, pid))
+
+    # *ELEMENT
+    if is_shell:
+        out.append("*ELEMENT_SHELL")
+        out.append("$#   eid     pid      n1      n2      n3      n4")
+        fmt = "{:8d}{:8d}{:8d}{:8d}{:8d}{:8d}".format
+
+        def _fmt_range(lo, hi):
+            buf = []
+            for r in rows[lo:hi]:
+                nids = conn[offsets[r]:offsets[r + 1]]
+                n = len(nids)
+                if n in (3, 6):
+                    # Tri3 or Tri6 (quadratic): corners=N1,N2,N3; N4=N3 per manual §19-104
+                    nids4 = [nids[0], nids[1], nids[2], nids[2]]
+                elif n in (4, 8):
+                    # Quad4 or Quad8 (quadratic): corners=N1-N4
+                    nids4 = list(nids[:4])
+                else:
+                    nids4 = (list(nids) + [nids[-1]] * 4)[:4]
+                buf.append(fmt(ids[r], pid, *nids4) + "\n")
+            return "".join(buf)
+    else:
+        # Two-card format per LS-DYNA manual §19-119:
+        #   Card 1: EID PID  (line 1)
+        #   Card 2: N1..N8 N9 N10  (line 2, 10 × I8)
+        out.append("*ELEMENT_SOLID")
+        out.append("$#   eid     pid")
+        out.append("$#    n1      n2      n3      n4      n5      n6      n7      n8")
+        fmt1 = "{:8d}{:8d}\n".format
+        fmt2 = ("{:8d}{:8d}{:8d}{:8d}{:8d}{:8d}"
+                "{:8d}{:8d}{:8d}{:8d}\n").format
+
+        def _fmt_range(lo, hi):
+            buf = []
+            for r in rows[lo:hi]:
+                _, c2 = solid_card2(conn[offsets[r]:offsets[r + 1]])
+                buf.append(fmt1(ids[r], pid))
+                buf.append(fmt2(*c2))
+            return "".join(buf)
+
+    for block, n_lines in format_chunks(len(rows), _fmt_range, threads):
+        out.write_block(block, n_lines * (1 if is_shell else 2))
+
+    out.append("$")
+
+
+def write_materials(out, mat_rows):
+    out.append("$")
+    out.append("$" + "=" * 49)
+    out.append("$  MATERIALS")
+    out.append("$" + "=" * 49)
+
+    for mid, comment, rho, E, nu in mat_rows:
+        out.append("*MAT_ELASTIC")
+        out.append("$ " + comment)
+        out.append("$#     mid        ro         e        pr")
+        out.append("{:10d}{:10.3E}{:10.3E}{:10.4f}".format(
+            mid, rho, E, nu))
+        out.append("$")
+
+    return len(mat_rows)
+
+
+def write_named_selections(out, ns_sets, compact=False):
+    """Write *SET_NODE_TITLE for each resolved Named Selection.
+    With compact=True, sets whose ids form few consecutive runs are
+    written as *SET_NODE_LIST_GENERATE_TITLE ranges instead."""
+    out.append("$")
+    out.append("$" + "=" * 49)
+    out.append("$  NAMED SELECTIONS (NODE SETS)")
+    out.append("$" + "=" * 49)
+
+    for set_id, (ns_name, node_ids) in enumerate(ns_sets, 1):
+        runs = id_runs(node_ids) if compact else None
+        if runs and 2 * len(runs) < len(node_ids):
+            # Card 2+: B1BEG B1END .. B4BEG B4END (4 ranges per line)
+            out.append("*SET_NODE_LIST_GENERATE_TITLE")
+            out.append(ns_name)
+            out.append("$#     sid")
+            out.append("{:10d}".format(set_id))
+            out.append(
+                "$#   b1beg     b1end     b2beg     b2end"
+                "     b3beg     b3end     b4beg     b4end")
+            for k in range(0, len(runs), 4):
+                out.append("".join("{:10d}{:10d}".format(lo, hi)
+                                   for lo, hi in runs[k:k + 4]))
+            out.append("$")
+            continue
+
+        out.append("*SET_NODE_TITLE")
+        out.append(ns_name)
+        out.append("$#    nsid")
+        out.append("{:10d}".format(set_id))
+        out.append(
+            "$#      n1        n2        n3        n4"
+            "        n5        n6        n7        n8")
+
+        row = []
+        for nid in node_ids:
+            row.append("{:10d}".format(nid))
+            if len(row) == 8:
+                out.append("".join(row))
+                row = []
+        if row:
+            out.append("".join(row))
+
+        out.append("$")
+
+    return len(ns_sets)
+
+
+# ── Boundary faces (contact segments) ─────────────────────────────────────
+
+# Face topology: node count → list of (local index tuples per face)
+# For quadratic solids, corner node indices only (mid-side nodes ignored).
+# ANSYS SOLID187 (Tet10):  corners=idx 0-3,  midsides=idx 4-9
+# ANSYS SOLID186 (Hex20):  corners=idx 0-7,  midsides=idx 8-19
+# ANSYS SOLID185/186 Wedge15: corners=idx 0-5, midsides=idx 6-14
+FACE_TOPO = {
+    # ── Linear solids ────────────────────────────────────────────────
+    4: [(0,1,2), (0,2,3), (0,3,1), (1,3,2)],                          # Tet4
+    8: [(0,1,2,3),(4,7,6,5),(0,4,5,1),(1,5,6,2),(2,6,7,3),(3,7,4,0)], # Hex8
+    6: [(0,1,2),(3,5,4),(0,3,4,1),(1,4,5,2),(0,2,5,3)],                # Wedge6
+    5: [(0,3,2,1),(0,1,4),(1,2,4),(2,3,4),(3,0,4)],                    # Pyramid5
+    3: [(0,1,2)],                                                       # Tri3 shell
+    # ── Quadratic solids — corner faces only ─────────────────────────
+    10: [(0,1,2), (0,2,3), (0,3,1), (1,3,2)],                         # Tet10  → Tet4 corners
+    20: [(0,1,2,3),(4,7,6,5),(0,4,5,1),(1,5,6,2),(2,6,7,3),(3,7,4,0)],# Hex20  → Hex8 corners
+    15: [(0,1,2),(3,5,4),(0,3,4,1),(1,4,5,2),(0,2,5,3)],               # Wedge15→ Wedge6 corners
+    13: [(0,3,2,1),(0,1,4),(1,2,4),(2,3,4),(3,0,4)],                   # Pyr13  → Pyr5 corners
+}
+
+
+def face_topology(n, is_shell):
+    """Local corner-node index tuples of the faces of an n-node element."""
+    if is_shell:
+        # Shell elements: the element itself is the contact surface.
+        # Use only corner nodes to avoid mid-side nodes in segment output.
+        # Tri3/Tri6 → triangular face [n0,n1,n2]
+        # Quad4/Quad8 → quad face [n0,n1,n2,n3]
+        if n in (3, 6):
+            return [(0, 1, 2)]
+        elif n in (4, 8):
+            return [(0, 1, 2, 3)]
+        return [tuple(range(min(n, 4)))]
+    return FACE_TOPO.get(n, [])
+
+
+def extract_boundary_faces(elem_table):
+    """Faces belonging to exactly one element, as a BoundaryFaces table.
+
+    Each face is hashed as its sorted corner ids packed into one integer
+    (triangles carry a leading 0, ids are >= 1, so they never collide with
+    quads). A face is stored on first sight, valued by (row << 3 | local
+    face index), and set to -1 once any other element shares it, so a
+    face met three or more times (T-junction, duplicated element) is
+    interior just like an ordinary shared face.
+    """
+    ids, conn, offsets = elem_table.ids, elem_table.conn, elem_table.offsets
+    base = (max(conn) + 1) if len(conn) else 1
+    seen = {}
+    for r in range(len(ids)):
+        nids = conn[offsets[r]:offsets[r + 1]]
+        topo = face_topology(len(nids), elem_table.shell[r])
+        for li, fi in enumerate(topo):
+            if len(fi) == 4:
+                a, b, c, d = sorted([nids[fi[0]], nids[fi[1]],
+                                     nids[fi[2]], nids[fi[3]]])
+                if a == b or b == c or c == d:
+                    # Collapsed quad: hash it as the triangle it really is
+                    u = sorted(set((a, b, c, d)))
+                    if len(u) < 3:
+                        continue
+                    a, b, c, d = 0, u[0], u[1], u[2]
+            elif len(fi) == 3:
+                b, c, d = sorted([nids[fi[0]], nids[fi[1]], nids[fi[2]]])
+                if b == c or c == d:
+                    continue
+                a = 0
+            else:
+                continue
+            key = ((a * base + b) * base + c) * base + d
+            if key in seen:
+                seen[key] = -1
+            else:
+                seen[key] = (r << 3) | li
+
+    faces = BoundaryFaces()
+    for v in sorted(v for v in seen.values() if v >= 0):
+        r, li = v >> 3, v & 7
+        nids = conn[offsets[r]:offsets[r + 1]]
+        fi = face_topology(len(nids), elem_table.shell[r])[li]
+        faces.add(r, ids[r], [nids[k] for k in fi])
+    return faces
+
+
+def write_segment_set(out, seg_id, title, surface_faces, segment_faces):
+    """Write *SET_SEGMENT_TITLE card.
+    Segment row format: n1 n2 n3 n4 (4 corner node IDs, no element ID).
+    """
+    out.append("*SET_SEGMENT_TITLE")
+    out.append(title)
+    out.append("{:10d}".format(seg_id))
+    out.append("$#      n1        n2        n3        n4")
+    for f in segment_faces:
+        nodes = surface_faces.face_nodes(f)
+        n1 = nodes[0]; n2 = nodes[1]; n3 = nodes[2]
+        # LS-DYNA: triangular segment → N4 = N3 (per manual §43-54)
+        n4 = nodes[3] if len(nodes) >= 4 else nodes[2]
+        out.append("{:10d}{:10d}{:10d}{:10d}".format(n1, n2, n3, n4))
+
+
+def write_contacts(out, surface_faces, contacts):
+    """Write *SET_SEGMENT_TITLE + *CONTACT_* cards for contacts.pair_contacts output.
+    Returns number of contact regions written."""
+    for c in contacts:
+        # A side covering a whole part references the part id instead
+        slave_pid, master_pid = c.get('slave_pid', 0), c.get('master_pid', 0)
+        if not slave_pid:
+            write_segment_set(out, c['slave_id'],
+                              c['name'] + "_SLAVE",  surface_faces, c['slave'])
+        if not master_pid:
+            write_segment_set(out, c['master_id'],
+                              c['name'] + "_MASTER", surface_faces, c['master'])
+
+        out.append(c['kw'])
+        # Card 1: SURFA(=SSID), SURFB(=MSID), SURFATYP(=SSTYP), SURFBTYP(=MSTYP)
+        #   SURFATYP=0 → segment set ID (matches our *SET_SEGMENT_TITLE)
+        #   SURFATYP=3 → part ID (all exterior segments of the part)
+        out.append("$#    ssid      msid     sstyp     mstyp")
+        out.append("{:10d}{:10d}{:10d}{:10d}".format(
+            slave_pid or c['slave_id'], master_pid or c['master_id'],
+            3 if slave_pid else 0, 3 if master_pid else 0))
+        # Card 2: FS, FD, DC, VC, VDC, PENCHK, BT, DT
+        mu = c['mu']
+        out.append("$#       fs        fd        dc        vc       vdc    penchk        bt")
+        # DT omitted → LS-DYNA uses default (1e20); writing 0.0 risks early contact death
+        out.append("{:10.4f}{:10.4f}{:10.4f}{:10.4f}{:10.4f}{:10d}{:10.4f}".format(
+            mu, mu, 0.0, 0.0, 0.0, 0, 0.0))
+        # Card 3: SFSA, SFSB, SAST, SBST, SFSAT, SFSBT, FSF, VSF (mandatory per manual §11-33)
+        out.append("$#    sfsa      sfsb      sast      sbst     sfsat     sfsbt       fsf       vsf")
+        out.append("{:10.4f}{:10.4f}{:10.4f}{:10.4f}{:10.4f}{:10.4f}{:10.4f}{:10.4f}".format(
+            1.0, 1.0, 0.0, 0.0, 1.0, 1.0, 1.0, 1.0))
+        out.append("$")
+
+    return len(contacts)
+
+
+class FaceEdgeStats(object):
+    """
+    Edge lengths of every boundary face, computed once per export.
+    Face f has n_edges[f] edges (3 or 4; 0 when a corner node is missing)
+    with total length edge_sum[f], shortest edge_min[f] and longest
+    edge_max[f]. region(faces) aggregates any contact side from these
+    arrays instead of recomputing lengths per side. NumPy does the table
+    in one vectorised pass when available (CPython); IronPython loops once.
+    """
+
+    def __init__(self, surface_faces, node_table):
+        n = len(surface_faces)
+        if _np is not None and n and len(node_table):
+            self._build_numpy(surface_faces, node_table, n)
+        else:
+            self._build(surface_faces, node_table, n)
+
+    def _build_numpy(self, surface_faces, node_table, n):
+        np = _np
+        corners = np.frombuffer(surface_faces.nodes, dtype=np.int32).reshape(n, 4)
+        tri = corners[:, 3] == 0
+        idx = _np_node_rows(node_table, corners)
+        idx[tri, 3] = idx[tri, 0]       # triangle: 4th corner = 1st, last edge 0
+        valid = (idx >= 0).all(axis=1)
+        xyz = np.frombuffer(node_table.xyz, dtype=np.float64).reshape(-1, 3)
+        pts = xyz[np.where(idx >= 0, idx, 0)]                  # (n, 4, 3)
+        lengths = np.sqrt(((np.roll(pts, -1, axis=1) - pts) ** 2).sum(axis=2))
+        edge_used = np.ones((n, 4), dtype=bool)
+        edge_used[tri, 3] = False
+        edge_used &= valid[:, None]
+        self.n_edges = array('i', edge_used.sum(axis=1).astype(np.int32).tobytes())
+        self.edge_sum = array('d', np.where(edge_used, lengths, 0.0).sum(axis=1).tobytes())
+        self.edge_min = array('d', np.where(edge_used, lengths, np.inf).min(axis=1).tobytes())
+        self.edge_max = array('d', np.where(edge_used, lengths, 0.0).max(axis=1).tobytes())
+
+    def _build(self, surface_faces, node_table, n):
+        import math
+        nodes, xyz = surface_faces.nodes, node_table.xyz
+        self.n_edges = array('i', [0]) * n
+        self.edge_sum = array('d', [0.0]) * n
+        self.edge_min = array('d', [float('inf')]) * n
+        self.edge_max = array('d', [0.0]) * n
+        for f in range(n):
+            k = 4 * f
+            m = 4 if nodes[k + 3] else 3
+            rows = [node_table.index_of(nid) for nid in nodes[k:k + m]]
+            if min(rows) < 0:
+                continue
+            lengths = []
+            for i in range(m):
+                a, b = 3 * rows[i], 3 * rows[(i + 1) % m]
+                dx, dy, dz = xyz[a] - xyz[b], xyz[a + 1] - xyz[b + 1], xyz[a + 2] - xyz[b + 2]
+                lengths.append(math.sqrt(dx * dx + dy * dy + dz * dz))
+            self.n_edges[f] = m
+            self.edge_sum[f] = sum(lengths)
+            self.edge_min[f] = min(lengths)
+            self.edge_max[f] = max(lengths)
+
+    def region(self, faces):
+        """(mean, min, max, n_edges) edge length (m) over the faces; mean,
+        min and max are 0.0 when no face has edges."""
+        n_edges, edge_sum = self.n_edges, self.edge_sum
+        edge_min, edge_max = self.edge_min, self.edge_max
+        count, total, lo, hi = 0, 0.0, float('inf'), 0.0
+        for f in faces:
+            if n_edges[f]:
+                count += n_edges[f]
+                total += edge_sum[f]
+                if edge_min[f] < lo:
+                    lo = edge_min[f]
+                if edge_max[f] > hi:
+                    hi = edge_max[f]
+        if not count:
+            return 0.0, 0.0, 0.0, 0
+        return total / count, lo, hi, count
+
+
+def _np_node_rows(node_table, ids):
+    """NumPy int64 array of node rows for an array of node ids (-1 = absent)."""
+    np = _np
+    ids = np.asarray(ids, dtype=np.int64)
+    if node_table._identity:
+        return np.where((ids > 0) & (ids <= len(node_table)), ids - 1, -1)
+    if node_table._pos is not None:
+        pos = np.frombuffer(node_table._pos, dtype=np.int32)
+        inside = (ids >= 0) & (ids < len(pos))
+        return np.where(inside, pos[np.where(inside, ids, 0)], -1).astype(np.int64)
+    return np.array([node_table.index_of(int(nid)) for nid in ids.ravel()],
+                    dtype=np.int64).reshape(ids.shape)
+
+
+class TimeStepEstimate(object):
+    """
+    Explicit critical time step per element, dt = Le / c:
+      solids  Le = V / A_max  (tets: 3V / A_max, the minimum altitude)
+              c  = sqrt(E (1 - nu) / ((1 + nu) (1 - 2 nu) rho))
+      shells  Le = (1 + beta) A / L_max  (beta = 1 for triangles)
+              c  = sqrt(E / (rho (1 - nu^2)))
+    Lengths are in deck units (coordinates * scale) and materials are the
+    *MAT_ELASTIC rows, so dt is in seconds. dt[r], le[r] and mass[r] are
+    filled per element row straight from the flat xyz / conn arrays: with
+    NumPy one vectorised pass per (node count, shell) group, otherwise one
+    serial loop. Elements without material or nodes get dt = inf.
+    """
+
+    TSSFAC = 0.9
+
+    def __init__(self, node_table, elem_table, mat_rows, scale):
+        import math
+        self.elem_table = elem_table
+        n = len(elem_table)
+        self.dt = array('d', [float('inf')]) * n
+        self.le = array('d', [0.0]) * n
+        self.mass = array('d', [0.0]) * n
+
+        mats = {}
+        for mid, _comment, rho, E, nu in mat_rows:
+            mats[mid] = (rho,
+                         math.sqrt(E * (1 - nu) / ((1 + nu) * (1 - 2 * nu) * rho)),
+                         math.sqrt(E / (rho * (1 - nu * nu))))
+        if _np is not None and n and len(node_table) and mats:
+            self._build_numpy(node_table, elem_table, mats, scale)
+        else:
+            self._build(node_table, elem_table, mats, scale)
+
+    def _build_numpy(self, node_table, elem_table, mats, scale):
+        np = _np
+        xyz = np.frombuffer(node_table.xyz, dtype=np.float64).reshape(-1, 3) * scale
+        conn = np.frombuffer(elem_table.conn, dtype=np.int32)
+        offsets = np.frombuffer(elem_table.offsets, dtype=np.int32)
+        pids = np.frombuffer(elem_table.pids, dtype=np.int32)
+        shell = np.frombuffer(elem_table.shell, dtype=np.int8) != 0
+        counts = np.diff(offsets)
+
+        # Per-row material (rho, c_solid, c_shell); NaN rho = no material
+        mat = np.full((len(pids), 3), np.nan)
+        for mid, row in mats.items():
+            mat[pids == mid] = row
+        has_mat = ~np.isnan(mat[:, 0])
+
+        dt = np.full(len(pids), np.inf)
+        le = np.zeros(len(pids))
+        mass = np.zeros(len(pids))
+        for k, is_shell in set(zip(counts.tolist(), shell.tolist())):
+            faces = face_topology(k, is_shell)
+            rows = np.nonzero((counts == k) & (shell == is_shell) & has_mat)[0]
+            if not faces or not len(rows):
+                continue
+            idx = _np_node_rows(node_table, conn[offsets[rows][:, None] + np.arange(k)])
+            ok = (idx >= 0).all(axis=1)
+            rows, pts = rows[ok], xyz[idx[ok]]               # (m, k, 3)
+            if not len(rows):
+                continue
+            if is_shell:
+                corners = pts[:, list(faces[0])]
+                area = np.sqrt((_np_area(corners) ** 2).sum(axis=1))
+                edges = corners - np.roll(corners, 1, axis=1)
+                l_max = np.sqrt((edges ** 2).sum(axis=2)).max(axis=1)
+                beta = 1.0 if len(faces[0]) == 3 else 0.0
+                length = np.where(l_max > 0, (1.0 + beta) * area
+                                  / np.where(l_max > 0, l_max, 1.0), 0.0)
+                dt[rows] = length / mat[rows, 2]
+                mass[rows] = mat[rows, 0] * area    # unit thickness, see *SECTION_SHELL
+            else:
+                # Divergence theorem: V = |sum(centroid . area vector)| / 3
+                vol3 = np.zeros(len(rows))
+                a_max = np.zeros(len(rows))
+                for face in faces:
+                    corners = pts[:, list(face)]
+                    av = _np_area(corners)
+                    vol3 += (av * corners.sum(axis=1) / len(face)).sum(axis=1)
+                    a_max = np.maximum(a_max, (av ** 2).sum(axis=1))
+                vol = np.abs(vol3) / 3.0
+                a_max = np.sqrt(a_max)
+                length = np.where(a_max > 0, vol / np.where(a_max > 0, a_max, 1.0), 0.0)
+                if len(faces) == 4:
+                    length *= 3.0
+                dt[rows] = length / mat[rows, 1]
+                mass[rows] = mat[rows, 0] * vol
+            le[rows] = length
+        self.dt = array('d', dt.tobytes())
+        self.le = array('d', le.tobytes())
+        self.mass = array('d', mass.tobytes())
+
+    def _build(self, node_table, elem_table, mats, scale):
+        import math
+        xyz, index_of = node_table.xyz, node_table.index_of
+        conn, offsets = elem_table.conn, elem_table.offsets
+        pids, shell = elem_table.pids, elem_table.shell
+        dt, le, mass = self.dt, self.le, self.mass
+        for r in range(len(elem_table)):
+            mat = mats.get(pids[r])
+            if mat is None:
+                continue
+            pts = []
+            for nid in conn[offsets[r]:offsets[r + 1]]:
+                i = index_of(nid)
+                if i < 0:
+                    break
+                pts.append((xyz[3 * i] * scale, xyz[3 * i + 1] * scale,
+                            xyz[3 * i + 2] * scale))
+            else:
+                faces = face_topology(len(pts), bool(shell[r]))
+                if not faces:
+                    continue
+                if shell[r]:
+                    corners = [pts[k] for k in faces[0]]
+                    ax, ay, az = _area(corners)
+                    area = math.sqrt(ax * ax + ay * ay + az * az)
+                    l_max = 0.0
+                    for k in range(len(corners)):
+                        p, q = corners[k], corners[k - 1]
+                        dx, dy, dz = p[0] - q[0], p[1] - q[1], p[2] - q[2]
+                        l_max = max(l_max, math.sqrt(dx * dx + dy * dy + dz * dz))
+                    beta = 1.0 if len(corners) == 3 else 0.0
+                    length = (1.0 + beta) * area / l_max if l_max > 0 else 0.0
+                    le[r] = length
+                    dt[r] = length / mat[2]
+                    mass[r] = mat[0] * area   # unit thickness, see *SECTION_SHELL
+                    continue
+                # Divergence theorem: V = |sum(centroid . area vector)| / 3
+                vol3, a_max = 0.0, 0.0
+                for face in faces:
+                    corners = [pts[k] for k in face]
+                    ax, ay, az = _area(corners)
+                    m = float(len(corners))
+                    vol3 += (ax * sum(c[0] for c in corners) / m
+                             + ay * sum(c[1] for c in corners) / m
+                             + az * sum(c[2] for c in corners) / m)
+                    a_max = max(a_max, ax * ax + ay * ay + az * az)
+                vol = abs(vol3) / 3.0
+                a_max = math.sqrt(a_max)
+                length = vol / a_max if a_max > 0 else 0.0
+                if len(faces) == 4:
+                    length *= 3.0
+                le[r] = length
+                dt[r] = length / mat[1]
+                mass[r] = mat[0] * vol
+
+    def smallest(self, k):
+        """Rows of the k elements with the smallest dt, ascending."""
+        import heapq
+        dt = self.dt
+        return heapq.nsmallest(k, (r for r in range(len(dt)) if dt[r] < float('inf')),
+                               key=dt.__getitem__)
+
+    def per_part(self):
+        """{pid: row of the part's controlling (smallest dt) element}."""
+        dt, pids = self.dt, self.elem_table.pids
+        best = {}
+        for r in range(len(dt)):
+            b = best.get(pids[r])
+            if b is None or dt[r] < dt[b]:
+                best[pids[r]] = r
+        return best
+
+    def mass_scaling(self, fraction=0.01):
+        """
+        Suggested DT2MS so that only the `fraction` smallest-dt elements are
+        mass-scaled: |DT2MS| = dt at that quantile, since LS-DYNA scales
+        elements with TSSFAC * dt_e < TSSFAC * |DT2MS|. Returns
+        (dt2ms, elements scaled, added mass / total mass), or None.
+        """
+        dt, mass = self.dt, self.mass
+        valid = sorted(d for d in dt if d < float('inf'))
+        if not valid:
+            return None
+        target = valid[min(len(valid) - 1, int(len(valid) * fraction))]
+        added, total, n_scaled = 0.0, 0.0, 0
+        for r in range(len(dt)):
+            if dt[r] == float('inf'):
+                continue
+            total += mass[r]
+            if dt[r] < target:
+                n_scaled += 1
+                if dt[r] > 0:
+                    added += mass[r] * ((target / dt[r]) ** 2 - 1.0)
+        return -target, n_scaled, (added / total if total > 0 else 0.0)
+
+
+def _area(p):
+    """Area vector of a tri / (possibly warped) quad face given its corners."""
+    if len(p) == 3:
+        a = [p[1][q] - p[0][q] for q in range(3)]
+        b = [p[2][q] - p[0][q] for q in range(3)]
+    else:
+        a = [p[2][q] - p[0][q] for q in range(3)]
+        b = [p[3][q] - p[1][q] for q in range(3)]
+    return (0.5 * (a[1] * b[2] - a[2] * b[1]),
+            0.5 * (a[2] * b[0] - a[0] * b[2]),
+            0.5 * (a[0] * b[1] - a[1] * b[0]))
+
+
+def _np_area(p):
+    """_area over a NumPy (m, 3 or 4, 3) stack of faces: (m, 3) vectors."""
+    if p.shape[1] == 3:
+        a, b = p[:, 1] - p[:, 0], p[:, 2] - p[:, 0]
+    else:
+        a, b = p[:, 2] - p[:, 0], p[:, 3] - p[:, 1]
+    return 0.5 * _np.cross(a, b)
+
+
+# ── Neutral mesh dump (.kdump) ────────────────────────────────────────────
+
+DUMP_MAGIC = b"MXKDUMP1"
+
+
+class MeshDump(object):
+    """Everything the write phase needs, as read back by read_dump()."""
+
+    def __init__(self):
+        self.unit_label = ""
+        self.scale = 1.0
+        self.body_pid_map = {}
+        self.node_table = NodeTable()
+        self.elem_table = ElementTable()
+        self.mat_rows = None
+        self.ns_sets = None
+        self.surface_faces = None
+        self.contacts = None
+
+    def contact_data(self):
+        if self.contacts is None:
+            return None
+        return self.surface_faces, self.contacts
+
+
+def write_dump(path, unit_label, scale, node_table, elem_table, body_pid_map,
+               mat_rows=None, ns_sets=None, surface_faces=None, contacts=None):
+    """
+    Write the exporter's plain tables to a binary dump:
+      DUMP_MAGIC, little-endian uint32 header size, JSON header, then the
+      raw bytes (in header['byteorder']) of each array listed in
+      header['arrays'] as [name, typecode, length].
+    NS node lists and contact face lists are stored flattened with offsets.
+    """
+    import json
+    arrays = [
+        ('node_ids', node_table.ids), ('node_xyz', node_table.xyz),
+        ('elem_ids', elem_table.ids), ('elem_pids', elem_table.pids),
+        ('elem_shell', elem_table.shell), ('elem_conn', elem_table.conn),
+        ('elem_offsets', elem_table.offsets),
+    ]
+    header = {
+        'version': 1,
+        'byteorder': sys.byteorder,
+        'unit': unit_label,
+        'scale': scale,
+        'parts': sorted([name, pid] for name, pid in body_pid_map.items()),
+        'materials': [list(row) for row in mat_rows] if mat_rows is not None else None,
+        'ns_names': None,
+        'contacts': None,
+    }
+    if ns_sets is not None:
+        ns_ids, ns_offsets = array('i'), array('i', [0])
+        for _name, ids in ns_sets:
+            ns_ids.extend(ids)
+            ns_offsets.append(len(ns_ids))
+        header['ns_names'] = [name for name, _ids in ns_sets]
+        arrays += [('ns_ids', ns_ids), ('ns_offsets', ns_offsets)]
+    if contacts is not None:
+        seg, seg_offsets = array('i'), array('i', [0])
+        for c in contacts:
+            for side in ('slave', 'master'):
+                seg.extend(c[side])
+                seg_offsets.append(len(seg))
+        header['contacts'] = [
+            dict((k, c.get(k, 0)) for k in ('name', 'kw', 'mu', 'slave_id', 'master_id',
+                                             'slave_pid', 'master_pid'))
+            for c in contacts]
+        arrays += [('face_rows', surface_faces.rows), ('face_eids', surface_faces.eids),
+                   ('face_nodes', surface_faces.nodes),
+                   ('seg_faces', seg), ('seg_offsets', seg_offsets)]
+    header['arrays'] = [[name, a.typecode, len(a)] for name, a in arrays]
+
+    blob = json.dumps(header).encode('utf-8')
+    tmp = path + ".tmp"
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(DUMP_MAGIC)
+            f.write(struct.pack('<I', len(blob)))
+            f.write(blob)
+            for _name, a in arrays:
+                f.write(array_bytes(a))
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    if os.path.exists(path):
+        os.remove(path)
+    os.rename(tmp, path)
+    return path
+
+
+def read_dump(path):
+    """Read a write_dump() file back into a MeshDump."""
+    import json
+    with open(path, 'rb') as f:
+        if f.read(len(DUMP_MAGIC)) != DUMP_MAGIC:
+            raise ValueError("not a k-file mesh dump: " + path)
+        size = struct.unpack('<I', f.read(4))[0]
+        header = json.loads(f.read(size).decode('utf-8'))
+        swap = header['byteorder'] != sys.byteorder
+        arrays = {}
+        for name, typecode, n in header['arrays']:
+            a = array(typecode)
+            a.fromfile(f, n)
+            if swap:
+                a.byteswap()
+            arrays[name] = a
+
+    dump = MeshDump()
+    dump.unit_label = header['unit']
+    dump.scale = header['scale']
+    dump.body_pid_map = dict((name, pid) for name, pid in header['parts'])
+    dump.node_table.ids = arrays['node_ids']
+    dump.node_table.xyz = arrays['node_xyz']
+    dump.node_table.freeze()
+    et = dump.elem_table
+    et.ids, et.pids, et.shell = arrays['elem_ids'], arrays['elem_pids'], arrays['elem_shell']
+    et.conn, et.offsets = arrays['elem_conn'], arrays['elem_offsets']
+    if header['materials'] is not None:
+        dump.mat_rows = [tuple(row) for row in header['materials']]
+    if header['ns_names'] is not None:
+        ids, off = arrays['ns_ids'], arrays['ns_offsets']
+        dump.ns_sets = [(name, ids[off[k]:off[k + 1]])
+                        for k, name in enumerate(header['ns_names'])]
+    if header['contacts'] is not None:
+        faces = dump.surface_faces = BoundaryFaces()
+        faces.rows, faces.eids, faces.nodes = (
+            arrays['face_rows'], arrays['face_eids'], arrays['face_nodes'])
+        seg, off = arrays['seg_faces'], arrays['seg_offsets']
+        dump.contacts = []
+        for k, c in enumerate(header['contacts']):
+            c['slave'] = seg[off[2 * k]:off[2 * k + 1]]
+            c['master'] = seg[off[2 * k + 1]:off[2 * k + 2]]
+            dump.contacts.append(c)
+    return dump
@@ -0,0 +1,201 @@
+# encoding: utf-8
+"""
+MX Digital Twin - incremental include export
+
+The deck is split into content-hashed *INCLUDE files (orphan nodes, one
+file per part, materials, sets, contacts) and a '<base>.kmanifest.json'
+records each file's hash. A re-export rewrites only the files whose
+hash changed, then the master deck and the manifest. Used by
+ExportKFileDialog (Include mode + Incremental); tables only.
+"""
+
+import json
+import os
+from array import array
+
+from kfile import core
+
+
+MANIFEST_VERSION = 1
+
+
+def _no_log(msg):
+    pass
+
+
+def manifest_path(path):
+    return os.path.splitext(path)[0] + ".kmanifest.json"
+
+
+def load_manifest(path, unit_label):
+    """Previous export's manifest, or {} if missing/unreadable/other units."""
+    try:
+        with open(manifest_path(path)) as f:
+            manifest = json.load(f)
+    except Exception:
+        return {}
+    if (manifest.get('version') != MANIFEST_VERSION
+            or manifest.get('unit') != unit_label):
+        return {}
+    return manifest
+
+
+def incremental_sections(path, node_table, elem_table, body_pid_map,
+                         scale, threads, mat_rows, ns_sets, contact_data,
+                         compact_sets=False):
+    """
+    Split the deck into content-hashed include files: orphan nodes, one
+    file per part (its *SECTION/*PART/*ELEMENT plus the nodes it owns),
+    materials, sets and contacts. A part file only depends on its own
+    data, so its section id is the part id. Returns a list of
+    (key, rel_path, hash, write_fn, regions) in *INCLUDE order, where
+    regions maps each NS / contact name in the file to its own hash.
+    """
+    base = os.path.splitext(os.path.basename(path))[0]
+    sections = []
+    owners = elem_table.node_owners(node_table)
+    nids, xyz = node_table.ids, node_table.xyz
+
+    def _node_hash(rows):
+        coords = array('d')
+        for i in rows:
+            coords.extend(xyz[3 * i:3 * i + 3])
+        return core.content_hash(scale, array('i', (nids[i] for i in rows)), coords)
+
+    orphans = owners.pop(None, None)
+    if orphans:
+        sections.append((
+            'nodes', base + "_nodes.k", _node_hash(orphans),
+            lambda out: core.write_nodes(out, node_table, scale, threads, orphans),
+            {}))
+
+    eids, conn, offsets = elem_table.ids, elem_table.conn, elem_table.offsets
+    for pid, rows in sorted(elem_table.rows_by_part().items()):
+        name = core.part_name(body_pid_map, pid)
+        own = owners.get(pid, array('i'))
+        counts = array('i')
+        part_conn = array('i')
+        for r in rows:
+            counts.append(offsets[r + 1] - offsets[r])
+            part_conn.extend(conn[offsets[r]:offsets[r + 1]])
+        digest = core.content_hash(
+            pid, name, elem_table.shell[rows[0]], _node_hash(own),
+            array('i', (eids[r] for r in rows)), counts, part_conn)
+
+        def _write_part_file(out, pid=pid, rows=rows, own=own, name=name):
+            if own:
+                core.write_nodes(out, node_table, scale, threads, own)
+            core.write_part(out, elem_table, pid, rows, pid, name, threads)
+        sections.append((
+            'part_{0}'.format(pid),
+            "{0}_parts/part_{1}.k".format(base, pid),
+            digest, _write_part_file, {}))
+
+    if mat_rows is not None:
+        sections.append((
+            'materials', base + "_materials.k", core.content_hash(mat_rows),
+            lambda out: core.write_materials(out, mat_rows), {}))
+
+    if ns_sets is not None:
+        # Set ids follow list order, so the file hash covers the order
+        regions = [("NS:" + name, core.content_hash(name, array('i', ids)))
+                   for name, ids in ns_sets]
+        sections.append((
+            'sets', base + "_sets.k", core.content_hash(compact_sets, regions),
+            lambda out: core.write_named_selections(out, ns_sets, compact_sets),
+            dict(regions)))
+
+    if contact_data is not None:
+        surface_faces, contacts = contact_data
+        fnodes = surface_faces.nodes if surface_faces is not None else ()
+
+        def _seg_nodes(faces):
+            seg = array('i')
+            for f in faces:
+                seg.extend(fnodes[4 * f:4 * f + 4])
+            return seg
+
+        regions = [("CONTACT:" + c['name'], core.content_hash(
+                       c['name'], c['kw'], c['mu'], c['slave_id'], c['master_id'],
+                       c.get('slave_pid', 0), c.get('master_pid', 0),
+                       _seg_nodes(c['slave']), _seg_nodes(c['master'])))
+                   for c in contacts]
+        sections.append((
+            'contacts', base + "_contacts.k", core.content_hash(regions),
+            lambda out: core.write_contacts(out, surface_faces, contacts),
+            dict(regions)))
+
+    return sections
+
+
+def write_incremental_deck(path, header, unit_label, sections, threads,
+                           progress=None, log=None):
+    """
+    Rewrite only the include files whose hash differs from the previous
+    manifest (or whose file is missing), then the master deck and the
+    manifest. Include files of sections that no longer exist are removed.
+    Returns the list of files written.
+    """
+    log = log or _no_log
+    folder = os.path.dirname(path)
+    old = load_manifest(path, unit_label)
+    old_files = old.get('files', {})
+    old_regions = old.get('regions', {})
+
+    jobs = []
+    for key, rel, digest, write, _regions in sections:
+        inc_path = os.path.join(folder, rel)
+        prev = old_files.get(key)
+        if (prev is None or prev.get('hash') != digest
+                or not os.path.exists(inc_path)):
+            jobs.append((key, inc_path, write))
+    for inc_dir in set(os.path.dirname(p) for _k, p, _w in jobs):
+        if not os.path.isdir(inc_dir):
+            os.makedirs(inc_dir)
+    # Nothing is replaced until the includes and the master are all
+    # complete, so a cancelled export leaves the previous deck intact.
+    staged = [inc for _k, inc, _w in jobs] + [path]
+    try:
+        core.write_include_files(path, jobs, threads, progress, defer=True)
+        with core.KFileWriter(path, progress=progress, defer=True) as out:
+            for line in header:
+                out.append(line)
+            for _key, rel, _d, _w, _r in sections:
+                out.append("*INCLUDE")
+                out.append(rel)
+            out.append("*END")
+    except Exception:
+        core.discard_files(staged)
+        raise
+    core.commit_files(staged)
+
+    regions = {}
+    for section in sections:
+        regions.update(section[4])
+    changed = sorted(k for k, h in regions.items() if old_regions.get(k) != h)
+    log("Incremental: {0} of {1} include files rewritten, {2} reused".format(
+        len(jobs), len(sections), len(sections) - len(jobs)))
+    if changed:
+        log("  Changed regions: " + ", ".join(changed))
+
+    keys = set(s[0] for s in sections)
+    for key, prev in old_files.items():
+        stale = os.path.join(folder, prev.get('file', ''))
+        if key not in keys and os.path.isfile(stale):
+            try:
+                os.remove(stale)
+                log("  Removed stale include: " + prev.get('file', ''))
+            except Exception as ex:
+                log("  WARN cannot remove {0}: {1}".format(stale, ex))
+
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'unit': unit_label,
+        'files': dict((key, {'file': rel, 'hash': digest})
+                      for key, rel, digest, _w, _r in sections),
+        'regions': regions,
+    }
+    with open(manifest_path(path), 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    return [inc for _k, inc, _w in jobs] + [path, manifest_path(path)]
+
@@ -0,0 +1,205 @@
+# encoding: utf-8
+"""
+MX Digital Twin - export phase instrumentation
+
+PhaseProfile records, per export phase, wall time, MeshData API calls
+and memory:
+
+  managed  .NET GC heap sampled at the phase end, and its change over
+           the phase (IronPython / Mechanical); two samples, not a peak
+  process  peak working set (.NET) or peak RSS (CPython), process-wide
+  python   tracemalloc peak inside the phase (CPython 3.9+, when tracing)
+
+Phases are delimited with mark(name); finish() closes the last one.
+Results go to the export log as a table and to '<base>.kprofile.json'.
+"""
+
+import json
+import os
+import sys
+import time
+
+try:
+    import System
+    from System.Diagnostics import Process as _Process
+except ImportError:
+    System = None
+
+try:
+    import resource as _resource
+except ImportError:
+    _resource = None
+
+try:
+    import tracemalloc as _tracemalloc
+except ImportError:
+    _tracemalloc = None
+
+_MB = 1048576.0
+
+
+def _managed_mb():
+    if System is None:
+        return None
+    return System.GC.GetTotalMemory(False) / _MB
+
+
+def _process_peak_mb():
+    if System is not None:
+        return _Process.GetCurrentProcess().PeakWorkingSet64 / _MB
+    if _resource is not None:
+        rss = _resource.getrusage(_resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is KB on Linux, bytes on macOS
+        return rss / (_MB if sys.platform == 'darwin' else 1024.0)
+    return None
+
+
+def _tracing():
+    # Per-phase peaks need reset_peak() (Python 3.9+)
+    return (_tracemalloc is not None and hasattr(_tracemalloc, 'reset_peak')
+            and _tracemalloc.is_tracing())
+
+
+def profile_path(path):
+    return os.path.splitext(path)[0] + ".kprofile.json"
+
+
+class CallCounter(object):
+    """
+    Transparent proxy that counts attribute reads / method calls on a
+    MeshData object. Bound methods are wrapped once and cached, so the
+    per-call overhead in the node / element loops is one Python call.
+    """
+
+    def __init__(self, target):
+        self.__dict__['_target'] = target
+        self.__dict__['calls'] = {}
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        calls = self.calls
+        if not callable(attr):
+            calls[name] = calls.get(name, 0) + 1
+            return attr     # property: counted per read, not cached
+
+        def _call(*args):
+            calls[name] = calls.get(name, 0) + 1
+            return attr(*args)
+        self.__dict__[name] = _call
+        return _call
+
+    def __dir__(self):
+        return dir(self._target)
+
+    def total(self):
+        return sum(self.calls.values())
+
+
+class PhaseProfile(object):
+    """Per-phase wall time, API call count and memory samples."""
+
+    def __init__(self):
+        self.phases = []
+        self.counters = []
+        self._current = None
+        self._t_start = time.time()
+        self._t_end = None
+
+    def count_calls(self, target):
+        """Wrap target in a CallCounter whose calls are charged to phases."""
+        counter = CallCounter(target)
+        self.counters.append(counter)
+        return counter
+
+    def _api_calls(self):
+        return sum(c.total() for c in self.counters)
+
+    def mark(self, name):
+        """End the running phase (if any) and start phase name."""
+        self._close()
+        if _tracing():
+            _tracemalloc.reset_peak()
+        self._current = {'name': name, 't0': time.time(),
+                         'calls0': self._api_calls(), 'managed0': _managed_mb()}
+
+    def _close(self):
+        cur = self._current
+        if cur is None:
+            return
+        self._current = None
+        managed = _managed_mb()
+        row = {
+            'phase': cur['name'],
+            'wall_s': round(time.time() - cur['t0'], 4),
+            'api_calls': self._api_calls() - cur['calls0'],
+            'managed_mb': _round(managed),
+            'managed_delta_mb': None if managed is None else round(
+                managed - cur['managed0'], 1),
+            'process_peak_mb': _round(_process_peak_mb()),
+            'python_peak_mb': _round(
+                _tracemalloc.get_traced_memory()[1] / _MB if _tracing() else None),
+        }
+        self.phases.append(row)
+
+    def finish(self):
+        self._close()
+        self._t_end = time.time()
+        return self
+
+    def totals(self):
+        def _max(key):
+            vals = [p[key] for p in self.phases if p[key] is not None]
+            return max(vals) if vals else None
+        deltas = [p['managed_delta_mb'] for p in self.phases
+                  if p['managed_delta_mb'] is not None]
+        return {
+            'wall_s': round((self._t_end or time.time()) - self._t_start, 4),
+            'api_calls': self._api_calls(),
+            'managed_mb': _max('managed_mb'),
+            'managed_delta_mb': round(sum(deltas), 1) if deltas else None,
+            'process_peak_mb': _max('process_peak_mb'),
+            'python_peak_mb': _max('python_peak_mb'),
+        }
+
+    def table(self):
+        """Log lines: one row per phase plus the totals."""
+        fmt = "  {0:<18}{1:>9}{2:>11}{3:>10}{4:>10}{5:>11}{6:>11}".format
+        lines = [fmt("Phase", "Time s", "API calls", "GC end MB", "GC +/- MB",
+                     "Peak MB", "Python MB")]
+        rows = list(self.phases) + [dict(self.totals(), phase="Total")]
+        for p in rows:
+            lines.append(fmt(p['phase'], "{0:.3f}".format(p['wall_s']),
+                             p['api_calls'], _cell(p['managed_mb']),
+                             _cell(p['managed_delta_mb']),
+                             _cell(p['process_peak_mb']), _cell(p['python_peak_mb'])))
+        return lines
+
+    def write(self, path, info=None):
+        """Write the JSON sidecar for deck path; returns its path."""
+        calls = {}
+        for c in self.counters:
+            for name, n in c.calls.items():
+                calls[name] = calls.get(name, 0) + n
+        data = {
+            'deck': os.path.basename(path),
+            'created': time.strftime("%Y-%m-%d %H:%M:%S"),
+            'runtime': sys.version.split()[0] + (
+                " (IronPython)" if System is not None else ""),
+            'phases': self.phases,
+            'totals': self.totals(),
+            'api_calls_by_method': calls,
+        }
+        if info:
+            data['export'] = info
+        out = profile_path(path)
+        with open(out, 'w') as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+        return out
+
+
+def _round(v):
+    return None if v is None else round(v, 1)
+
+
+def _cell(v):
+    return "-" if v is None else "{0:.1f}".format(v)
@@ -0,0 +1,356 @@
+# encoding: utf-8
+"""
+MX Digital Twin - MeshData readers
+
+The read phase of Export K-File: MeshData (or anything with the same
+NodeById / ElementById / NodeCount / ElementCount / GetNodeIdsFromRegionIds
+surface) -> kfile.core tables. Only duck-typed attribute access, so the
+ACT dialog passes the real Mechanical MeshData and the benchmark
+(python -m kfile bench) passes its synthetic stand-in. GeoFaceIndex
+looks up geometry faces of the model bodies by Id / PersistentId.
+"""
+
+from array import array
+
+from kfile import core
+
+
+def _no_log(msg):
+    pass
+
+
+# ── *NODE reader ──────────────────────────────────────────────────────────
+
+def read_nodes(mesh_data, log=None):
+    """
+    Read all nodes from MeshData into a NodeTable of unscaled
+    coordinates (meters).
+    """
+    log = log or _no_log
+    node_table = core.NodeTable()
+
+    def _try_node(node):
+        return node.Id, node.X, node.Y, node.Z
+
+    # Try NodeById first (1-based sequential IDs are common)
+    try:
+        n = mesh_data.NodeCount
+        for nid in range(1, n + 1):
+            try:
+                node = mesh_data.NodeById(nid)
+                nid_r, x, y, z = _try_node(node)
+                node_table.add(nid_r, x, y, z)
+            except Exception:
+                pass
+        if len(node_table) > 0:
+            node_table.freeze()
+            return node_table
+    except Exception as ex:
+        log("  [NODE] NodeById failed: " + str(ex))
+
+    # Fallback: NodeByIndex (0-based)
+    try:
+        n = mesh_data.NodeCount
+        for i in range(n):
+            try:
+                node = mesh_data.NodeByIndex(i)
+                nid_r, x, y, z = _try_node(node)
+                node_table.add(nid_r, x, y, z)
+            except Exception:
+                pass
+    except Exception as ex2:
+        log("  [NODE] NodeByIndex also failed: " + str(ex2))
+
+    node_table.freeze()
+    return node_table
+
+
+# ── *ELEMENT reader ───────────────────────────────────────────────────────
+
+class ElementAccessor(object):
+    """
+    MeshData element accessors resolved once per mesh. The part id
+    attribute is probed on the first element only, and each ElementType
+    value is classified once (core.element_type), so reading an element
+    is plain attribute access and a dict lookup - no getattr probing or
+    exceptions per element.
+    """
+
+    PID_ATTRS = ('PartId', 'BodyId', 'Part', 'Body')
+
+    def __init__(self, sample):
+        self.pid_attr = None
+        for attr in self.PID_ATTRS:
+            try:
+                int(getattr(sample, attr))
+                self.pid_attr = attr
+                break
+            except Exception:
+                pass
+        self.has_type = hasattr(sample, 'ElementType')
+        self.types = {}      # ElementType value -> (name, node count, shell)
+        self.counts = {}     # ElementType value -> elements read
+
+    def part_id(self, elem):
+        return int(getattr(elem, self.pid_attr)) if self.pid_attr else 1
+
+    def is_shell(self, elem, n_nodes):
+        etype = elem.ElementType if self.has_type else None
+        info = self.types.get(etype)
+        if info is None:
+            name = str(etype).split('.')[-1] if etype is not None else ""
+            info = self.types[etype] = (name,) + core.element_type(name, n_nodes)
+            self.counts[etype] = 0
+        self.counts[etype] += 1
+        return info[2]
+
+    def summary(self):
+        """[(type name, elements, shell)] in first-seen order."""
+        return [(name, self.counts[et], shell)
+                for et, (name, _n, shell) in self.types.items()]
+
+
+def _add_elements(elem_table, get, keys, acc):
+    """
+    elem_table.add() for get(k), k in keys; returns (the possibly new
+    ElementAccessor, elements skipped). The loop body has no exception
+    handler: an element MeshData cannot return breaks out of the inner
+    loop, is counted, and the loop resumes at the next key.
+    """
+    failed = 0
+    keys = iter(keys)
+    while True:
+        try:
+            for k in keys:
+                elem = get(k)
+                if acc is None:
+                    acc = ElementAccessor(elem)
+                nids = list(elem.NodeIds)
+                elem_table.add(elem.Id, acc.part_id(elem), nids,
+                               acc.is_shell(elem, len(nids)))
+            return acc, failed
+        except Exception:
+            failed += 1
+
+
+def _log_types(acc, failed, log):
+    if failed:
+        log("  [ELEM] WARNING: {0} elements could not be read (skipped)".format(failed))
+    if acc is None:
+        return
+    log("  [ELEM] part id from {0}".format(acc.pid_attr or "(none, all part 1)"))
+    for name, count, shell in acc.summary():
+        log("  [ELEM] {0}: {1} {2}".format(
+            name or "?", count, "shells" if shell else "solids"))
+
+
+def read_elements(mesh_data, log=None):
+    """
+    Single MeshData pass over all elements. Returns an ElementTable
+    shared by the element writer and contact face extraction.
+    """
+    log = log or _no_log
+    elem_table = core.ElementTable()
+    acc, failed = None, 0
+    try:
+        n = mesh_data.ElementCount
+        acc, failed = _add_elements(elem_table, mesh_data.ElementById,
+                                    range(1, n + 1), acc)
+    except Exception as ex:
+        log("  [ELEM] ElementById failed: " + str(ex))
+
+    # Fallback: ElementByIndex
+    if not len(elem_table):
+        try:
+            n = mesh_data.ElementCount
+            acc, failed = _add_elements(elem_table, mesh_data.ElementByIndex,
+                                        range(n), acc)
+        except Exception as ex2:
+            log("  [ELEM] ElementByIndex also failed: " + str(ex2))
+
+    _log_types(acc, failed, log)
+    return elem_table
+
+
+# ── Body subset ───────────────────────────────────────────────────────────
+
+def read_subset(mesh_data, body_ids, log=None):
+    """
+    Elements of the given bodies and only the nodes they reference, read
+    straight from the bodies' mesh regions (MeshRegionById, region id =
+    geometry body id) without visiting the rest of the mesh.
+    Returns (NodeTable, ElementTable) with the original ids, or None
+    when MeshData has no MeshRegionById.
+    """
+    log = log or _no_log
+    if not hasattr(mesh_data, 'MeshRegionById'):
+        return None
+    eids = set()
+    for bid in body_ids:
+        try:
+            eids.update(int(e) for e in mesh_data.MeshRegionById(bid).ElementIds)
+        except Exception as ex:
+            log("  [SUBSET] body {0}: no mesh region ({1})".format(bid, ex))
+    elem_table = core.ElementTable()
+    acc, failed = _add_elements(elem_table, mesh_data.ElementById, sorted(eids), None)
+    _log_types(acc, failed, log)
+
+    node_table = core.NodeTable()
+    by_id = mesh_data.NodeById
+    for nid in sorted(set(elem_table.conn)):
+        try:
+            node = by_id(nid)
+            node_table.add(node.Id, node.X, node.Y, node.Z)
+        except Exception:
+            pass
+    node_table.freeze()
+    return node_table, elem_table
+
+
+def filter_parts(node_table, elem_table, pids):
+    """
+    Fallback for read_subset: copies of full tables restricted to the
+    elements of part ids pids and the nodes those elements reference.
+    """
+    pids = set(pids)
+    sub = core.ElementTable()
+    used = set()
+    for r in range(len(elem_table)):
+        if elem_table.pids[r] in pids:
+            nids = elem_table.nodes(r)
+            sub.add(elem_table.ids[r], elem_table.pids[r], nids,
+                    elem_table.shell[r])
+            used.update(nids)
+    nodes = core.NodeTable()
+    for i, nid in enumerate(node_table.ids):
+        if nid in used:
+            k = 3 * i
+            nodes.add(nid, node_table.xyz[k], node_table.xyz[k + 1],
+                      node_table.xyz[k + 2])
+    nodes.freeze()
+    return nodes, sub
+
+
+def contains_all(node_table, node_ids):
+    """True when every node id is in node_table (region inside the subset)."""
+    return all(nid in node_table for nid in node_ids)
+
+
+# ── Geometry faces ────────────────────────────────────────────────────────
+
+class GeoFaceIndex(object):
+    """
+    Geometry face lookup built in one traversal of the given bodies
+    (anything with GetGeoBody().Faces, e.g. Mechanical bodies).
+    Maps both GeoFace.Id and GeoFace.PersistentId to (face, owning body);
+    the first body owning an id wins, matching a linear body scan.
+    """
+
+    def __init__(self, bodies):
+        self.by_id = {}
+        self.by_persistent_id = {}
+        self.n_faces = 0
+        for body in bodies:
+            try:
+                faces = body.GetGeoBody().Faces
+            except Exception:
+                continue
+            for f in faces:
+                self.n_faces += 1
+                try:
+                    self.by_id.setdefault(f.Id, (f, body))
+                except Exception:
+                    pass
+                try:
+                    self.by_persistent_id.setdefault(f.PersistentId, (f, body))
+                except Exception:
+                    pass
+
+    def body_of(self, face_id):
+        entry = self.by_id.get(face_id)
+        return entry[1] if entry else None
+
+
+# ── Region → nodes ────────────────────────────────────────────────────────
+
+class RegionNodeResolver(object):
+    """
+    Batched geometry-region -> mesh node resolution.
+    Callers request() every region id up front; resolve() converts all
+    pending ids with as few GetNodeIdsFromRegionIds calls as possible and
+    caches each region as a sorted array('i'). nodes() then assembles any
+    NS or contact side from the cache.
+    """
+
+    def __init__(self, mesh_data):
+        self.mesh_data = mesh_data
+        self.api_calls = 0
+        self._cache = {}
+        self._pending = set()
+
+    def __len__(self):
+        return len(self._cache)
+
+    def request(self, region_ids):
+        for rid in region_ids:
+            rid = int(rid)
+            if rid not in self._cache:
+                self._pending.add(rid)
+
+    def resolve(self):
+        if not self._pending:
+            return
+        ids = sorted(self._pending)
+        self._pending = set()
+        try:
+            self.api_calls += 1
+            self._store(self.mesh_data.GetNodeIdsFromRegionIds(ids))
+        except Exception:
+            # One bad id fails the whole batch: fall back to one call per region
+            for rid in ids:
+                try:
+                    self.api_calls += 1
+                    self._store(self.mesh_data.GetNodeIdsFromRegionIds([rid]))
+                except Exception:
+                    pass
+        for rid in ids:
+            if rid not in self._cache:
+                self._cache[rid] = array('i')
+
+    def _store(self, node_dict):
+        # node_dict is KeyValuePair<int, IList<int>> per region
+        for kvp in node_dict:
+            self._cache[int(kvp.Key)] = array(
+                'i', sorted(set(int(nid) for nid in kvp.Value)))
+
+    def nodes(self, region_ids):
+        """Sorted array('i') of the union of the regions' node ids."""
+        self.request(region_ids)
+        self.resolve()
+        parts = [self._cache[int(rid)] for rid in region_ids]
+        if len(parts) == 1:
+            return parts[0]
+        merged = set()
+        for p in parts:
+            merged.update(p)
+        return array('i', sorted(merged))
+
+
+def region_faces(surface_faces, region_list):
+    """
+    Boundary faces whose nodes ALL lie in region_list (sorted node ids).
+    Returns sorted array('i') of face indices into surface_faces.
+    """
+    result = array('i')
+    region_nodes = set(region_list)
+    if not region_nodes:
+        return result
+
+    # Only faces touching a region node are candidates (inverted index);
+    # each is tested once, from its lowest node id
+    for nid in region_list:
+        for f in surface_faces.faces_of(nid):
+            nodes = surface_faces.face_nodes(f)
+            if min(nodes) == nid and all(n in region_nodes for n in nodes):
+                result.append(f)
+    return array('i', sorted(result))
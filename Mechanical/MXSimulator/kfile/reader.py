@@ -0,0 +1,570 @@
+# encoding: utf-8
+"""
+MX Digital Twin - streaming LS-DYNA keyword reader + deck validator
+
+read_deck() memory-maps a .k file and walks it keyword by keyword. Only
+the cards a referential check needs are kept, as flat arrays: node ids,
+element ids / parts / node references, node / segment / part sets, parts
+and contact set references. Keyword boundaries are found with mmap.find
+and data is split in fixed-size windows, so a multi-GB deck is never
+loaded as a whole. *INCLUDE files are followed (paths relative to the
+including file).
+
+Handles ExportKFileDialog / python -m kfile output (*ELEMENT_SOLID
+two-card format, *SET_NODE_LIST_GENERATE_TITLE ranges, SURFATYP=3 part
+contacts, include decks) as well as SpaceClaim SaveDYNA decks patched by
+KFilePostProcessor (one-card *ELEMENT_SOLID, CRLF, free-format commas).
+
+validate() cross-checks the result: every element / set / segment node
+exists, every contact references a defined set or part, every element
+part is defined and no id is defined twice. NumPy, when installed,
+parses the element cards and vectorises the id checks.
+
+    python -m kfile check model.k
+"""
+
+import mmap
+import os
+import warnings
+from array import array
+from bisect import bisect_left, bisect_right
+
+try:
+    import numpy as _np
+except ImportError:
+    _np = None
+
+try:
+    import multiprocessing as _mp
+    _mp.get_context('fork')
+except Exception:
+    _mp = None
+
+WINDOW = 1 << 24     # bytes of data lines split at a time
+
+# Contact SURFATYP/SURFBTYP -> kind of id referenced
+_SURF_KIND = {0: 'segment set', 1: 'shell element set', 2: 'part set',
+              3: 'part', 4: 'node set', 5: None, 6: 'part set'}
+
+
+class KDeck(object):
+    """What read_deck() keeps of a deck (all ids as array('i'))."""
+
+    def __init__(self, path):
+        self.path = path
+        self.files = []
+        self.node_ids = array('i')
+        self.elem_ids = array('i')
+        self.elem_pids = array('i')
+        self.elem_nodes = array('i')    # node refs of all elements (0 = unused)
+        self.n_solid = 0
+        self.n_shell = 0
+        self.parts = {}                 # pid -> title
+        self.node_sets = {}             # sid -> (title, array of node ids)
+        self.node_ranges = {}           # sid -> (title, [(lo, hi)]) GENERATE
+        self.segment_sets = {}          # sid -> (title, array of 4 nodes/segment)
+        self.part_sets = {}             # sid -> (title, array of pids)
+        self.contacts = []              # dicts: kw, title, ssid, msid, sstyp, mstyp
+        self.keywords = {}              # keyword -> count
+        self.unchecked = {}             # element keywords not parsed -> count
+        self.duplicates = []            # (kind, id) defined twice
+        self.errors = []                # unreadable cards / includes
+
+    def node_set_ids(self):
+        return set(self.node_sets) | set(self.node_ranges)
+
+
+# ── Field helpers ─────────────────────────────────────────────────────────
+
+def _fields(line, width, n):
+    """n integer fields of a fixed-width or comma-separated card."""
+    if b',' in line:
+        vals = [v.strip() for v in line.split(b',')[:n]]
+    else:
+        vals = [line[k:k + width].strip() for k in range(0, width * n, width)]
+    return [int(v) if v else 0 for v in vals]
+
+
+def _ints(lines, width, n):
+    """
+    array('i') of the first n integer fields of every line, flattened.
+    Fixed-width fields normally keep a separating blank, so the joined
+    lines are parsed in one go (NumPy's text parser when available);
+    lines with blank, glued or comma separated fields fall back to
+    _fields().
+    """
+    text = b' '.join(lines)
+    if b',' not in text:
+        if _np is not None:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                vals = _np.fromstring(text, dtype=_np.intc, sep=' ')
+            if len(vals) == n * len(lines):
+                out = array('i')
+                (getattr(out, 'frombytes', None) or out.fromstring)(vals.tobytes())
+                return out
+        else:
+            flat = text.split()
+            if len(flat) == n * len(lines):
+                try:
+                    return array('i', map(int, flat))
+                except ValueError:
+                    pass
+    out = array('i')
+    for line in lines:
+        out.extend(_fields(line, width, n))
+    return out
+
+
+def _text(line):
+    return line.rstrip(b'\r\n').strip().decode('utf-8', 'replace')
+
+
+def _windows(mm, start, end):
+    """Newline-aligned (lo, hi) byte ranges of about WINDOW bytes."""
+    ranges = []
+    pos = start
+    while pos < end:
+        stop = min(end, pos + WINDOW)
+        if stop < end:
+            nl = mm.find(b'\n', stop, end)
+            stop = end if nl < 0 else nl + 1
+        ranges.append((pos, stop))
+        pos = stop
+    return ranges
+
+
+def _split_data(buf):
+    """Data lines of buf: comments and blank lines dropped."""
+    return [l for l in buf.split(b'\n') if l[:1] not in (b'$', b'', b'\r')]
+
+
+def _data_windows(mm, start, end):
+    for lo, hi in _windows(mm, start, end):
+        data = _split_data(mm[lo:hi])
+        if data:
+            yield data
+
+
+def _data_lines(mm, start, end):
+    for window in _data_windows(mm, start, end):
+        for line in window:
+            yield line
+
+
+def _first_data_line(mm, start, end):
+    pos = start
+    while pos < end:
+        eol = mm.find(b'\n', pos, end)
+        eol = end if eol < 0 else eol
+        line = mm[pos:eol]
+        if line[:1] not in (b'$', b'', b'\r'):
+            return line
+        pos = eol + 1
+    return None
+
+
+# ── *NODE / *ELEMENT_SOLID / *ELEMENT_SHELL ───────────────────────────────
+# The bulk of any deck. Blocks are cut into WINDOW-sized ranges that are
+# parsed independently - in forked worker processes when read_deck gets
+# workers > 1 - and concatenated in file order.
+
+def _is_card1(line):
+    """Two-card *ELEMENT_SOLID: card 1 holds only EID PID (16 columns)."""
+    line = line.rstrip()
+    return len(line.split(b',')) <= 2 if b',' in line else len(line) <= 16
+
+
+def _mesh_window(kw, lines, two_card):
+    """
+    One window of data lines -> (lead, ids, pids, node refs, tail).
+    A window of two-card solids may start with the second card of the
+    previous window's last element (lead) and end with a lone first card
+    (tail); _parse_mesh pairs them up.
+    """
+    lead = tail = None
+    if kw == '*NODE':
+        try:
+            ids = [int(l[:8]) for l in lines]
+        except ValueError:
+            ids = [_fields(l, 8, 1)[0] for l in lines]
+        return lead, array('i', ids), array('i'), array('i'), tail
+    if two_card:
+        if lines and not _is_card1(lines[0]):
+            lead, lines = lines[0], lines[1:]
+        if len(lines) % 2:
+            tail, lines = lines[-1], lines[:-1]
+        card1 = _ints(lines[0::2], 8, 2)
+        return lead, card1[0::2], card1[1::2], _ints(lines[1::2], 8, 10), tail
+    n = 6 if kw == '*ELEMENT_SHELL' else 10     # EID PID N1..N4 / N1..N8
+    f = _ints(lines, 8, n)
+    refs = array('i')
+    for k in range(2, n):
+        refs.extend(f[k::n])
+    return lead, f[0::n], f[1::n], refs, tail
+
+
+def _mesh_range(job):
+    # Worker entry: parse bytes lo:hi of path
+    path, kw, lo, hi, two_card = job
+    with open(path, 'rb') as f:
+        f.seek(lo)
+        buf = f.read(hi - lo)
+    return _mesh_window(kw, _split_data(buf), two_card)
+
+
+def _parse_mesh(deck, kw, mm, start, end, path, pool):
+    first = _first_data_line(mm, start, end)
+    if first is None:
+        return
+    two_card = kw == '*ELEMENT_SOLID' and _is_card1(first)
+    ranges = _windows(mm, start, end)
+    if pool is not None and len(ranges) > 1:
+        results = pool.imap(_mesh_range, [(path, kw, lo, hi, two_card)
+                                          for lo, hi in ranges])
+    else:
+        results = (_mesh_window(kw, _split_data(mm[lo:hi]), two_card)
+                   for lo, hi in ranges)
+
+    ids = deck.node_ids if kw == '*NODE' else deck.elem_ids
+    pending = None
+    for lead, w_ids, w_pids, w_refs, tail in results:
+        if lead is not None and pending is not None:
+            eid, pid = _fields(pending, 8, 2)
+            ids.append(eid)
+            deck.elem_pids.append(pid)
+            deck.elem_nodes.extend(_fields(lead, 8, 10))
+        elif lead is not None or pending is not None:
+            deck.errors.append("{0}: element card without its pair: {1}".format(
+                kw, _text(lead if lead is not None else pending)))
+        ids.extend(w_ids)
+        deck.elem_pids.extend(w_pids)
+        deck.elem_nodes.extend(w_refs)
+        pending = tail
+    if pending is not None:
+        deck.errors.append("{0}: element card without its pair: {1}".format(
+            kw, _text(pending)))
+
+
+# ── Set / part / contact parsers ──────────────────────────────────────────
+# Each takes (deck, kw, mm, start, end) for the data of one keyword block.
+
+def _titled(kw, lines):
+    """(title, first card) of a *SET_* / *PART block; _TITLE adds a line."""
+    title = _text(next(lines)) if kw.endswith('_TITLE') else ""
+    return title, next(lines)
+
+
+def _define(deck, table, kind, sid, value):
+    if sid in table:
+        deck.duplicates.append((kind, sid))
+    table[sid] = value
+
+
+def _parse_id_list(deck, kw, mm, start, end, table, kind):
+    lines = _data_lines(mm, start, end)
+    title, card = _titled(kw, lines)
+    sid = _fields(card, 10, 1)[0]
+    ids = array('i')
+    for line in lines:
+        ids.extend(v for v in _fields(line, 10, 8) if v)
+    _define(deck, table, kind, sid, (title, ids))
+
+
+def _parse_node_set(deck, kw, mm, start, end):
+    _parse_id_list(deck, kw, mm, start, end, deck.node_sets, 'node set')
+
+
+def _parse_part_set(deck, kw, mm, start, end):
+    _parse_id_list(deck, kw, mm, start, end, deck.part_sets, 'part set')
+
+
+def _parse_node_generate(deck, kw, mm, start, end):
+    lines = _data_lines(mm, start, end)
+    title, card = _titled(kw, lines)
+    sid = _fields(card, 10, 1)[0]
+    ranges = []
+    for line in lines:
+        f = _fields(line, 10, 8)
+        ranges.extend((f[k], f[k + 1]) for k in range(0, 8, 2) if f[k] or f[k + 1])
+    _define(deck, deck.node_ranges, 'node set', sid, (title, ranges))
+
+
+def _parse_segment_set(deck, kw, mm, start, end):
+    lines = _data_lines(mm, start, end)
+    title, card = _titled(kw, lines)
+    sid = _fields(card, 10, 1)[0]
+    segs = array('i')
+    for line in lines:
+        segs.extend(_fields(line, 10, 4))
+    _define(deck, deck.segment_sets, 'segment set', sid, (title, segs))
+
+
+def _parse_part(deck, kw, mm, start, end):
+    lines = _data_lines(mm, start, end)
+    for title in lines:
+        # Card pairs: heading, then PID SECID MID ...
+        pid = _fields(next(lines), 10, 1)[0]
+        _define(deck, deck.parts, 'part', pid, _text(title))
+
+
+def _parse_contact(deck, kw, mm, start, end):
+    lines = _data_lines(mm, start, end)
+    title = ""
+    if kw.endswith('_ID') or kw.endswith('_TITLE'):
+        card = next(lines)                  # CID, HEADING
+        title = _text(card[10:]) or "cid {0}".format(_fields(card, 10, 1)[0])
+    line = next(lines)
+    if '_MPP' in kw:
+        # MPP card 1, and MPP card 2 when card 1 ends with '&'
+        if line.rstrip().endswith(b'&'):
+            next(lines)
+        line = next(lines)
+    f = _fields(line, 10, 4)
+    deck.contacts.append({'kw': kw, 'title': title, 'ssid': f[0], 'msid': f[1],
+                          'sstyp': f[2], 'mstyp': f[3]})
+
+
+_PARSERS = {
+    '*SET_NODE': _parse_node_set,
+    '*SET_NODE_TITLE': _parse_node_set,
+    '*SET_NODE_LIST': _parse_node_set,
+    '*SET_NODE_LIST_TITLE': _parse_node_set,
+    '*SET_NODE_LIST_GENERATE': _parse_node_generate,
+    '*SET_NODE_LIST_GENERATE_TITLE': _parse_node_generate,
+    '*SET_SEGMENT': _parse_segment_set,
+    '*SET_SEGMENT_TITLE': _parse_segment_set,
+    '*SET_PART': _parse_part_set,
+    '*SET_PART_TITLE': _parse_part_set,
+    '*SET_PART_LIST': _parse_part_set,
+    '*SET_PART_LIST_TITLE': _parse_part_set,
+    '*PART': _parse_part,
+}
+
+
+# ── Deck walk ─────────────────────────────────────────────────────────────
+
+def read_deck(path, workers=1):
+    """
+    Parse path (and its *INCLUDE files) into a KDeck. workers > 1 parses
+    the *NODE / *ELEMENT blocks in that many forked processes (CPython on
+    platforms with fork; otherwise serially).
+    """
+    deck = KDeck(path)
+    pool = None
+    if workers > 1 and _mp is not None:
+        pool = _mp.get_context('fork').Pool(workers)
+    try:
+        _read_file(deck, path, pool)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return deck
+
+
+def _read_file(deck, path, pool):
+    path = os.path.abspath(path)
+    if path in deck.files:
+        deck.errors.append("*INCLUDE cycle: " + path)
+        return
+    deck.files.append(path)
+    if not os.path.getsize(path):
+        return
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            _walk(deck, path, mm, pool)
+        finally:
+            mm.close()
+
+
+def _walk(deck, path, mm, pool):
+    size = len(mm)
+    pos = 0 if mm[:1] == b'*' else mm.find(b'\n*')
+    while 0 <= pos < size:
+        if mm[pos:pos + 1] == b'\n':
+            pos += 1
+        eol = mm.find(b'\n', pos)
+        eol = size if eol < 0 else eol
+        nxt = mm.find(b'\n*', eol)
+        end = size if nxt < 0 else nxt + 1
+        tokens = mm[pos:eol].upper().split() or [b'*']
+        kw = tokens[0].decode('ascii', 'replace')
+        deck.keywords[kw] = deck.keywords.get(kw, 0) + 1
+        try:
+            if kw[-1:] in ('+', '%') or b'+' in tokens or b'%' in tokens or \
+                    b'LONG=Y' in tokens:
+                raise ValueError("long format is not supported")
+            _parse_block(deck, path, kw, mm, eol + 1, end, pool)
+        except (StopIteration, ValueError) as ex:
+            deck.errors.append("{0}: unreadable {1} card ({2})".format(
+                os.path.basename(path), kw, ex or "missing card"))
+        pos = nxt
+
+
+def _parse_block(deck, path, kw, mm, start, end, pool):
+    parser = _PARSERS.get(kw)
+    if kw in ('*NODE', '*ELEMENT_SOLID', '*ELEMENT_SHELL'):
+        before = len(deck.elem_ids)
+        _parse_mesh(deck, kw, mm, start, end, path, pool)
+        if kw == '*ELEMENT_SOLID':
+            deck.n_solid += len(deck.elem_ids) - before
+        elif kw == '*ELEMENT_SHELL':
+            deck.n_shell += len(deck.elem_ids) - before
+    elif parser is not None:
+        parser(deck, kw, mm, start, end)
+    elif kw.startswith('*CONTACT_'):
+        _parse_contact(deck, kw, mm, start, end)
+    elif kw == '*INCLUDE':
+        for line in _data_lines(mm, start, end):
+            inc = _text(line)
+            inc_path = os.path.join(os.path.dirname(path), inc)
+            if os.path.exists(inc_path):
+                _read_file(deck, inc_path, pool)
+            else:
+                deck.errors.append("*INCLUDE file not found: " + inc)
+    elif kw.startswith('*ELEMENT_SOLID') or kw.startswith('*ELEMENT_SHELL'):
+        deck.unchecked[kw] = deck.unchecked.get(kw, 0) + 1
+
+
+# ── Validation ────────────────────────────────────────────────────────────
+
+class _IdIndex(object):
+    """Membership / duplicate queries on a list of defined ids."""
+
+    def __init__(self, ids, np=None):
+        self.np = np
+        self.n = len(ids)
+        if np is not None:
+            a = np.frombuffer(ids, dtype=np.intc) if self.n else np.zeros(0, np.intc)
+            self.sorted = np.sort(a)
+            dup = self.sorted[1:][self.sorted[1:] == self.sorted[:-1]]
+            self.duplicates = [int(v) for v in np.unique(dup)]
+            return
+        # Exported decks number nodes 1..n in order: check without a set
+        self.sorted = ids
+        increasing = all(a < b for a, b in zip(ids, ids[1:])) if self.n else True
+        if not increasing:
+            self.sorted = array('i', sorted(ids))
+        s = self.sorted
+        self.duplicates = sorted(set(
+            s[k] for k in range(1, len(s)) if s[k] == s[k - 1])) if not increasing else []
+
+    def missing(self, refs):
+        """Sorted distinct ids in refs (array('i'), 0 ignored) not defined."""
+        if not len(refs):
+            return []
+        np = self.np
+        if np is not None:
+            used = np.unique(np.frombuffer(refs, dtype=np.intc))
+            used = used[used != 0]
+            return [int(v) for v in np.setdiff1d(used, self.sorted, assume_unique=True)]
+        s = self.sorted
+        if self.n and s[-1] - s[0] + 1 == self.n and not self.duplicates:
+            lo, hi = s[0], s[-1]
+            used = array('i', filter(None, refs))
+            if not used or (min(used) >= lo and max(used) <= hi):
+                return []
+            return sorted(set(v for v in used if not lo <= v <= hi))
+        known = set(s)
+        return sorted(set(v for v in refs if v and v not in known))
+
+    def count_in(self, lo, hi):
+        if self.np is not None:
+            return int(self.np.searchsorted(self.sorted, hi, 'right') -
+                       self.np.searchsorted(self.sorted, lo, 'left'))
+        return bisect_right(self.sorted, hi) - bisect_left(self.sorted, lo)
+
+
+class ValidationReport(object):
+    def __init__(self, deck):
+        self.deck = deck
+        self.errors = list(deck.errors)
+        self.warnings = []
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def summary(self):
+        d = self.deck
+        n_sets = len(d.node_sets) + len(d.node_ranges)
+        return ("{0} file(s): {1} nodes, {2} elements ({3} solid, {4} shell), "
+                "{5} parts, {6} node sets, {7} segment sets, {8} contacts".format(
+                    len(d.files), len(d.node_ids), len(d.elem_ids), d.n_solid,
+                    d.n_shell, len(d.parts), n_sets, len(d.segment_sets),
+                    len(d.contacts)))
+
+
+def _sample(ids, k=10):
+    text = ", ".join(str(i) for i in ids[:k])
+    return text + (", ..." if len(ids) > k else "")
+
+
+def validate(deck):
+    """Referential integrity of a KDeck -> ValidationReport."""
+    np = _np
+    rep = ValidationReport(deck)
+    err = rep.errors.append
+
+    for kind, i in deck.duplicates:
+        err("{0} {1} is defined more than once".format(kind, i))
+    for kw, n in sorted(deck.unchecked.items()):
+        rep.warnings.append("{0}: {1} block(s) not checked".format(kw, n))
+
+    nodes = _IdIndex(deck.node_ids, np)
+    if nodes.duplicates:
+        err("{0} duplicate node id(s): {1}".format(
+            len(nodes.duplicates), _sample(nodes.duplicates)))
+    elems = _IdIndex(deck.elem_ids, np)
+    if elems.duplicates:
+        err("{0} duplicate element id(s): {1}".format(
+            len(elems.duplicates), _sample(elems.duplicates)))
+
+    # Node references
+    missing = nodes.missing(deck.elem_nodes)
+    if missing:
+        err("elements reference {0} undefined node(s): {1}".format(
+            len(missing), _sample(missing)))
+    for table, kind in ((deck.node_sets, 'node set'),
+                        (deck.segment_sets, 'segment set')):
+        for sid, (title, ids) in sorted(table.items()):
+            missing = nodes.missing(ids)
+            if missing:
+                err("{0} {1} '{2}' references {3} undefined node(s): {4}".format(
+                    kind, sid, title, len(missing), _sample(missing)))
+    for sid, (title, ranges) in sorted(deck.node_ranges.items()):
+        for lo, hi in ranges:
+            if hi < lo or nodes.count_in(lo, hi) != hi - lo + 1:
+                err("node set {0} '{1}': range {2}-{3} has undefined node ids".format(
+                    sid, title, lo, hi))
+
+    # Part references
+    if deck.parts:
+        missing = sorted(set(deck.elem_pids) - set(deck.parts))
+        if missing:
+            err("elements reference undefined part(s): " + _sample(missing))
+    for sid, (title, pids) in sorted(deck.part_sets.items()):
+        missing = sorted(set(pids) - set(deck.parts))
+        if missing:
+            err("part set {0} '{1}' references undefined part(s): {2}".format(
+                sid, title, _sample(missing)))
+
+    # Contact set references
+    defined = {'segment set': set(deck.segment_sets), 'node set': deck.node_set_ids(),
+               'part set': set(deck.part_sets), 'part': set(deck.parts)}
+    for k, c in enumerate(deck.contacts, 1):
+        name = c['title'] or "#{0}".format(k)
+        for side, sid, styp in (('SURFA', c['ssid'], c['sstyp']),
+                                ('SURFB', c['msid'], c['mstyp'])):
+            kind = _SURF_KIND.get(styp, '?')
+            if not sid or kind is None:
+                continue
+            if kind not in defined:
+                rep.warnings.append("{0} {1}: {2} {3} ({4}) not checked".format(
+                    c['kw'], name, side, sid, kind))
+            elif sid not in defined[kind]:
+                err("{0} {1}: {2} {3} {4} is not defined".format(
+                    c['kw'], name, side, kind, sid))
+    return rep
@@ -0,0 +1,161 @@
+# encoding: utf-8
+"""
+MX Digital Twin - mesh snapshot cache
+
+Reading nodes and elements through MeshData is the slowest part of an
+export. After a full read the raw tables (unscaled meters, original ids)
+are saved as a .kdump (core.write_dump) named after a mesh signature;
+the next export of the same mesh loads it instead of walking MeshData.
+Coordinates are stored in meters, so the mm / SI toggle and the other
+format options reuse the same snapshot.
+
+The signature covers the node / element counts, a spread sample of node
+coordinates and element connectivity, and whatever the caller adds
+(the body list). Mechanical exposes no mesh timestamp and MeshData has
+no bulk coordinate access, so hashing every node would cost the full
+read the cache exists to skip. The sample is a trust, not a proof: a
+local remesh or a moved body that keeps the counts and misses every
+sample is a silent hit, which is why the dialog leaves the cache off
+unless the user opts in.
+
+NodeSetCache keeps resolved Named Selection node sets for the session,
+keyed by table_digest() - every node coordinate and element connectivity
+of the tables in use, not the sample - plus a signature of each NS
+definition.
+"""
+
+import os
+import tempfile
+
+from kfile import core
+
+SNAPSHOT_VERSION = 1
+SAMPLES = 32          # nodes and elements probed for the signature
+KEEP = 4              # snapshots kept per cache directory
+
+
+def default_dir():
+    return os.path.join(tempfile.gettempdir(), "mx_kfile_snapshots")
+
+
+def _sample_ids(n, k):
+    """Up to k ids spread over 1..n, always including the first and last."""
+    if n <= 0:
+        return []
+    if n <= k:
+        return list(range(1, n + 1))
+    step = (n - 1) / float(k - 1)
+    return sorted(set(1 + int(round(i * step)) for i in range(k)))
+
+
+def mesh_signature(mesh_data, extra=(), samples=SAMPLES):
+    """Hex digest identifying the current mesh; about 2 * samples API calls."""
+    n_nodes, n_elems = mesh_data.NodeCount, mesh_data.ElementCount
+    items = [SNAPSHOT_VERSION, n_nodes, n_elems]
+    node_by_id, elem_by_id = mesh_data.NodeById, mesh_data.ElementById
+    for nid in _sample_ids(n_nodes, samples):
+        try:
+            node = node_by_id(nid)
+            items.append((node.Id, node.X, node.Y, node.Z))
+        except Exception:
+            items.append(None)
+    for eid in _sample_ids(n_elems, samples):
+        try:
+            elem = elem_by_id(eid)
+            items.append((elem.Id, tuple(int(n) for n in elem.NodeIds)))
+        except Exception:
+            items.append(None)
+    items.extend(extra)
+    return core.content_hash(*items)
+
+
+def table_digest(node_table, elem_table):
+    """Hex digest of every node id / coordinate and element id / part /
+    connectivity; exact, but needs the tables in memory."""
+    return core.content_hash(SNAPSHOT_VERSION, node_table.ids, node_table.xyz,
+                             elem_table.ids, elem_table.pids, elem_table.shell,
+                             elem_table.offsets, elem_table.conn)
+
+
+class SnapshotCache(object):
+    """Raw node / element tables on disk, one .kdump per mesh signature."""
+
+    def __init__(self, directory=None, keep=KEEP):
+        self.directory = directory or default_dir()
+        self.keep = keep
+
+    def path(self, signature):
+        return os.path.join(self.directory, signature + ".kdump")
+
+    def load(self, signature):
+        """(NodeTable, ElementTable), or None on a miss / unreadable file."""
+        path = self.path(signature)
+        if not os.path.exists(path):
+            return None
+        try:
+            dump = core.read_dump(path)
+        except Exception:
+            return None
+        os.utime(path, None)    # most recently used survives pruning
+        return dump.node_table, dump.elem_table
+
+    def save(self, signature, node_table, elem_table, body_pid_map):
+        """Write the snapshot and prune the oldest beyond keep; returns its path."""
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        path = core.write_dump(self.path(signature), "m", 1.0,
+                               node_table, elem_table, body_pid_map)
+        self._prune()
+        return path
+
+    def _prune(self):
+        files = [os.path.join(self.directory, f) for f in os.listdir(self.directory)
+                 if f.endswith(".kdump")]
+        files.sort(key=os.path.getmtime, reverse=True)
+        for f in files[self.keep:]:
+            try:
+                os.remove(f)
+            except OSError:
+                pass
+
+
+class NodeSetCache(object):
+    """
+    Resolved node-id arrays of named regions (Named Selections), kept for
+    the session. An entry is reused only while both the region's
+    definition signature and the mesh signature match; otherwise it is
+    stale and the caller regenerates it. hits / misses / stale count the
+    lookups since the last reset_counts().
+    """
+
+    def __init__(self):
+        self._entries = {}    # key -> (definition sig, mesh sig, node ids)
+        self.reset_counts()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def reset_counts(self):
+        self.hits = self.misses = self.stale = 0
+
+    def get(self, key, definition, mesh, valid=None):
+        """Cached node ids, or None (counted as a miss; stale if the
+        entry exists but either signature changed, or valid(node ids)
+        rejects it - such an entry is dropped)."""
+        entry = self._entries.get(key)
+        if entry is not None and definition is not None and \
+                entry[0] == definition and entry[1] == mesh:
+            if valid is None or valid(entry[2]):
+                self.hits += 1
+                return entry[2]
+            del self._entries[key]
+        self.misses += 1
+        if entry is not None:
+            self.stale += 1
+        return None
+
+    def put(self, key, definition, mesh, node_ids):
+        if definition is None:
+            self._entries.pop(key, None)    # definition unknown: never reuse
+        else:
+            self._entries[key] = (definition, mesh, node_ids)
@@ -0,0 +1,488 @@
+# encoding: utf-8
+"""
+MX Digital Twin - mesh transforms on the core tables
+
+Spatial index, coincident-node merging and id compaction / RCM
+renumbering of NodeTable / ElementTable, used by ExportKFileDialog and
+the headless exporter (python -m kfile export --merge-tol / --renumber).
+Pure Python over kfile.core arrays, IronPython + CPython.
+"""
+
+from array import array
+
+from kfile import core
+
+
+# ── Spatial index ─────────────────────────────────────────────────────────
+
+class NodeGrid(object):
+    """
+    Uniform-grid spatial index over a NodeTable, built once per export.
+    Nodes are bucketed into cells of edge `h` and stored CSR-style:
+    the node rows of cell c are order[start[c]:start[c + 1]].
+    All queries return node row indices into the table.
+    """
+
+    def __init__(self, node_table, per_cell=8):
+        self.table = node_table
+        xyz = node_table.xyz
+        n = len(node_table)
+        lo = [min(xyz[a::3]) if n else 0.0 for a in range(3)]
+        hi = [max(xyz[a::3]) if n else 0.0 for a in range(3)]
+        ext = [hi[a] - lo[a] for a in range(3)]
+        span = max(ext) or 1.0
+        # Cell edge so that on average ~per_cell nodes share a cell; flat
+        # extents are padded so plate-like models do not degenerate.
+        vol = 1.0
+        for e in ext:
+            vol *= max(e, span * 1e-3)
+        h = (vol * per_cell / max(n, 1)) ** (1.0 / 3.0)
+        self.h = max(h, span * 1e-6)
+        self.origin = lo
+        self.dims = [int(ext[a] / self.h) + 1 for a in range(3)]
+        nx, ny, nz = self.dims
+        self.strides = [1, nx, nx * ny]
+
+        cell_of = array('i', [0]) * n
+        counts = array('i', [0]) * (nx * ny * nz + 1)
+        for i in range(n):
+            c = self._cell(xyz[3 * i], xyz[3 * i + 1], xyz[3 * i + 2])
+            cell_of[i] = c
+            counts[c + 1] += 1
+        for c in range(1, len(counts)):
+            counts[c] += counts[c - 1]
+        self.start = counts
+        fill = array('i', counts)
+        self.order = array('i', [0]) * n
+        for i in range(n):
+            c = cell_of[i]
+            self.order[fill[c]] = i
+            fill[c] += 1
+
+    def _axis_index(self, a, v):
+        k = int((v - self.origin[a]) / self.h)
+        return 0 if k < 0 else (self.dims[a] - 1 if k >= self.dims[a] else k)
+
+    def _cell(self, x, y, z):
+        return (self._axis_index(0, x) +
+                self.strides[1] * self._axis_index(1, y) +
+                self.strides[2] * self._axis_index(2, z))
+
+    def _cells_in_box(self, lo, hi):
+        r = [(self._axis_index(a, lo[a]), self._axis_index(a, hi[a]))
+             for a in range(3)]
+        sy, sz = self.strides[1], self.strides[2]
+        for iz in range(r[2][0], r[2][1] + 1):
+            for iy in range(r[1][0], r[1][1] + 1):
+                base = iy * sy + iz * sz
+                for ix in range(r[0][0], r[0][1] + 1):
+                    yield base + ix
+
+    def query_box(self, lo, hi):
+        """Rows of nodes inside the axis-aligned box [lo, hi]."""
+        xyz, start, order = self.table.xyz, self.start, self.order
+        out = []
+        for c in self._cells_in_box(lo, hi):
+            for j in range(start[c], start[c + 1]):
+                i = order[j]
+                k = 3 * i
+                if (lo[0] <= xyz[k] <= hi[0] and lo[1] <= xyz[k + 1] <= hi[1]
+                        and lo[2] <= xyz[k + 2] <= hi[2]):
+                    out.append(i)
+        return out
+
+    def query_radius(self, p, r):
+        """Rows of nodes within distance r of point p."""
+        xyz = self.table.xyz
+        r2 = r * r
+        out = []
+        for i in self.query_box([p[a] - r for a in range(3)],
+                                [p[a] + r for a in range(3)]):
+            k = 3 * i
+            dx = xyz[k] - p[0]
+            dy = xyz[k + 1] - p[1]
+            dz = xyz[k + 2] - p[2]
+            if dx * dx + dy * dy + dz * dz <= r2:
+                out.append(i)
+        return out
+
+    def query_plane(self, c, nrm, tol):
+        """Rows of nodes within tol of the plane through c with unit normal nrm.
+
+        Walks the grid in columns along the normal's dominant axis and
+        visits only the cells the slab |(p - c) . n| <= tol passes through.
+        """
+        a = max(range(3), key=lambda q: abs(nrm[q]))
+        u, v = [q for q in range(3) if q != a]
+        na = nrm[a]
+        h, o = self.h, self.origin
+        half = tol / abs(na)
+        xyz, start, order = self.table.xyz, self.start, self.order
+        sa, su, sv = self.strides[a], self.strides[u], self.strides[v]
+        out = []
+        for iu in range(self.dims[u]):
+            u0 = o[u] + iu * h
+            du = [(u0 - c[u]) * nrm[u], (u0 + h - c[u]) * nrm[u]]
+            for iv in range(self.dims[v]):
+                v0 = o[v] + iv * h
+                dv = [(v0 - c[v]) * nrm[v], (v0 + h - c[v]) * nrm[v]]
+                # Plane height along axis a at the column's four corners
+                ws = [c[a] - (x + y) / na for x in du for y in dv]
+                w_lo, w_hi = min(ws) - half, max(ws) + half
+                if w_hi < o[a] or w_lo > o[a] + self.dims[a] * h:
+                    continue
+                col = iu * su + iv * sv
+                for ia in range(self._axis_index(a, w_lo),
+                                self._axis_index(a, w_hi) + 1):
+                    cell = col + ia * sa
+                    for j in range(start[cell], start[cell + 1]):
+                        i = order[j]
+                        k = 3 * i
+                        dist = abs((xyz[k] - c[0]) * nrm[0] +
+                                   (xyz[k + 1] - c[1]) * nrm[1] +
+                                   (xyz[k + 2] - c[2]) * nrm[2])
+                        if dist <= tol:
+                            out.append(i)
+        return out
+
+
+def plane_node_ids(grid, planes, tol):
+    """
+    Sorted array('i') of the ids of nodes within tol of any of the planes,
+    given as (point, unit normal) pairs: the geometry fallback of Named
+    Selections whose regions MeshData maps to no node.
+    """
+    ids = grid.table.ids
+    rows = set()
+    for c, nrm in planes:
+        rows.update(grid.query_plane(c, nrm, tol))
+    return array('i', sorted(ids[i] for i in rows))
+
+
+# ── Renumbering ───────────────────────────────────────────────────────────
+
+class Renumbering(object):
+    """
+    Compact node ids to 1..N and element ids to 1..M (table order).
+    With rcm=True nodes are numbered in Reverse Cuthill-McKee order of
+    the element connectivity graph to cut the stiffness matrix bandwidth.
+    node_table / elem_table hold the renumbered copies; node_ids() and
+    boundary_faces() carry NS and segment sets over consistently.
+    """
+
+    def __init__(self, node_table, elem_table, rcm=True):
+        self._old_nodes = node_table
+        self._old_elems = elem_table
+        n = len(node_table)
+        # element connectivity as node rows (-1 = node not in the table)
+        self._crow = array('i', (node_table.index_of(nid) for nid in elem_table.conn))
+        order = array('i', range(n))
+        self._new_of_row = array('i', range(1, n + 1))
+        self.before = self._bandwidth_profile(node_table.ids)
+        self.after = self._bandwidth_profile(self._new_of_row)
+        self.rcm = False
+        if rcm:
+            # Keep RCM only if it beats plain compaction (structured meshes
+            # are often numbered better already)
+            rcm_order = self._rcm_order()
+            rcm_new = array('i', [0]) * n
+            for k, i in enumerate(rcm_order):
+                rcm_new[i] = k + 1
+            rcm_metrics = self._bandwidth_profile(rcm_new)
+            if rcm_metrics[1] < self.after[1]:
+                order, self._new_of_row, self.after = rcm_order, rcm_new, rcm_metrics
+                self.rcm = True
+
+        xyz = node_table.xyz
+        self.node_table = core.NodeTable()
+        for k, i in enumerate(order):
+            self.node_table.add(k + 1, xyz[3 * i], xyz[3 * i + 1], xyz[3 * i + 2])
+        self.node_table.freeze()
+
+        new_of_row = self._new_of_row
+        self.elem_table = core.ElementTable()
+        self.elem_table.ids = array('i', range(1, len(elem_table) + 1))
+        self.elem_table.pids = array('i', elem_table.pids)
+        self.elem_table.shell = array('b', elem_table.shell)
+        self.elem_table.offsets = array('i', elem_table.offsets)
+        self.elem_table.conn = array(
+            'i', (new_of_row[i] if i >= 0 else 0 for i in self._crow))
+
+    def node_id(self, old_nid):
+        """New id of a node, or 0 if it is not in the table."""
+        i = self._old_nodes.index_of(old_nid)
+        return self._new_of_row[i] if i >= 0 else 0
+
+    def node_ids(self, old_nids):
+        """Sorted array('i') of new ids; nodes outside the mesh are dropped."""
+        return array('i', sorted(n for n in (self.node_id(o) for o in old_nids) if n))
+
+    def boundary_faces(self, faces):
+        """Copy of a BoundaryFaces with node and element ids renumbered.
+        Face indices (and so segment face lists) are unchanged."""
+        new = core.BoundaryFaces()
+        new.rows = array('i', faces.rows)
+        new.eids = array('i', (r + 1 for r in faces.rows))
+        new.nodes = array('i', (self.node_id(n) if n else 0 for n in faces.nodes))
+        return new
+
+    def _node_elements(self):
+        # CSR: elements touching node row i are elems[start[i]:start[i + 1]]
+        crow, offsets = self._crow, self._old_elems.offsets
+        n = len(self._old_nodes)
+        start = array('i', [0]) * (n + 1)
+        for i in crow:
+            if i >= 0:
+                start[i + 1] += 1
+        for i in range(1, n + 1):
+            start[i] += start[i - 1]
+        fill = array('i', start)
+        elems = array('i', [0]) * start[n]
+        for r in range(len(offsets) - 1):
+            for k in range(offsets[r], offsets[r + 1]):
+                i = crow[k]
+                if i >= 0:
+                    elems[fill[i]] = r
+                    fill[i] += 1
+        return start, elems
+
+    def _rcm_order(self):
+        """Node rows in Reverse Cuthill-McKee order; nodes that no element
+        references keep their table order at the end. Node degree is taken
+        as the number of incident elements, which ranks like the true
+        neighbour count on conforming meshes and needs no adjacency list."""
+        crow, offsets = self._crow, self._old_elems.offsets
+        n = len(self._old_nodes)
+        start, elems = self._node_elements()
+        deg = [start[i + 1] - start[i] for i in range(n)]
+        mark = array('i', [0]) * n
+        stamp = [0]
+
+        def _bfs(root, visit):
+            # Level-by-level BFS from root; the new neighbours of each node
+            # are visited in increasing degree. Returns (last level, depth).
+            stamp[0] += 1
+            s = stamp[0]
+            mark[root] = s
+            visit(root)
+            level, depth = [root], 0
+            while True:
+                nxt = []
+                for u in level:
+                    nbrs = []
+                    for e in elems[start[u]:start[u + 1]]:
+                        for v in crow[offsets[e]:offsets[e + 1]]:
+                            if v >= 0 and mark[v] != s:
+                                mark[v] = s
+                                nbrs.append(v)
+                    nbrs.sort(key=deg.__getitem__)
+                    for v in nbrs:
+                        visit(v)
+                    nxt.extend(nbrs)
+                if not nxt:
+                    return level, depth
+                level, depth = nxt, depth + 1
+
+        def _place(i):
+            placed[i] = 1
+            order.append(i)
+
+        order = array('i')
+        placed = array('b', [0]) * n
+        for seed in sorted(range(n), key=deg.__getitem__):
+            if placed[seed] or not deg[seed]:
+                continue
+            # George-Liu pseudo-peripheral root: move to the lowest-degree
+            # node of the last level while the level depth keeps growing
+            root, depth = seed, -1
+            for _ in range(8):
+                last, d = _bfs(root, lambda i: None)
+                if d <= depth:
+                    break
+                depth = d
+                root = min(last, key=deg.__getitem__)
+            _bfs(root, _place)
+        order.reverse()
+        order.extend(i for i in range(n) if not deg[i])
+        return order
+
+    def _bandwidth_profile(self, pos):
+        """(bandwidth, profile) of the nodal matrix when node row i is
+        numbered pos[i]: max id span within an element, and the sum over
+        nodes of the distance to their lowest-numbered neighbour."""
+        crow, offsets = self._crow, self._old_elems.offsets
+        first = array('i', pos)
+        bandwidth = 0
+        for r in range(len(offsets) - 1):
+            rows = [i for i in crow[offsets[r]:offsets[r + 1]] if i >= 0]
+            if not rows:
+                continue
+            ps = [pos[i] for i in rows]
+            lo = min(ps)
+            bandwidth = max(bandwidth, max(ps) - lo)
+            for i in rows:
+                if lo < first[i]:
+                    first[i] = lo
+        return bandwidth, sum(pos[i] - first[i] for i in range(len(first)))
+
+
+# ── Coincident-node merge ─────────────────────────────────────────────────
+
+class NodeMerger(object):
+    """
+    Coincident-node merging across bonded interfaces.
+    merge_interface() pairs every slave node with a master node within tol
+    (radius queries on a NodeGrid) and only commits when the interface is
+    node-conforming on both sides; merged nodes point at their master node
+    through a union-find over node rows. apply() then builds node_table
+    without the merged nodes and elem_table with remapped connectivity;
+    node_ids() and boundary_faces() remap NS and segment sets.
+    """
+
+    def __init__(self, node_table, grid):
+        self._old_nodes = node_table
+        self._grid = grid
+        self._parent = array('i', range(len(node_table)))
+        self.n_merged = 0
+        self.node_table = node_table
+        self.elem_table = None
+
+    def _find(self, i):
+        parent = self._parent
+        root = i
+        while parent[root] != root:
+            root = parent[root]
+        while parent[i] != root:
+            parent[i], i = root, parent[i]
+        return root
+
+    def merge_interface(self, slave_ids, master_ids, tol):
+        """
+        Merge each slave node into its nearest master node within tol.
+        Returns the number of slave nodes merged, or -1 (nothing merged)
+        when a slave or master node has no partner, i.e. the interface
+        is not node-conforming and must stay a tied contact.
+        """
+        table = self._old_nodes
+        xyz = table.xyz
+        masters = set(table.index_of(n) for n in master_ids)
+        masters.discard(-1)
+        pairs = []
+        matched = set()
+        for nid in slave_ids:
+            s = table.index_of(nid)
+            if s < 0:
+                continue
+            k = 3 * s
+            p = (xyz[k], xyz[k + 1], xyz[k + 2])
+            best, best_d2 = -1, None
+            for m in self._grid.query_radius(p, tol):
+                if m not in masters:
+                    continue
+                j = 3 * m
+                d2 = ((xyz[j] - p[0]) ** 2 + (xyz[j + 1] - p[1]) ** 2 +
+                      (xyz[j + 2] - p[2]) ** 2)
+                if best < 0 or d2 < best_d2:
+                    best, best_d2 = m, d2
+            if best < 0:
+                return -1
+            pairs.append((s, best))
+            matched.add(best)
+        if not pairs or len(matched) < len(masters):
+            return -1
+        merged = 0
+        for s, m in pairs:
+            rs, rm = self._find(s), self._find(m)
+            if rs != rm:
+                self._parent[rs] = rm
+                merged += 1
+        self.n_merged += merged
+        return merged
+
+    def apply(self, elem_table):
+        """Build node_table / elem_table with merged nodes removed.
+        Returns the number of elements that lost a distinct node
+        (collapsed by a too-large tolerance)."""
+        old = self._old_nodes
+        ids, xyz = old.ids, old.xyz
+        self._rep_id = array('i', (ids[self._find(i)] for i in range(len(old))))
+        self.node_table = core.NodeTable()
+        for i in range(len(old)):
+            if self._parent[i] == i:
+                self.node_table.add(ids[i], xyz[3 * i], xyz[3 * i + 1], xyz[3 * i + 2])
+        self.node_table.freeze()
+
+        self.elem_table = core.ElementTable()
+        self.elem_table.ids = array('i', elem_table.ids)
+        self.elem_table.pids = array('i', elem_table.pids)
+        self.elem_table.shell = array('b', elem_table.shell)
+        self.elem_table.offsets = array('i', elem_table.offsets)
+        self.elem_table.conn = array('i', (self.node_id(n) for n in elem_table.conn))
+
+        collapsed = 0
+        offsets = elem_table.offsets
+        for r in range(len(elem_table)):
+            lo, hi = offsets[r], offsets[r + 1]
+            if (len(set(self.elem_table.conn[lo:hi]))
+                    < len(set(elem_table.conn[lo:hi]))):
+                collapsed += 1
+        return collapsed
+
+    def node_id(self, old_nid):
+        """Surviving id for a node id (unchanged if not in the table)."""
+        i = self._old_nodes.index_of(old_nid)
+        return self._rep_id[i] if i >= 0 else old_nid
+
+    def node_ids(self, old_nids):
+        """Sorted array('i') of surviving ids, duplicates removed."""
+        return array('i', sorted(set(self.node_id(n) for n in old_nids)))
+
+    def boundary_faces(self, faces):
+        """Copy of a BoundaryFaces with merged node ids replaced."""
+        new = core.BoundaryFaces()
+        new.rows = array('i', faces.rows)
+        new.eids = array('i', faces.eids)
+        new.nodes = array('i', (self.node_id(n) if n else 0 for n in faces.nodes))
+        return new
+
+
+def _no_log(msg):
+    pass
+
+
+def merge_bonded_contacts(node_table, surface_faces, contacts, tol, grid=None, log=None):
+    """
+    Merge coincident slave/master nodes of every bonded contact; the
+    tied contact of a fully merged interface is dropped. Interfaces
+    that are not node-conforming within tol are left as tied contacts.
+    grid: NodeGrid over node_table, built here when not given.
+    Returns (merger, remaining contacts).
+    """
+    log = log or _no_log
+    merger = NodeMerger(node_table, grid or NodeGrid(node_table))
+    fnodes = surface_faces.nodes
+
+    def _side_nodes(faces):
+        nids = set()
+        for f in faces:
+            nids.update(fnodes[4 * f:4 * f + 4])
+        nids.discard(0)
+        return sorted(nids)
+
+    log("Bonded node merge (tol = {0} m):".format(tol))
+    kept = []
+    for c in contacts:
+        if not c['kw'].startswith("*CONTACT_TIED"):
+            kept.append(c)
+            continue
+        slave = _side_nodes(c['slave'])
+        merged = merger.merge_interface(slave, _side_nodes(c['master']), tol)
+        if merged < 0:
+            log("  {0}: not node-conforming, kept {1}".format(c['name'], c['kw']))
+            kept.append(c)
+        else:
+            log("  {0}: {1} of {2} slave nodes merged, tied contact dropped".format(
+                c['name'], merged, len(slave)))
+    log("  Total merged nodes: {0}, tied contacts dropped: {1}".format(
+        merger.n_merged, len(contacts) - len(kept)))
+    return merger, kept
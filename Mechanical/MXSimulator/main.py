@@ -10,7 +10,9 @@ Toolbar buttons (MXSimulator.xml):
 """
 
 import os
+import sys
 import clr
+from array import array
 
 clr.AddReference("PresentationFramework")
 clr.AddReference("PresentationCore")
@@ -25,13 +27,14 @@ from System.Windows import Window
 from System.Windows.Controls import (
     StackPanel, Button, Label, TextBox, ListBox,
     Orientation, ScrollViewer, ScrollBarVisibility,
-    CheckBox, RadioButton, Separator, ComboBox
+    CheckBox, RadioButton, Separator, ComboBox, ProgressBar
 )
 from System.Windows import (
     HorizontalAlignment, VerticalAlignment,
     Thickness, MessageBox, MessageBoxButton, MessageBoxImage, MessageBoxResult
 )
 from System.Windows.Media import Brushes
+from System.Windows.Threading import DispatcherPriority
 
 try:
     import Ansys
@@ -50,6 +53,23 @@ try:
 except ImportError:
     pass
 
+# Pure-Python k-file core (tables, card writers, mesh dump), shared with
+# the headless CLI:  python -m kfile export model.kdump -o model.k
+_EXT_DIR = os.path.dirname(os.path.abspath(__file__))
+if _EXT_DIR not in sys.path:
+    sys.path.append(_EXT_DIR)
+from kfile import core as kcore
+from kfile import meshdata as kmesh
+from kfile import reader as kreader
+from kfile import instrument as kinstr
+from kfile import snapshot as ksnap
+from kfile import transform as ktrans
+from kfile import incremental as kincr
+from kfile import contacts as kcont
+
+# Named Selection node sets, reused across exports of this session
+_NS_CACHE = ksnap.NodeSetCache()
+
 
 # ================================================================
 # ACT Callbacks
@@ -2177,6 +2197,9 @@ class ExportKFileDialog(Window):
       *NODE, *ELEMENT_SOLID/SHELL, *PART, *SECTION, *MAT_ELASTIC
       *SET_NODE_TITLE (Named Selections)
     No simulation control cards or load curves.
+    Include mode splits the deck into a master file + one *INCLUDE per section.
+    This dialog only reads Mechanical into kfile.core tables; the card
+    writers live in kfile.core and are shared with the headless CLI.
     """
 
     def __init__(self):
@@ -2213,6 +2236,16 @@ class ExportKFileDialog(Window):
         main.Children.Add(_row(_lbl("Unit system:", 110), self.unit_mm_rb))
         main.Children.Add(_row(_lbl("", 110), self.unit_si_rb))
 
+        # Body subset (empty + unchecked = whole model)
+        self.subset_tb = _tb("", 300,
+            "Export only bodies whose name contains one of these comma-separated keywords")
+        main.Children.Add(_row(_lbl("Subset bodies:", 110), self.subset_tb))
+
+        self.subset_sel_cb = CheckBox()
+        self.subset_sel_cb.Content = "Selected bodies only (bodies of the current geometry selection)"
+        self.subset_sel_cb.IsChecked = False
+        main.Children.Add(_row(_lbl("", 110), self.subset_sel_cb))
+
         # Options
         self.include_ns_cb = CheckBox()
         self.include_ns_cb.Content = "Named Selections \u2192 *SET_NODE_TITLE"
@@ -2229,6 +2262,68 @@ class ExportKFileDialog(Window):
         self.include_contact_cb.IsChecked = True
         main.Children.Add(_row(_lbl("", 110), self.include_contact_cb))
 
+        self.merge_bonded_cb = CheckBox()
+        self.merge_bonded_cb.Content = "Merge coincident nodes of bonded contacts (drops their *CONTACT_TIED)"
+        self.merge_bonded_cb.IsChecked = False
+        self.merge_bonded_cb.Margin = Thickness(18, 0, 0, 0)
+        main.Children.Add(_row(_lbl("", 110), self.merge_bonded_cb))
+
+        self.compact_sets_cb = CheckBox()
+        self.compact_sets_cb.Content = "Compact sets: id ranges (*SET_NODE_LIST_GENERATE), part id for whole-part contact sides"
+        self.compact_sets_cb.IsChecked = True
+        main.Children.Add(_row(_lbl("", 110), self.compact_sets_cb))
+
+        self.include_mode_cb = CheckBox()
+        self.include_mode_cb.Content = "Include mode: master deck + *INCLUDE file per section"
+        self.include_mode_cb.IsChecked = False
+        main.Children.Add(_row(_lbl("", 110), self.include_mode_cb))
+
+        self.materials_only_cb = CheckBox()
+        self.materials_only_cb.Content = "Rewrite materials include only (keep mesh/set files)"
+        self.materials_only_cb.IsChecked = False
+        self.materials_only_cb.Margin = Thickness(18, 0, 0, 0)
+        main.Children.Add(_row(_lbl("", 110), self.materials_only_cb))
+
+        self.incremental_cb = CheckBox()
+        self.incremental_cb.Content = "Incremental: one include per part, rewrite changed sections only"
+        self.incremental_cb.IsChecked = False
+        self.incremental_cb.Margin = Thickness(18, 0, 0, 0)
+        main.Children.Add(_row(_lbl("", 110), self.incremental_cb))
+
+        self.renumber_cb = CheckBox()
+        self.renumber_cb.Content = "Renumber: compact node/element ids to 1..N"
+        self.renumber_cb.IsChecked = False
+        main.Children.Add(_row(_lbl("", 110), self.renumber_cb))
+
+        self.rcm_cb = CheckBox()
+        self.rcm_cb.Content = "Reverse Cuthill-McKee node order (lower bandwidth for implicit runs)"
+        self.rcm_cb.IsChecked = True
+        self.rcm_cb.Margin = Thickness(18, 0, 0, 0)
+        main.Children.Add(_row(_lbl("", 110), self.rcm_cb))
+
+        self.dt_estimate_cb = CheckBox()
+        self.dt_estimate_cb.Content = "Estimate critical time step + DT2MS mass scaling (log report)"
+        self.dt_estimate_cb.IsChecked = False
+        main.Children.Add(_row(_lbl("", 110), self.dt_estimate_cb))
+
+        self.write_dump_cb = CheckBox()
+        self.write_dump_cb.Content = "Also write mesh dump (.kdump) for the headless exporter (python -m kfile)"
+        self.write_dump_cb.IsChecked = False
+        main.Children.Add(_row(_lbl("", 110), self.write_dump_cb))
+
+        self.snapshot_cb = CheckBox()
+        self.snapshot_cb.Content = "Reuse mesh snapshot (trusts a sampled mesh signature; skips the MeshData read)"
+        self.snapshot_cb.IsChecked = False
+        self.snapshot_cb.ToolTip = ("The mesh is matched by node / element counts and ~64 sampled nodes "
+                                    "and elements. A local remesh or moved body that keeps the counts "
+                                    "and misses the samples reuses the old geometry - clear it after such edits.")
+        main.Children.Add(_row(_lbl("", 110), self.snapshot_cb))
+
+        self.validate_cb = CheckBox()
+        self.validate_cb.Content = "Validate the written deck (node / set / part references)"
+        self.validate_cb.IsChecked = False
+        main.Children.Add(_row(_lbl("", 110), self.validate_cb))
+
         # Tolerance for geometry filtering
         self.tol_tb = _tb("0.1", 60)
         self.tol_tb.ToolTip = "Tolerance in mm for matching mesh nodes to geometry faces (Named Selections & Contact Regions)"
@@ -2238,18 +2333,43 @@ class ExportKFileDialog(Window):
         tol_unit_lbl.Margin = Thickness(2, 0, 0, 0)
         main.Children.Add(_row(_lbl("Geo tolerance:", 110), self.tol_tb, tol_unit_lbl))
 
+        # Distance under which bonded interface nodes count as coincident
+        self.merge_tol_tb = _tb("0.001", 60)
+        self.merge_tol_tb.ToolTip = "Nodes of a bonded interface closer than this (mm) are merged"
+        main.Children.Add(_row(_lbl("Merge tolerance:", 110), self.merge_tol_tb, _lbl("mm")))
+
+        # Worker threads for *NODE / *ELEMENT card formatting
+        self.threads_tb = _tb(str(System.Environment.ProcessorCount), 60)
+        self.threads_tb.ToolTip = "Threads used to format node/element cards (1 = single-threaded; output is identical)"
+        main.Children.Add(_row(_lbl("Format threads:", 110), self.threads_tb))
+
         main.Children.Add(_sep())
 
         # Buttons
-        export_btn = Button()
-        export_btn.Content = "Export .k File"
-        export_btn.Height = 34
-        export_btn.FontSize = 12
-        export_btn.HorizontalAlignment = HorizontalAlignment.Stretch
-        export_btn.Margin = Thickness(0, 0, 0, 4)
-        export_btn.Click += self.on_export
-        main.Children.Add(export_btn)
+        self.export_btn = Button()
+        self.export_btn.Content = "Export .k File"
+        self.export_btn.Height = 34
+        self.export_btn.FontSize = 12
+        self.export_btn.HorizontalAlignment = HorizontalAlignment.Stretch
+        self.export_btn.Margin = Thickness(0, 0, 0, 4)
+        self.export_btn.Click += self.on_export
+        main.Children.Add(self.export_btn)
+
+        # Progress of the background export thread
+        self.progress_bar = ProgressBar()
+        self.progress_bar.Width = 440
+        self.progress_bar.Height = 14
+        self.progress_bar.Minimum = 0
+        self.progress_bar.Maximum = 100
+        self.cancel_btn = _btn("Cancel", self.on_cancel, 60)
+        self.cancel_btn.IsEnabled = False
+        self.cancel_btn.Margin = Thickness(6, 0, 0, 0)
+        main.Children.Add(_row(self.progress_bar, self.cancel_btn))
+        self.progress_lbl = _status("Idle")
+        main.Children.Add(self.progress_lbl)
         main.Children.Add(_row(_btn("Close", lambda s, e: self.Close(), 60)))
+        self._progress = None     # kcore.Progress of the running export
+        self.Closing += self.on_closing
 
         main.Children.Add(_sep())
 
@@ -2276,6 +2396,10 @@ class ExportKFileDialog(Window):
         self.Content = sv
 
     def log(self, msg):
+        if not self.Dispatcher.CheckAccess():
+            # export thread: append on the UI thread, in order
+            self._ui(lambda: self.log(msg))
+            return
         self.log_tb.Text += msg + "\n"
         self.log_tb.ScrollToEnd()
 
@@ -2300,10 +2424,16 @@ class ExportKFileDialog(Window):
             return
 
         self.log_tb.Text = ""
+        self._grid = None         # per-export spatial index, see _node_grid()
+        self._mesh_sig = None     # per-export mesh signature, see _mesh_signature()
+        self._ns_mesh_key = None  # per-export NS cache key, see _prefetch_region_nodes()
+        self._face_index = None   # per-export face lookup, see _geo_face_index()
         self.log("=" * 50)
         self.log("Export LS-DYNA K-File")
         self.log("Output: " + path)
         self.log("=" * 50)
+        self._show_progress("reading mesh (Mechanical thread)", None, None)
+        self._render_now()
 
         use_mm = bool(self.unit_mm_rb.IsChecked)
         scale = 1000.0 if use_mm else 1.0        # m → mm (coordinates)
@@ -2312,14 +2442,78 @@ class ExportKFileDialog(Window):
         unit_label = "mm-tonne-s" if use_mm else "SI (m-kg-s)"
         self.log("Unit system: " + unit_label)
 
+        try:
+            threads = max(1, int(self.threads_tb.Text.strip()))
+        except Exception:
+            threads = 1
+        self.log("Format threads: {0}".format(threads))
+
+        include_mode = bool(self.include_mode_cb.IsChecked)
+        incremental = include_mode and bool(self.incremental_cb.IsChecked)
+        materials_only = (include_mode and not incremental
+                          and bool(self.materials_only_cb.IsChecked))
+        include_mat = bool(self.include_mat_cb.IsChecked)
+        include_ns = bool(self.include_ns_cb.IsChecked)
+        include_contacts = bool(self.include_contact_cb.IsChecked)
+        compact_sets = bool(self.compact_sets_cb.IsChecked)
+        if materials_only and not include_mat:
+            MessageBox.Show("'Rewrite materials only' needs the Materials option.",
+                "Nothing to Export", MessageBoxButton.OK, MessageBoxImage.Warning)
+            return
+        header = kcore.deck_header(unit_label)
+        prof = kinstr.PhaseProfile()
+
         try:
             model = ExtAPI.DataModel.Project.Model
 
+            # ── parts + materials (geometry tree only) ─────────────────
+            prof.mark("materials")
+            all_pid_map = body_pid_map = self._read_body_pid_map(model)
+            mat_rows = []
+            if include_mat:
+                mat_rows = self._read_materials(
+                    model, all_pid_map, use_mm, mat_e_scale, mat_rho_scale)
+
+            if materials_only:
+                # Mesh untouched: rewrite the materials include and master only
+                prof.mark("write")
+                written = kcore.write_include_deck(
+                    path, header,
+                    [('materials', lambda out: kcore.write_materials(out, mat_rows))],
+                    threads, keep=kcore.INCLUDE_SECTIONS)
+                self.log("*MAT_ELASTIC: {0} materials".format(len(mat_rows)))
+                self.log("")
+                for f in written:
+                    self.log("Saved: {0}".format(f))
+                self._log_profile(path, prof.finish(), unit_label, threads)
+                MessageBox.Show(
+                    "Materials include rewritten.\n\nMaterials: {0}\n{1}".format(
+                        len(mat_rows), path),
+                    "Export Complete", MessageBoxButton.OK, MessageBoxImage.Information)
+                return
+
+            # ── body subset (keywords / current selection) ─────────────
+            subset = self._subset_bodies(model)
+            if subset is not None:
+                if not subset:
+                    MessageBox.Show(
+                        "No bodies match the subset keywords or selection.",
+                        "Nothing to Export", MessageBoxButton.OK, MessageBoxImage.Warning)
+                    return
+                body_pid_map = dict((b.Name, all_pid_map[b.Name])
+                                    for b in subset if b.Name in all_pid_map)
+                part_ids = set(body_pid_map.values())
+                mat_rows = [row for row in mat_rows if row[0] in part_ids]
+                self.log("Subset: {0} of {1} bodies".format(
+                    len(body_pid_map), len(all_pid_map)))
+
             # ── mesh data ──────────────────────────────────────────────
+            prof.mark("mesh_data")
             try:
                 mesh_data = ExtAPI.DataModel.MeshDataByName('Global')
                 if mesh_data is None:
                     raise Exception("MeshData not available")
+                mesh_data = prof.count_calls(mesh_data)
                 n_nodes = mesh_data.NodeCount
                 n_elems = mesh_data.ElementCount
                 self.log("MeshData: {0} nodes, {1} elements".format(n_nodes, n_elems))
@@ -2342,28 +2536,23 @@ class ExportKFileDialog(Window):
             except Exception:
                 pass
 
-            lines = []
-            lines.append("*KEYWORD")
-            lines.append("$ Generated by MX Digital Twin Simulator")
-            lines.append("$ Unit system: " + unit_label)
-            lines.append("$")
-
-            # ── *NODE ──────────────────────────────────────────────────
-            node_coords_m, n_written = self._write_nodes(lines, mesh_data, scale)
-            self.log("*NODE: {0} written".format(n_written))
-
-            # ── *ELEMENT + *PART + *SECTION ────────────────────────────
-            body_pid_map, n_elem_written = self._write_elements_parts(
-                lines, mesh_data, model)
+            # ── read phase: MeshData + model → plain tables ────────────
+            # Everything that touches the Mechanical API happens here, so
+            # the write phase below only formats in-memory data.
+            if self.snapshot_cb.IsChecked:
+                prof.mark("signature")
+                self._mesh_sig = self._mesh_signature(mesh_data, all_pid_map)
+            node_table, elem_table = self._read_mesh_tables(
+                mesh_data, subset, body_pid_map, all_pid_map, prof)
+            if include_ns:
+                # NS cache key: the full tables in use, not the sample
+                self._ns_mesh_key = ksnap.table_digest(node_table, elem_table)
+            if not len(elem_table):
+                self.log("  [ELEM] WARNING: No elements found")
             self.log("*ELEMENT/*PART: {0} elems, {1} parts".format(
-                n_elem_written, len(body_pid_map)))
-
-            # ── *MAT_ELASTIC ───────────────────────────────────────────
-            n_mats = 0
-            if bool(self.include_mat_cb.IsChecked):
-                n_mats = self._write_materials(
-                    lines, model, body_pid_map, use_mm, mat_e_scale, mat_rho_scale)
-                self.log("*MAT_ELASTIC: {0} materials".format(n_mats))
+                len(elem_table), len(body_pid_map)))
+            if include_mat:
+                self.log("*MAT_ELASTIC: {0} materials".format(len(mat_rows)))
 
             # ── Geometry tolerance ─────────────────────────────────────
             tol_mm = 0.1
@@ -2376,42 +2565,61 @@ class ExportKFileDialog(Window):
             tol_m = tol_mm / 1000.0  # mm → m
             self.log("Geometry tolerance: {0} mm ({1} m)".format(tol_mm, tol_m))
 
-            # ── *SET_NODE_TITLE ────────────────────────────────────────
-            n_sets = 0
-            if bool(self.include_ns_cb.IsChecked):
-                n_sets = self._write_named_selections(
-                    lines, mesh_data, model, node_coords_m, tol_m)
-                self.log("*SET_NODE_TITLE: {0} sets".format(n_sets))
-
-            # ── Contact Regions ────────────────────────────────────────
-            n_contacts = 0
-            if bool(self.include_contact_cb.IsChecked):
-                all_elems     = self._collect_elements(mesh_data)
-                face_map      = self._enumerate_element_faces(all_elems)
-                surface_faces = self._extract_surface_faces(face_map)
-                self.log("Surface faces (boundary): {0}".format(len(surface_faces)))
-                n_contacts = self._write_contacts(
-                    lines, surface_faces, node_coords_m, mesh_data)
-                self.log("*CONTACT: {0} contact regions".format(n_contacts))
-
-            lines.append("*END")
-
-            # ── write file ─────────────────────────────────────────────
-            with open(path, 'w') as f:
-                f.write('\n'.join(lines))
-
-            file_kb = os.path.getsize(path) / 1024.0
-            self.log("")
-            self.log("Saved: {0:.1f} KB  ->  {1}".format(file_kb, path))
-
-            MessageBox.Show(
-                "Export complete!\n\n"
-                "Nodes:    {0}\nElements: {1}\n"
-                "Parts:    {2}\nNS Sets:  {3}\nContacts: {4}\n\n"
-                "File: {5:.1f} KB\n{6}".format(
-                    n_written, n_elem_written, len(body_pid_map), n_sets, n_contacts,
-                    file_kb, path),
-                "Export Complete", MessageBoxButton.OK, MessageBoxImage.Information)
+            # ── Region → node resolution (NS + contacts, batched) ──────
+            prof.mark("regions")
+            resolver = kmesh.RegionNodeResolver(mesh_data)
+            if include_ns or include_contacts:
+                self._prefetch_region_nodes(
+                    model, resolver, include_ns, include_contacts, node_table)
+
+            ns_sets = []
+            if include_ns:
+                prof.mark("named_selections")
+                ns_sets = self._read_named_selections(
+                    model, resolver, node_table, tol_m, subset is not None)
+                self.log("*SET_NODE_TITLE: {0} sets".format(len(ns_sets)))
+                if self._ns_mesh_key is not None:
+                    self.log("NS cache: {0} hit(s), {1} miss(es) ({2} stale)".format(
+                        _NS_CACHE.hits, _NS_CACHE.misses, _NS_CACHE.stale))
+
+            contact_regions = []
+            if include_contacts:
+                prof.mark("contact_regions")
+                contact_regions = self._read_contact_regions(
+                    model, node_table, resolver, subset is not None)
+
+            # ── options for the background phases (read on the UI thread) ──
+            merge_tol = None
+            if include_contacts and self.merge_bonded_cb.IsChecked and contact_regions:
+                try:
+                    merge_tol_mm = float(self.merge_tol_tb.Text.strip())
+                    if merge_tol_mm <= 0:
+                        merge_tol_mm = 0.001
+                except Exception:
+                    merge_tol_mm = 0.001
+                merge_tol = merge_tol_mm / 1000.0
+            dt_mats = None
+            if self.dt_estimate_cb.IsChecked:
+                dt_mats = mat_rows if include_mat else self._read_materials(
+                    model, all_pid_map, use_mm, mat_e_scale, mat_rho_scale)
+
+            job = {
+                'path': path, 'header': header, 'unit_label': unit_label,
+                'scale': scale, 'threads': threads, 'prof': prof,
+                'include_mode': include_mode, 'incremental': incremental,
+                'include_mat': include_mat, 'include_ns': include_ns,
+                'include_contacts': include_contacts, 'compact_sets': compact_sets,
+                'merge_tol': merge_tol,
+                # A subset deck is always compacted to 1..N
+                'renumber': bool(self.renumber_cb.IsChecked) or subset is not None,
+                'rcm': bool(self.renumber_cb.IsChecked and self.rcm_cb.IsChecked),
+                'dt_mats': dt_mats,
+                'write_dump': bool(self.write_dump_cb.IsChecked),
+                'validate': bool(self.validate_cb.IsChecked),
+                'body_pid_map': body_pid_map, 'mat_rows': mat_rows,
+                'node_table': node_table, 'elem_table': elem_table,
+                'ns_sets': ns_sets, 'contact_regions': contact_regions,
+            }
 
         except Exception as ex:
             import traceback
@@ -2419,71 +2627,374 @@ class ExportKFileDialog(Window):
             self.log(traceback.format_exc())
             MessageBox.Show("Export failed:\n\n" + str(ex), "Error",
                 MessageBoxButton.OK, MessageBoxImage.Error)
+            return
+
+        # Everything below only formats in-memory tables: off the UI thread
+        self._start_export(job)
 
-    # ── *NODE writer ──────────────────────────────────────────────────────
+    # ── Background export ─────────────────────────────────────────────────
 
-    def _write_nodes(self, lines, mesh_data, scale):
+    def _start_export(self, job):
         """
-        Write *NODE section. Returns (node_coords_m dict, count).
-        node_coords_m: {nid: (x_m, y_m, z_m)}  (unscaled, in meters)
+        Run _export_pipeline on a background thread so Mechanical stays
+        responsive. Log lines and progress come back through the
+        Dispatcher; Cancel stops the write at its next checkpoint.
         """
-        lines.append("*NODE")
-        # Standard format: NID(I8), X(F16), Y(F16), Z(F16) — see manual §2 (I8,3F16,2I8)
-        lines.append("$#     nid             x               y               z")
-        node_coords_m = {}
-        count = 0
+        progress = self._progress = kcore.Progress(self._on_progress)
+        job['progress'] = progress
+        self._set_busy(True)
+
+        def _work():
+            result, error = None, None
+            try:
+                result = self._export_pipeline(job)
+            except Exception as ex:
+                import traceback
+                error = (ex, traceback.format_exc())
+            self._ui(lambda: self._export_finished(job, result, error))
 
-        def _try_node(node):
-            return node.Id, node.X, node.Y, node.Z
+        worker = System.Threading.Thread(System.Threading.ThreadStart(_work))
+        worker.IsBackground = True
+        worker.Start()
 
-        # Try NodeById first (1-based sequential IDs are common)
-        try:
-            n = mesh_data.NodeCount
-            for nid in range(1, n + 1):
+    def _phase(self, job, name, total=0):
+        job['prof'].mark(name)
+        job['progress'].start(name, total)
+
+    def _export_pipeline(self, job):
+        """
+        Contact faces / merge / renumber / time step / write / validate
+        phases of on_export. Runs on the export thread: no Mechanical API
+        or WPF access here, only self.log (marshalled). Returns the
+        completion message.
+        """
+        path, threads, prof = job['path'], job['threads'], job['prof']
+        progress = job['progress']
+        include_ns, include_contacts = job['include_ns'], job['include_contacts']
+        body_pid_map, mat_rows = job['body_pid_map'], job['mat_rows']
+        node_table, elem_table = job['node_table'], job['elem_table']
+        ns_sets = job['ns_sets']
+
+        # ── boundary faces + contact segments (tables only) ───────
+        contacts, surface_faces = [], None
+        if include_contacts:
+            self._phase(job, "contacts")
+            surface_faces = kcore.extract_boundary_faces(elem_table)
+            self.log("Surface faces (boundary): {0}".format(len(surface_faces)))
+            contacts = kcont.pair_contacts(
+                job['contact_regions'], surface_faces, node_table, self.log)
+            self.log("*CONTACT: {0} contact regions".format(len(contacts)))
+
+        # ── optional coincident-node merge (bonded contacts) ──────
+        if job['merge_tol'] is not None:
+            self._phase(job, "merge")
+            merger, contacts = ktrans.merge_bonded_contacts(
+                node_table, surface_faces, contacts, job['merge_tol'],
+                self._node_grid(node_table), self.log)
+            if merger.n_merged:
+                collapsed = merger.apply(elem_table)
+                if collapsed:
+                    self.log("  WARNING: {0} elements collapsed by the merge"
+                             " - reduce the merge tolerance".format(collapsed))
+                node_table, elem_table = merger.node_table, merger.elem_table
+                ns_sets = [(name, merger.node_ids(ids)) for name, ids in ns_sets]
+                surface_faces = merger.boundary_faces(surface_faces)
+
+        # ── optional renumbering (compact ids / RCM) ───────────────
+        if job['renumber']:
+            self._phase(job, "renumber")
+            renum = ktrans.Renumbering(node_table, elem_table, rcm=job['rcm'])
+            node_table, elem_table = renum.node_table, renum.elem_table
+            ns_sets = [(name, renum.node_ids(ids)) for name, ids in ns_sets]
+            if surface_faces is not None:
+                surface_faces = renum.boundary_faces(surface_faces)
+            self.log("Renumbered{0}: bandwidth {1} -> {2}, profile {3} -> {4}".format(
+                " (RCM)" if renum.rcm else "",
+                renum.before[0], renum.after[0], renum.before[1], renum.after[1]))
+            if job['rcm'] and not renum.rcm:
+                self.log("  RCM did not reduce the profile; kept compacted order")
+
+        if include_contacts and job['compact_sets']:
+            self._phase(job, "part_sides")
+            kcont.mark_whole_part_sides(elem_table, surface_faces, contacts, self.log)
+
+        # ── critical time step estimate (report only) ──────────────
+        if job['dt_mats'] is not None:
+            self._phase(job, "time_step")
+            self._log_time_step(kcore.TimeStepEstimate(
+                node_table, elem_table, job['dt_mats'], job['scale']), body_pid_map)
+
+        # ── write phase ────────────────────────────────────────────
+        self._phase(job, "write", kcore.card_lines(node_table, elem_table))
+        opt_mat = mat_rows if job['include_mat'] else None
+        opt_ns = ns_sets if include_ns else None
+        opt_contacts = (surface_faces, contacts) if include_contacts else None
+        written = []
+        if job['incremental']:
+            sections = kincr.incremental_sections(
+                path, node_table, elem_table, body_pid_map, job['scale'], threads,
+                opt_mat, opt_ns, opt_contacts, job['compact_sets'])
+            written += kincr.write_incremental_deck(
+                path, job['header'], job['unit_label'], sections, threads,
+                progress, self.log)
+        else:
+            sections = kcore.deck_sections(
+                node_table, elem_table, body_pid_map, job['scale'], threads,
+                opt_mat, opt_ns, opt_contacts, job['compact_sets'])
+            if job['include_mode']:
+                written += kcore.write_include_deck(
+                    path, job['header'], sections, threads, progress=progress)
+            else:
+                written += kcore.write_deck(path, job['header'], sections, progress)
+        if job['write_dump']:
+            # Neutral dump of the final tables for the headless exporter;
+            # written after the deck so a cancelled export keeps the old pair.
+            written.append(kcore.write_dump(
+                os.path.splitext(path)[0] + ".kdump", job['unit_label'],
+                job['scale'], node_table, elem_table, body_pid_map, opt_mat,
+                opt_ns, surface_faces, contacts if include_contacts else None))
+
+        file_kb = sum(os.path.getsize(f) for f in written) / 1024.0
+        self.log("")
+        for f in written:
+            self.log("Saved: {0:.1f} KB  ->  {1}".format(
+                os.path.getsize(f) / 1024.0, f))
+
+        check = ""
+        if job['validate']:
+            self._phase(job, "validate")
+            report = self._validate_deck(path)
+            check = "\nValidation: {0}\n".format(
+                "OK" if report.ok else "{0} error(s), see log".format(
+                    len(report.errors)))
+        self._log_profile(path, prof.finish(), job['unit_label'], threads,
+                          len(node_table), len(elem_table))
+
+        return ("Export complete!\n\n"
+                "Nodes:    {0}\nElements: {1}\n"
+                "Parts:    {2}\nNS Sets:  {3}\nContacts: {4}\n\n"
+                "File: {5:.1f} KB\n{6}{7}".format(
+                    len(node_table), len(elem_table), len(body_pid_map),
+                    len(ns_sets), len(contacts), file_kb, path, check))
+
+    def _export_finished(self, job, result, error):
+        """UI thread: report the outcome of the export thread."""
+        progress = job['progress']
+        self._progress = None
+        self._set_busy(False)
+        if result is not None:
+            self._show_progress("done", 1.0, None)
+            MessageBox.Show(result, "Export Complete",
+                MessageBoxButton.OK, MessageBoxImage.Information)
+            return
+        ex, tb = error
+        # .NET Parallel wraps the cancellation in an AggregateException
+        if progress.cancelled:
+            removed = self._remove_partial_files(job['path'])
+            self.log("Export cancelled ({0} partial file(s) removed)".format(removed))
+            self._show_progress("cancelled", None, None)
+            return
+        self.log("ERROR: " + str(ex))
+        self.log(tb)
+        self._show_progress("failed", None, None)
+        MessageBox.Show("Export failed:\n\n" + str(ex), "Error",
+            MessageBoxButton.OK, MessageBoxImage.Error)
+
+    def _remove_partial_files(self, path):
+        """Delete '.tmp' files a cancelled write left next to the deck."""
+        targets = [path, os.path.splitext(path)[0] + ".kdump"]
+        targets += [kcore.include_path(path, name) for name in kcore.INCLUDE_SECTIONS]
+        removed = 0
+        for f in targets:
+            if os.path.exists(f + ".tmp"):
                 try:
-                    node = mesh_data.NodeById(nid)
-                    nid_r, x, y, z = _try_node(node)
-                    node_coords_m[nid_r] = (x, y, z)
-                    # *NODE standard format: NID(I8), X(F16), Y(F16), Z(F16)
-                    lines.append("{:8d}{:16.6E}{:16.6E}{:16.6E}".format(
-                        nid_r, x * scale, y * scale, z * scale))
-                    count += 1
+                    os.remove(f + ".tmp")
+                    removed += 1
                 except Exception:
                     pass
-            if count > 0:
-                lines.append("$")
-                return node_coords_m, count
+        return removed
+
+    def on_cancel(self, sender, e):
+        if self._progress is not None:
+            self._progress.cancel()
+            self.cancel_btn.IsEnabled = False
+            self.log("Cancelling...")
+
+    def on_closing(self, sender, e):
+        # Closing mid-export stops the export thread at its next checkpoint
+        if self._progress is not None:
+            self._progress.cancel()
+
+    def _set_busy(self, busy):
+        self.export_btn.IsEnabled = not busy
+        self.cancel_btn.IsEnabled = busy
+
+    def _on_progress(self, progress):
+        # Export thread: snapshot the values, draw them on the UI thread
+        phase, frac, eta = progress.phase, progress.fraction(), progress.eta()
+        self._ui(lambda: self._show_progress(phase, frac, eta))
+
+    def _show_progress(self, phase, frac, eta):
+        self.progress_bar.IsIndeterminate = frac is None and phase not in (
+            "done", "cancelled", "failed")
+        if frac is not None:
+            self.progress_bar.Value = 100.0 * frac
+        text = phase
+        if frac is not None:
+            text += "  {0:.0f}%".format(100.0 * frac)
+        if eta is not None:
+            text += "  (ETA {0:.0f} s)".format(eta)
+        self.progress_lbl.Content = text
+
+    def _render_now(self):
+        """Draw pending UI changes (progress text) before a blocking read.
+        Render priority flushes layout and rendering but no queued input,
+        so a second Export click cannot re-enter on_export here."""
+        self.Dispatcher.Invoke(DispatcherPriority.Render, System.Action(lambda: None))
+
+    def _ui(self, fn):
+        """Run fn on the dialog's UI thread (now, if already on it)."""
+        if self.Dispatcher.CheckAccess():
+            fn()
+        else:
+            self.Dispatcher.BeginInvoke(System.Action(fn))
+
+    # ── Phase profile ─────────────────────────────────────────────────────
+
+    def _log_profile(self, path, prof, unit_label, threads,
+                     n_nodes=None, n_elems=None):
+        """Log the per-phase timing table and write '<base>.kprofile.json'."""
+        self.log("")
+        self.log("Export phases:")
+        for line in prof.table():
+            self.log(line)
+        info = {'unit': unit_label, 'threads': threads,
+                'nodes': n_nodes, 'elements': n_elems}
+        try:
+            self.log("Profile: " + prof.write(path, info))
         except Exception as ex:
-            self.log("  [NODE] NodeById failed: " + str(ex))
-
-        # Fallback: NodeByIndex (0-based)
+            self.log("  Profile not written: " + str(ex))
+
+    # ── Deck validation ───────────────────────────────────────────────────
+
+    def _validate_deck(self, path):
+        """Re-read the written deck (and its includes) and log the
+        referential-integrity report (kfile.reader)."""
+        report = kreader.validate(kreader.read_deck(path))
+        self.log("Validation: " + report.summary())
+        for msg in report.warnings:
+            self.log("  WARNING: " + msg)
+        for msg in report.errors:
+            self.log("  ERROR: " + msg)
+        if report.ok:
+            self.log("  No dangling node, set or part references")
+        return report
+
+    # ── Time step report ──────────────────────────────────────────────────
+
+    def _log_time_step(self, est, body_pid_map, n_rank=20):
+        """Log per-part and smallest-element dt plus a DT2MS suggestion."""
+        ids, pids = est.elem_table.ids, est.elem_table.pids
+        ranked = est.smallest(n_rank)
+        if not ranked:
+            self.log("Time step: no element with material and nodes")
+            return
+        self.log("Critical time step (TSSFAC={0}): dt = {1:.4E} s  (elem {2})".format(
+            est.TSSFAC, est.TSSFAC * est.dt[ranked[0]], ids[ranked[0]]))
+        self.log("  Per part (min dt):")
+        for pid, r in sorted(est.per_part().items(), key=lambda kv: est.dt[kv[1]]):
+            self.log("    PID {0:<5d} {1:<24s} dt={2:.4E}  Le={3:.4E}  elem {4}".format(
+                pid, kcore.part_name(body_pid_map, pid)[:24], est.dt[r], est.le[r], ids[r]))
+        self.log("  Smallest {0} elements:".format(len(ranked)))
+        for k, r in enumerate(ranked):
+            self.log("    {0:3d}. elem {1:<9d} PID {2:<5d} dt={3:.4E}  Le={4:.4E}".format(
+                k + 1, ids[r], pids[r], est.dt[r], est.le[r]))
+        ms = est.mass_scaling()
+        if ms:
+            dt2ms, n_scaled, added = ms
+            self.log("  Suggested *CONTROL_TIMESTEP DT2MS = {0:.4E}: dt = {1:.4E} s,"
+                     " {2} elements scaled, +{3:.3f}% mass".format(
+                         dt2ms, est.TSSFAC * -dt2ms, n_scaled, 100.0 * added))
+
+    # ── Mesh tables: snapshot / subset / full read ───────────────────────
+
+    def _mesh_signature(self, mesh_data, all_pid_map):
+        """Sampled signature of the current mesh (kfile.snapshot) naming
+        the mesh snapshot; None if it cannot be taken."""
         try:
-            n = mesh_data.NodeCount
-            for i in range(n):
-                try:
-                    node = mesh_data.NodeByIndex(i)
-                    nid_r, x, y, z = _try_node(node)
-                    node_coords_m[nid_r] = (x, y, z)
-                    # *NODE standard format: NID(I8), X(F16), Y(F16), Z(F16)
-                    lines.append("{:8d}{:16.6E}{:16.6E}{:16.6E}".format(
-                        nid_r, x * scale, y * scale, z * scale))
-                    count += 1
-                except Exception:
-                    pass
-        except Exception as ex2:
-            self.log("  [NODE] NodeByIndex also failed: " + str(ex2))
-
-        lines.append("$")
-        return node_coords_m, count
-
-    # ── *ELEMENT + *PART + *SECTION writer ────────────────────────────────
+            return ksnap.mesh_signature(mesh_data, [sorted(all_pid_map.items())])
+        except Exception as ex:
+            self.log("  [SNAPSHOT] signature failed: " + str(ex))
+            return None
 
-    def _write_elements_parts(self, lines, mesh_data, model):
+    def _read_mesh_tables(self, mesh_data, subset, body_pid_map, all_pid_map, prof):
+        """
+        (NodeTable, ElementTable) with the original ids. A subset is always
+        picked by geometry body id -> MeshRegionById element ids and read
+        without touching the rest of the mesh or the snapshot, whatever
+        the cache state; only when MeshData has no MeshRegionById is it cut
+        from the full tables by element part id.
+        """
+        if subset is not None:
+            prof.mark("subset")
+            tables = kmesh.read_subset(
+                mesh_data, [self._geo_body_id(b) for b in subset], self.log)
+            if tables is not None:
+                self.log("*NODE: {0} read (subset)".format(len(tables[0])))
+                return tables
+            self.log("  [SUBSET] MeshRegionById unavailable: filtering the full mesh")
+
+        node_table, elem_table = self._read_full_tables(mesh_data, all_pid_map, prof)
+        if subset is not None:
+            node_table, elem_table = kmesh.filter_parts(
+                node_table, elem_table, set(body_pid_map.values()))
+            self.log("*NODE: {0} kept (subset)".format(len(node_table)))
+        return node_table, elem_table
+
+    def _read_full_tables(self, mesh_data, all_pid_map, prof):
         """
-        Write *SECTION + *PART + *ELEMENT_SOLID/SHELL blocks.
-        Returns (body_name -> pid dict, total element count).
+        Whole-mesh tables from the snapshot cache when the mesh is
+        unchanged, else from MeshData (refreshing the snapshot).
         """
-        # Body name → PID mapping
+        cache = None
+        sig = self._mesh_sig
+        if self.snapshot_cb.IsChecked and sig is not None:
+            prof.mark("snapshot")
+            cache = ksnap.SnapshotCache()
+            tables = cache.load(sig)
+            self.log("Mesh snapshot {0}: {1}".format(
+                sig[:12], "hit (sampled signature)" if tables else "miss"))
+            if tables is not None:
+                self.log("*NODE: {0} read (snapshot)".format(len(tables[0])))
+                return tables
+
+        prof.mark("nodes")
+        node_table = self._read_nodes(mesh_data)
+        self.log("*NODE: {0} read".format(len(node_table)))
+        prof.mark("elements")
+        elem_table = self._read_elements(mesh_data)
+        if cache is not None and len(elem_table):
+            try:
+                cache.save(sig, node_table, elem_table, all_pid_map)
+                self.log("Mesh snapshot saved: " + cache.path(sig))
+            except Exception as ex:
+                self.log("  [SNAPSHOT] WARNING: not saved: " + str(ex))
+        return node_table, elem_table
+
+    # ── *NODE reader ──────────────────────────────────────────────────────
+
+    def _read_nodes(self, mesh_data):
+        """Read all nodes into a NodeTable (see kfile.meshdata.read_nodes)."""
+        return kmesh.read_nodes(mesh_data, self.log)
+
+    # ── *ELEMENT + *PART reader ───────────────────────────────────────────
+
+    def _read_elements(self, mesh_data):
+        """Read all elements into an ElementTable (see kfile.meshdata.read_elements)."""
+        return kmesh.read_elements(mesh_data, self.log)
+
+    def _read_body_pid_map(self, model):
+        """Body name → PID mapping (PIDs follow the geometry tree order)."""
         body_pid_map = {}
         try:
             bodies = list(model.Geometry.GetChildren(
@@ -2496,176 +3007,60 @@ class ExportKFileDialog(Window):
         except Exception as ex:
             self.log("  [PART] Cannot read bodies: " + str(ex))
             body_pid_map["Model"] = 1
+        return body_pid_map
 
-        # Group elements by part ID
-        elem_by_part = {}   # pid -> [(eid, [nids], is_shell)]
-        total = 0
+    def _geo_body_id(self, body):
         try:
-            n = mesh_data.ElementCount
-            for eid in range(1, n + 1):
-                try:
-                    elem = mesh_data.ElementById(eid)
-                    # Determine part ID
-                    pid = 1
-                    for attr in ('PartId', 'BodyId', 'Part', 'Body'):
-                        try:
-                            pid = int(getattr(elem, attr))
-                            break
-                        except Exception:
-                            pass
-                    nids = list(elem.NodeIds)
-                    etype = str(elem.ElementType) if hasattr(elem, 'ElementType') else ""
-                    is_shell = "Shell" in etype or "Plate" in etype
-                    if pid not in elem_by_part:
-                        elem_by_part[pid] = []
-                    elem_by_part[pid].append((elem.Id, nids, is_shell))
-                except Exception:
-                    pass
-        except Exception as ex:
-            self.log("  [ELEM] ElementById failed: " + str(ex))
+            return int(body.GetGeoBody().Id)
+        except Exception:
+            return None
 
-        # Fallback: ElementByIndex
-        if not elem_by_part:
-            try:
-                n = mesh_data.ElementCount
-                for i in range(n):
-                    try:
-                        elem = mesh_data.ElementByIndex(i)
-                        nids = list(elem.NodeIds)
-                        etype = str(elem.ElementType) if hasattr(elem, 'ElementType') else ""
-                        is_shell = "Shell" in etype or "Plate" in etype
-                        if 1 not in elem_by_part:
-                            elem_by_part[1] = []
-                        elem_by_part[1].append((elem.Id, nids, is_shell))
-                    except Exception:
-                        pass
-            except Exception as ex2:
-                self.log("  [ELEM] ElementByIndex also failed: " + str(ex2))
-
-        if not elem_by_part:
-            self.log("  [ELEM] WARNING: No elements found")
-            return body_pid_map, 0
-
-        # ── LS-DYNA element type helpers ──────────────────────────────────
-        # Returns (ELFORM for *SECTION_SOLID, 10-node Card-2 list) per manual:
-        #   4-node Tet4    → ELFORM=10, Card2: N1,N2,N3,N4,N4,N4,N4,N4,0,0
-        #   6-node Wedge6  → ELFORM=15, Card2: N1,N2,N3,N4,N5,N5,N6,N6,0,0
-        #   8-node Hex8    → ELFORM= 1, Card2: N1..N8,0,0
-        #   5-node Pyr5    → ELFORM= 1 (degenerate hex), Card2: N1..N5,N5,N5,N5,0,0
-        #   Quadratic elements: degrade to linear using corner nodes only
-        #   10-node Tet10  → treat as Tet4 (corners = N1-N4, indices 0-3)
-        #   15-node Wedge15→ treat as Wedge6 (corners = N1-N6, indices 0-5)
-        #   20-node Hex20  → treat as Hex8  (corners = N1-N8, indices 0-7)
-        def _solid_card2(nids):
-            n = len(nids)
-            if n == 4:
-                return 10, list(nids[:4]) + [nids[3]]*4 + [0, 0]
-            elif n == 10:
-                # Tet10 → degrade to Tet4 using corner nodes (indices 0-3)
-                return 10, list(nids[:4]) + [nids[3]]*4 + [0, 0]
-            elif n == 6:
-                # Wedge6: LS-DYNA maps N5→N5,N5 and N6→N6,N6 (§19-123)
-                return 15, [nids[0],nids[1],nids[2],nids[3],
-                            nids[4],nids[4],nids[5],nids[5], 0, 0]
-            elif n == 15:
-                # Wedge15 → degrade to Wedge6 using corner nodes (indices 0-5)
-                return 15, [nids[0],nids[1],nids[2],nids[3],
-                            nids[4],nids[4],nids[5],nids[5], 0, 0]
-            elif n == 5:
-                return 1,  list(nids[:5]) + [nids[4]]*3 + [0, 0]
-            elif n == 8:
-                return 1,  list(nids[:8]) + [0, 0]
-            elif n == 20:
-                # Hex20 → degrade to Hex8 using corner nodes (indices 0-7)
-                return 1,  list(nids[:8]) + [0, 0]
-            else:   # unknown — use up to 8 nodes padded
-                padded = (list(nids) + [nids[-1]]*8)[:8]
-                return 1, padded + [0, 0]
-
-        # Write blocks per part
-        sec_id = 1
-        for pid in sorted(elem_by_part.keys()):
-            elems = elem_by_part[pid]
-            if not elems:
-                continue
-            is_shell = elems[0][2]
-
-            # *SECTION
-            if is_shell:
-                lines.append("*SECTION_SHELL")
-                # ELFORM=2: Belytschko-Tsay (most common shell element)
-                lines.append("$#   secid    elform      shrf       nip")
-                lines.append("{:10d}{:10d}{:10.4f}{:10d}".format(sec_id, 2, 1.0, 3))
-                lines.append("$#      t1        t2        t3        t4")
-                lines.append("{:10.4f}{:10.4f}{:10.4f}{:10.4f}".format(1.0, 1.0, 1.0, 1.0))
-            else:
-                # Detect ELFORM from first element's node count
-                elform, _ = _solid_card2(elems[0][1])
-                lines.append("*SECTION_SOLID")
-                lines.append("$#   secid    elform")
-                lines.append("{:10d}{:10d}".format(sec_id, elform))
-
-            # *PART
-            part_name = next(
-                (n for n, p in body_pid_map.items() if p == pid),
-                "Part_{0}".format(pid))
-            lines.append("*PART")
-            lines.append(part_name)
-            lines.append("$#    pid     secid       mid")
-            lines.append("{:10d}{:10d}{:10d}".format(pid, sec_id, pid))
-
-            # *ELEMENT
-            if is_shell:
-                lines.append("*ELEMENT_SHELL")
-                lines.append("$#   eid     pid      n1      n2      n3      n4")
-                for eid, nids, _ in elems:
-                    n = len(nids)
-                    if n in (3, 6):
-                        # Tri3 or Tri6 (quadratic): corners=N1,N2,N3; N4=N3 per manual §19-104
-                        nids4 = [nids[0], nids[1], nids[2], nids[2]]
-                    elif n in (4, 8):
-                        # Quad4 or Quad8 (quadratic): corners=N1-N4
-                        nids4 = list(nids[:4])
-                    else:
-                        nids4 = (list(nids) + [nids[-1]] * 4)[:4]
-                    lines.append("{:8d}{:8d}{:8d}{:8d}{:8d}{:8d}".format(
-                        eid, pid, *nids4))
-                    total += 1
-            else:
-                # Two-card format per LS-DYNA manual §19-119:
-                #   Card 1: EID PID  (line 1)
-                #   Card 2: N1..N8 N9 N10  (line 2, 10 × I8)
-                lines.append("*ELEMENT_SOLID")
-                lines.append("$#   eid     pid")
-                lines.append("$#    n1      n2      n3      n4      n5      n6      n7      n8")
-                for eid, nids, _ in elems:
-                    _, c2 = _solid_card2(nids)
-                    lines.append("{:8d}{:8d}".format(eid, pid))
-                    lines.append("{:8d}{:8d}{:8d}{:8d}{:8d}{:8d}"
-                                 "{:8d}{:8d}{:8d}{:8d}".format(*c2))
-                    total += 1
-
-            lines.append("$")
-            sec_id += 1
-
-        return body_pid_map, total
-
-    # ── *MAT_ELASTIC writer ───────────────────────────────────────────────
-
-    def _write_materials(self, lines, model, body_pid_map, use_mm,
-                         mat_e_scale, mat_rho_scale):
-        lines.append("$")
-        lines.append("$" + "=" * 49)
-        lines.append("$  MATERIALS")
-        lines.append("$" + "=" * 49)
+    def _subset_bodies(self, model):
+        """
+        Bodies matching the subset keywords or owning part of the current
+        geometry selection (bodies or faces). None when neither is set,
+        i.e. export the whole model.
+        """
+        keys = [k.strip().lower() for k in self.subset_tb.Text.split(',') if k.strip()]
+        use_sel = bool(self.subset_sel_cb.IsChecked)
+        if not keys and not use_sel:
+            return None
+        bodies = list(model.Geometry.GetChildren(DataModelObjectCategory.Body, True))
 
+        sel_bodies = set()
+        if use_sel:
+            try:
+                sel_ids = set(int(i) for i in ExtAPI.SelectionManager.CurrentSelection.Ids)
+            except Exception as ex:
+                self.log("  [SUBSET] Cannot read the current selection: " + str(ex))
+                sel_ids = set()
+            face_index = self._geo_face_index() if sel_ids else None
+            for body in bodies:
+                if self._geo_body_id(body) in sel_ids:
+                    sel_bodies.add(id(body))
+            for fid in sel_ids:
+                owner = face_index.body_of(fid)
+                if owner is not None:
+                    sel_bodies.add(id(owner))
+
+        picked = [b for b in bodies
+                  if id(b) in sel_bodies or any(k in b.Name.lower() for k in keys)]
+        for b in picked:
+            self.log("  [SUBSET] + {0}".format(b.Name))
+        return picked
+
+    # ── *MAT_ELASTIC reader ───────────────────────────────────────────────
+
+    def _read_materials(self, model, body_pid_map, use_mm,
+                        mat_e_scale, mat_rho_scale):
+        """One *MAT_ELASTIC row per part: [(mid, comment, rho, E, nu)]."""
         # Default steel in mm-tonne-s: rho=7.85e-9, E=2e5, nu=0.3
         # Default steel in SI:         rho=7850,    E=2e11, nu=0.3
         def_rho = 7.85e-9 if use_mm else 7850.0
         def_E   = 2.0e5   if use_mm else 2.0e11
         def_nu  = 0.3
 
-        count = 0
+        mat_rows = []
         written = set()
         try:
             bodies = list(model.Geometry.GetChildren(
@@ -2685,132 +3080,205 @@ class ExportKFileDialog(Window):
                 except Exception:
                     pass
 
-                lines.append("*MAT_ELASTIC")
-                lines.append("$ Part: {0}  Mat: {1}".format(
-                    body.Name, mat_label))
-                lines.append("$#     mid        ro         e        pr")
-                lines.append("{:10d}{:10.3E}{:10.3E}{:10.4f}".format(
-                    pid, rho, E, nu))
-                lines.append("$")
-                count += 1
+                mat_rows.append((pid, "Part: {0}  Mat: {1}".format(
+                    body.Name, mat_label), rho, E, nu))
         except Exception as ex:
             self.log("  [MAT] WARNING: " + str(ex))
             if not written:
-                lines.append("*MAT_ELASTIC")
-                lines.append("$ Default steel")
-                lines.append("$#     mid        ro         e        pr")
-                lines.append("{:10d}{:10.3E}{:10.3E}{:10.4f}".format(
-                    1, def_rho, def_E, def_nu))
-                lines.append("$")
-                count = 1
+                mat_rows = [(1, "Default steel", def_rho, def_E, def_nu)]
 
-        return count
+        return mat_rows
 
-    # ── *SET_NODE_TITLE writer ────────────────────────────────────────────
+    # ── Named Selection reader ────────────────────────────────────────────
 
-    def _write_named_selections(self, lines, mesh_data, model, node_coords_m, tol_m):
+    def _read_named_selections(self, model, resolver, node_table, tol_m, subset=False):
         """
-        Write *SET_NODE_TITLE for each Named Selection.
-        Uses geometric filtering with specified tolerance.
-        node_coords_m: {nid: (x_m, y_m, z_m)}
-        tol_m: tolerance in meters for geometry filtering
+        Resolve every Named Selection to node ids.
+        Returns [(ns_name, node_ids)] for the NS that map to at least one node;
+        list position + 1 is the *SET_NODE_TITLE id.
+        resolver: kmesh.RegionNodeResolver already primed by _prefetch_region_nodes
+        tol_m:    plane tolerance of the geometry fallback (_get_ns_node_ids)
+        subset:   node_table is a body subset; NS with nodes outside it are
+                  skipped, and the geometry fallback is not used
         """
-        lines.append("$")
-        lines.append("$" + "=" * 49)
-        lines.append("$  NAMED SELECTIONS (NODE SETS)")
-        lines.append("$" + "=" * 49)
-
         try:
             ns_list = list(model.NamedSelections.GetChildren(
                 DataModelObjectCategory.NamedSelection, True))
         except Exception as ex:
             self.log("  [NS] Cannot read Named Selections: " + str(ex))
-            return 0
-
-        count = 0
-        set_id = 1
+            return []
 
+        ns_sets = []
         for ns in ns_list:
             try:
                 ns_name = ns.Name
                 node_ids = self._get_ns_node_ids(
-                    ns, node_coords_m, tol_m, mesh_data)
+                    ns, resolver, None if subset else node_table, tol_m)
 
                 if not node_ids:
                     self.log("  [NS] {0}: 0 nodes (skipped)".format(ns_name))
                     continue
+                if subset and not kmesh.contains_all(node_table, node_ids):
+                    self.log("  [NS] {0}: extends outside the subset (skipped)".format(
+                        ns_name))
+                    continue
 
-                lines.append("*SET_NODE_TITLE")
-                lines.append(ns_name)
-                lines.append("$#    nsid")
-                lines.append("{:10d}".format(set_id))
-                lines.append(
-                    "$#      n1        n2        n3        n4"
-                    "        n5        n6        n7        n8")
-
-                row = []
-                for nid in sorted(node_ids):
-                    row.append("{:10d}".format(nid))
-                    if len(row) == 8:
-                        lines.append("".join(row))
-                        row = []
-                if row:
-                    lines.append("".join(row))
-
-                lines.append("$")
+                ns_sets.append((ns_name, node_ids))
                 self.log("  [NS] {0}: {1} nodes -> SET #{2}".format(
-                    ns_name, len(node_ids), set_id))
-                set_id += 1
-                count += 1
+                    ns_name, len(node_ids), len(ns_sets)))
 
             except Exception as ex:
                 self.log("  [NS] ERROR on {0}: {1}".format(
                     getattr(ns, 'Name', '?'), str(ex)))
 
-        return count
+        return ns_sets
+
+    def _prefetch_region_nodes(self, model, resolver, include_ns, include_contacts,
+                               node_table):
+        """
+        Generate Named Selections and collect every region id the NS and
+        contact writers will need, then resolve them all in one batch.
+        NS whose definition and mesh tables (_ns_mesh_key) are unchanged
+        since a previous export, and whose cached nodes are all still in
+        node_table, are taken from _NS_CACHE and neither regenerated nor
+        resolved.
+        """
+        self._ns_reuse = {}   # NS key -> cached node ids
+        self._ns_defs = {}    # NS key -> definition signature of a fresh NS
+        if include_ns:
+            _NS_CACHE.reset_counts()
+            try:
+                ns_list = list(model.NamedSelections.GetChildren(
+                    DataModelObjectCategory.NamedSelection, True))
+            except Exception:
+                ns_list = []
+            for ns in ns_list:
+                try:
+                    key = self._ns_key(ns)
+                    definition = self._ns_signature(ns)
+                    if self._ns_mesh_key is not None:
+                        # A hit must still lie in the mesh being exported
+                        cached = _NS_CACHE.get(
+                            key, definition, self._ns_mesh_key,
+                            lambda ids: kmesh.contains_all(node_table, ids))
+                        if cached is not None:
+                            self._ns_reuse[key] = cached
+                            continue
+                    self._ns_defs[key] = definition
+                    # Generate NS to ensure it's up to date
+                    ns.Generate()
+                    resolver.request(ns.Location.Ids)
+                except Exception as ex:
+                    self.log("    [MeshAPI] {0}: FAILED - {1}".format(
+                        getattr(ns, 'Name', '?'), str(ex)[:80]))
+        if include_contacts:
+            try:
+                cr_list = list(model.Connections.GetChildren(
+                    DataModelObjectCategory.ContactRegion, True))
+            except Exception:
+                cr_list = []
+            for cr in cr_list:
+                for loc in ('SourceLocation', 'TargetLocation'):
+                    try:
+                        resolver.request(getattr(cr, loc).Ids)
+                    except Exception:
+                        pass
+        resolver.resolve()
+        self.log("Region -> nodes: {0} regions in {1} MeshData call(s)".format(
+            len(resolver), resolver.api_calls))
 
-    def _get_ns_node_ids(self, ns, node_coords_m, tol_m, mesh_data):
+    def _get_ns_node_ids(self, ns, resolver, node_table=None, tol_m=0.0):
         """
-        Return set of node IDs belonging to this Named Selection.
-        Uses MeshData.GetNodeIdsFromRegionIds API for direct region→node conversion.
+        Return sorted array('i') of node IDs belonging to this Named Selection,
+        assembled from the resolver's per-region cache. When MeshData maps
+        the NS regions to no node at all, nodes of node_table within tol_m
+        of the NS face planes are used instead (_get_ns_node_ids_geometry);
+        such a result is not cached.
         """
         ns_name = ns.Name
+        key = self._ns_key(ns)
+        cached = getattr(self, '_ns_reuse', {}).get(key)
+        if cached is not None:
+            self.log("    [NSCache] {0}: unchanged → {1} nodes".format(
+                ns_name, len(cached)))
+            return cached
 
         try:
-            # Generate NS to ensure it's up to date
-            ns.Generate()
-
-            # Get region IDs from Named Selection
             region_ids = list(ns.Location.Ids)
             self.log("    [MeshAPI] {0}: {1} region IDs from Location.Ids".format(
                 ns_name, len(region_ids)))
 
-            if not region_ids:
-                return set()
-
-            # Use MeshData API: region IDs → node IDs (returns Dictionary)
-            node_dict = mesh_data.GetNodeIdsFromRegionIds(region_ids)
-            result = set()
-
-            # node_dict is KeyValuePair<int, IList<int>>
-            for kvp in node_dict:
-                region_id = kvp.Key
-                node_list = kvp.Value
-                for nid in node_list:
-                    result.add(int(nid))
-
-            self.log("    [MeshAPI] {0}: GetNodeIdsFromRegionIds → {1} nodes".format(
-                ns_name, len(result)))
+            result = resolver.nodes(region_ids) if region_ids else array('i')
+            if region_ids:
+                self.log("    [MeshAPI] {0}: region cache → {1} nodes".format(
+                    ns_name, len(result)))
+                if not result and node_table is not None:
+                    return self._get_ns_node_ids_geometry(ns, ns_name, node_table, tol_m)
+            if self._ns_mesh_key is not None and key in self._ns_defs:
+                _NS_CACHE.put(key, self._ns_defs[key], self._ns_mesh_key, result)
             return result
 
         except Exception as ex:
             self.log("    [MeshAPI] {0}: FAILED - {1}".format(
                 ns_name, str(ex)[:80]))
-            return set()
+            return array('i')
+
+    # Worksheet criterion fields that define a generated Named Selection
+    _NS_CRITERION_ATTRS = ('Active', 'Action', 'EntityType', 'Criterion',
+                           'Operator', 'Units', 'Value', 'LowerBound',
+                           'UpperBound', 'CoordinateSystem')
+
+    def _ns_key(self, ns):
+        try:
+            return int(ns.ObjectId)
+        except Exception:
+            return ns.Name
 
-    def _get_ns_node_ids_geometry(self, ns, ns_name, node_coords_m, tol_m):
-        """Extract node IDs from geometry faces using plane filtering.
-        Gets face IDs from NS, then looks up SpaceClaim face entities from bodies."""
+    def _ns_signature(self, ns):
+        """
+        Hash of a Named Selection's definition: scoping method plus the
+        worksheet criteria (worksheet NS) or the scoped geometry ids.
+        None when it cannot be read - such an NS is never reused.
+        """
+        try:
+            method = str(ns.ScopingMethod)
+        except Exception:
+            method = ""
+        items = [ns.Name, method]
+        try:
+            if 'Worksheet' in method:
+                for c in ns.GenerationCriteria:
+                    items.append(tuple(str(getattr(c, a, ""))
+                                       for a in self._NS_CRITERION_ATTRS))
+            else:
+                items.append(sorted(int(i) for i in ns.Location.Ids))
+        except Exception:
+            return None
+        return kcore.content_hash(*items)
+
+    def _node_grid(self, node_table):
+        """Spatial index over the exported nodes, built on first use per export."""
+        grid = getattr(self, '_grid', None)
+        if grid is None or grid.table is not node_table:
+            grid = self._grid = ktrans.NodeGrid(node_table)
+        return grid
+
+    def _geo_face_index(self):
+        """PersistentId/Id -> GeoFace index over all bodies, built once per export."""
+        if getattr(self, '_face_index', None) is None:
+            model = ExtAPI.DataModel.Project.Model
+            bodies = list(model.Geometry.GetChildren(
+                DataModelObjectCategory.Body, True))
+            self._face_index = kmesh.GeoFaceIndex(bodies)
+            self.log("    [Geo] face index: {0} faces in {1} bodies".format(
+                self._face_index.n_faces, len(bodies)))
+        return self._face_index
+
+    def _get_ns_node_ids_geometry(self, ns, ns_name, node_table, tol_m):
+        """Fallback for NS regions MeshData cannot convert: node IDs within
+        tol_m of the NS faces' planes (centroid + normal of each SpaceClaim
+        face, looked up by PersistentId), found through the export's
+        NodeGrid. Returns sorted array('i')."""
         face_entities = []
 
         try:
@@ -2820,29 +3288,14 @@ class ExportKFileDialog(Window):
 
             if not face_ids:
                 self.log("    [Geo] {0}: no face IDs".format(ns_name))
-                return set()
-
-            model = ExtAPI.DataModel.Project.Model
-            bodies = list(model.Geometry.GetChildren(
-                DataModelObjectCategory.Body, True))
-            self.log("    [Geo] {0}: searching {1} bodies for faces".format(
-                ns_name, len(bodies)))
+                return array('i')
 
+            face_index = self._geo_face_index()
             for fid in face_ids:
-                found = False
-                for body in bodies:
-                    try:
-                        gb = body.GetGeoBody()
-                        for f in gb.Faces:
-                            if f.PersistentId == fid:
-                                face_entities.append(f)
-                                found = True
-                                break
-                    except Exception:
-                        pass
-                    if found:
-                        break
-                if not found:
+                entry = face_index.by_persistent_id.get(fid)
+                if entry is not None:
+                    face_entities.append(entry[0])
+                else:
                     self.log("    [Geo] face ID {0} NOT FOUND in bodies".format(fid))
 
             self.log("    [Geo] {0}: found {1} SpaceClaim faces".format(
@@ -2853,11 +3306,11 @@ class ExportKFileDialog(Window):
 
         if not face_entities:
             self.log("    [Geo] {0}: NO FACES → 0 nodes".format(ns_name))
-            return set()
+            return array('i')
 
-        result = set()
+        planes = []
         self.log("    [Filter] {0}: {1} nodes × {2} faces (tol={3:.5f} m)".format(
-            ns_name, len(node_coords_m), len(face_entities), tol_m))
+            ns_name, len(node_table), len(face_entities), tol_m))
 
         for idx, face in enumerate(face_entities):
             try:
@@ -2877,267 +3330,36 @@ class ExportKFileDialog(Window):
 
                 self.log("    [Filter] face {0}: C=({1:.4f},{2:.4f},{3:.4f}) N=({4:.2f},{5:.2f},{6:.2f})".format(
                     idx, cx, cy, cz, nx, ny, nz))
-
-                # Filter nodes on this face plane
-                matched = 0
-                for nid, (x, y, z) in node_coords_m.items():
-                    dist = abs((x - cx) * nx + (y - cy) * ny + (z - cz) * nz)
-                    if dist <= tol_m:
-                        result.add(nid)
-                        matched += 1
-
-                self.log("    [Filter] face {0}: {1} nodes matched".format(idx, matched))
+                planes.append(((cx, cy, cz), (nx, ny, nz)))
             except Exception as ex:
                 self.log("    [Filter] face {0}: ERROR - {1}".format(idx, str(ex)[:50]))
 
+        # Nodes on the face planes (grid cells in each plane's slab only)
+        result = ktrans.plane_node_ids(self._node_grid(node_table), planes, tol_m)
         self.log("    [Geo] {0}: geometry-filter → {1} nodes TOTAL".format(
             ns_name, len(result)))
         return result
 
-    # ── Contact: element face extraction ──────────────────────────────────
-
-    # Face topology: node count → list of (local index tuples per face)
-    # For quadratic solids, corner node indices only (mid-side nodes ignored).
-    # ANSYS SOLID187 (Tet10):  corners=idx 0-3,  midsides=idx 4-9
-    # ANSYS SOLID186 (Hex20):  corners=idx 0-7,  midsides=idx 8-19
-    # ANSYS SOLID185/186 Wedge15: corners=idx 0-5, midsides=idx 6-14
-    _FACE_TOPO = {
-        # ── Linear solids ────────────────────────────────────────────────
-        4: [(0,1,2), (0,2,3), (0,3,1), (1,3,2)],                          # Tet4
-        8: [(0,1,2,3),(4,7,6,5),(0,4,5,1),(1,5,6,2),(2,6,7,3),(3,7,4,0)], # Hex8
-        6: [(0,1,2),(3,5,4),(0,3,4,1),(1,4,5,2),(0,2,5,3)],                # Wedge6
-        5: [(0,3,2,1),(0,1,4),(1,2,4),(2,3,4),(3,0,4)],                    # Pyramid5
-        3: [(0,1,2)],                                                       # Tri3 shell
-        # ── Quadratic solids — corner faces only ─────────────────────────
-        10: [(0,1,2), (0,2,3), (0,3,1), (1,3,2)],                         # Tet10  → Tet4 corners
-        20: [(0,1,2,3),(4,7,6,5),(0,4,5,1),(1,5,6,2),(2,6,7,3),(3,7,4,0)],# Hex20  → Hex8 corners
-        15: [(0,1,2),(3,5,4),(0,3,4,1),(1,4,5,2),(0,2,5,3)],               # Wedge15→ Wedge6 corners
-        13: [(0,3,2,1),(0,1,4),(1,2,4),(2,3,4),(3,0,4)],                   # Pyr13  → Pyr5 corners
-    }
-
-    def _collect_elements(self, mesh_data):
-        """Collect all elements. Returns {eid: ([nid,...], is_shell)}."""
-        all_elems = {}
-        try:
-            n = mesh_data.ElementCount
-            for eid in range(1, n + 1):
-                try:
-                    elem = mesh_data.ElementById(eid)
-                    nids = list(elem.NodeIds)
-                    etype = str(elem.ElementType) if hasattr(elem, 'ElementType') else ""
-                    all_elems[elem.Id] = (nids, "Shell" in etype or "Plate" in etype)
-                except Exception:
-                    pass
-        except Exception:
-            pass
-        if not all_elems:
-            try:
-                n = mesh_data.ElementCount
-                for i in range(n):
-                    try:
-                        elem = mesh_data.ElementByIndex(i)
-                        nids = list(elem.NodeIds)
-                        etype = str(elem.ElementType) if hasattr(elem, 'ElementType') else ""
-                        all_elems[elem.Id] = (nids, "Shell" in etype or "Plate" in etype)
-                    except Exception:
-                        pass
-            except Exception:
-                pass
-        return all_elems
-
-    def _enumerate_element_faces(self, all_elems):
-        """Decompose elements into faces.
-        Returns {frozenset(node_ids): [(eid, [ordered_nids]), ...]}."""
-        face_map = {}
-        for eid, (nids, is_shell) in all_elems.items():
-            n = len(nids)
-            if is_shell:
-                # Shell elements: the element itself is the contact surface.
-                # Use only corner nodes to avoid mid-side nodes in segment output.
-                # Tri3/Tri6 → triangular face [n0,n1,n2]
-                # Quad4/Quad8 → quad face [n0,n1,n2,n3]
-                if n in (3, 6):
-                    topo = [(0, 1, 2)]
-                elif n in (4, 8):
-                    topo = [(0, 1, 2, 3)]
-                else:
-                    topo = [tuple(range(min(n, 4)))]
-            else:
-                topo = self._FACE_TOPO.get(n, [])
-            for fi in topo:
-                ordered = [nids[k] for k in fi]
-                key = frozenset(ordered)
-                if key not in face_map:
-                    face_map[key] = []
-                face_map[key].append((eid, ordered))
-        return face_map
-
-    def _extract_surface_faces(self, face_map):
-        """Return faces belonging to exactly one element (boundary faces)."""
-        return [entries[0]
-                for entries in face_map.values()
-                if len(entries) == 1]
-
-    def _average_elem_size(self, segment_faces, node_coords_m):
-        """Average edge length (m) across segment faces. Returns 1.0 if empty."""
-        import math
-        total, count = 0.0, 0
-        for (_eid, nodes) in segment_faces:
-            coords = [node_coords_m[nid] for nid in nodes if nid in node_coords_m]
-            m = len(coords)
-            if m < 2:
-                continue
-            for i in range(m):
-                a, b = coords[i], coords[(i + 1) % m]
-                dx, dy, dz = a[0]-b[0], a[1]-b[1], a[2]-b[2]
-                total += math.sqrt(dx*dx + dy*dy + dz*dz)
-                count += 1
-        return total / count if count > 0 else 1.0
-
-    def _get_contact_segment_faces(self, selection_info, surface_faces, mesh_data):
-        """Filter surface_faces to those belonging to SelectionInfo region.
-        Uses MeshData.GetNodeIdsFromRegionIds for direct conversion."""
-        result = []
-        seen = set()
-
-        try:
-            # Get region IDs from SelectionInfo
-            region_ids = list(selection_info.Ids)
-            if not region_ids:
-                return result
-
-            # Convert region IDs to node IDs using MeshData API
-            node_dict = mesh_data.GetNodeIdsFromRegionIds(region_ids)
-            region_nodes = set()
-            for kvp in node_dict:
-                for nid in kvp.Value:
-                    region_nodes.add(int(nid))
-
-            if not region_nodes:
-                return result
-
-            # Filter surface faces: include if ALL nodes belong to region
-            for (eid, nodes) in surface_faces:
-                key = (eid, tuple(nodes))
-                if key in seen:
-                    continue
-
-                # Check if all face nodes are in region
-                if all(nid in region_nodes for nid in nodes):
-                    result.append((eid, nodes))
-                    seen.add(key)
-
-            return result
-
-        except Exception as ex:
-            return result
+    # ── Contact regions ───────────────────────────────────────────────────
 
-    def _write_segment_set(self, lines, seg_id, title, segment_faces):
-        """Write *SET_SEGMENT_TITLE card.
-        Segment row format: n1 n2 n3 n4 (4 corner node IDs, no element ID).
-        """
-        lines.append("*SET_SEGMENT_TITLE")
-        lines.append(title)
-        lines.append("{:10d}".format(seg_id))
-        lines.append("$#      n1        n2        n3        n4")
-        for (_eid, nodes) in segment_faces:
-            n1 = nodes[0]; n2 = nodes[1]; n3 = nodes[2]
-            # LS-DYNA: triangular segment → N4 = N3 (per manual §43-54)
-            n4 = nodes[3] if len(nodes) >= 4 else nodes[2]
-            lines.append("{:10d}{:10d}{:10d}{:10d}".format(n1, n2, n3, n4))
-
-    def _write_contacts(self, lines, surface_faces, node_coords_m, mesh_data):
-        """Read Contact Regions, write *SET_SEGMENT_TITLE + *CONTACT_* cards.
-        Returns number of contact regions written.
-        Uses MeshData.GetNodeIdsFromRegionIds for direct conversion."""
+    def _read_contact_regions(self, model, node_table, resolver, subset=False):
+        """Read Contact Regions into plain dicts for kcont.pair_contacts.
+        Only this part touches the model and MeshData (Mechanical thread).
+        Region nodes come from the resolver primed by _prefetch_region_nodes.
+        subset: node_table is a body subset; contacts with a side outside
+        it are skipped."""
         try:
-            model = ExtAPI.DataModel.Project.Model
             connections = model.Connections
             cr_list = list(connections.GetChildren(
                 DataModelObjectCategory.ContactRegion, True))
         except Exception as ex:
             self.log("  [CONTACT] Cannot read connections: " + str(ex))
-            return 0
+            return []
         if not cr_list:
             self.log("  [CONTACT] No contact regions found")
-            return 0
-
-        seg_id = 100  # Start well above NS set IDs
-        written = 0
-        for cr in cr_list:
-            try:
-                cr_name = cr.Name
-            except Exception:
-                cr_name = "Contact_{0}".format(seg_id // 2)
-            try:
-                contact_faces = self._get_contact_segment_faces(
-                    cr.SourceLocation, surface_faces, mesh_data)
-                target_faces  = self._get_contact_segment_faces(
-                    cr.TargetLocation,  surface_faces, mesh_data)
-            except Exception as ex:
-                self.log("  [CONTACT] Geometry read failed for {0}: {1}".format(
-                    cr_name, ex))
-                seg_id += 2
-                continue
-            if not contact_faces and not target_faces:
-                self.log("  [CONTACT] No segments matched: " + cr_name)
-                seg_id += 2
-                continue
-
-            # Master/Slave: finer mesh (smaller avg edge length) = Slave
-            size_c = self._average_elem_size(contact_faces, node_coords_m)
-            size_t = self._average_elem_size(target_faces,  node_coords_m)
-            if size_c <= size_t:
-                slave_faces,  slave_id  = contact_faces, seg_id
-                master_faces, master_id = target_faces,  seg_id + 1
-                self.log("  {0}: Contact=Slave(size={1:.5f}), Target=Master".format(
-                    cr_name, size_c))
-            else:
-                master_faces, master_id = contact_faces, seg_id
-                slave_faces,  slave_id  = target_faces,  seg_id + 1
-                self.log("  {0}: Contact=Master, Target=Slave(size={1:.5f})".format(
-                    cr_name, size_t))
-
-            self._write_segment_set(lines, slave_id,
-                                    cr_name + "_SLAVE",  slave_faces)
-            self._write_segment_set(lines, master_id,
-                                    cr_name + "_MASTER", master_faces)
-
-            ct = ""
-            try:
-                ct = str(cr.ContactType)
-            except Exception:
-                pass
-            kw = ("*CONTACT_TIED_SURFACE_TO_SURFACE"
-                  if 'Bonded' in ct
-                  else "*CONTACT_AUTOMATIC_SURFACE_TO_SURFACE")
-            lines.append(kw)
-            # Card 1: SURFA(=SSID), SURFB(=MSID), SURFATYP(=SSTYP), SURFBTYP(=MSTYP)
-            #   SURFATYP=0 → segment set ID (matches our *SET_SEGMENT_TITLE)
-            lines.append("$#    ssid      msid     sstyp     mstyp")
-            lines.append("{:10d}{:10d}{:10d}{:10d}".format(
-                slave_id, master_id, 0, 0))
-            # Card 2: FS, FD, DC, VC, VDC, PENCHK, BT, DT
-            mu = 0.0
-            if 'Frictional' in ct:
-                try:
-                    mu = float(cr.FrictionCoefficient)
-                except Exception:
-                    mu = 0.3
-            lines.append("$#       fs        fd        dc        vc       vdc    penchk        bt")
-            # DT omitted → LS-DYNA uses default (1e20); writing 0.0 risks early contact death
-            lines.append("{:10.4f}{:10.4f}{:10.4f}{:10.4f}{:10.4f}{:10d}{:10.4f}".format(
-                mu, mu, 0.0, 0.0, 0.0, 0, 0.0))
-            # Card 3: SFSA, SFSB, SAST, SBST, SFSAT, SFSBT, FSF, VSF (mandatory per manual §11-33)
-            lines.append("$#    sfsa      sfsb      sast      sbst     sfsat     sfsbt       fsf       vsf")
-            lines.append("{:10.4f}{:10.4f}{:10.4f}{:10.4f}{:10.4f}{:10.4f}{:10.4f}{:10.4f}".format(
-                1.0, 1.0, 0.0, 0.0, 1.0, 1.0, 1.0, 1.0))
-            lines.append("$")
-            self.log("  -> {0} (SSID={1} MSID={2})".format(kw, slave_id, master_id))
-            seg_id += 2
-            written += 1
-
-        return written
+            return []
+        return kcont.read_contact_regions(
+            cr_list, resolver, node_table if subset else None, self.log)
 
 
 def _btn(text, handler, width=None):
@@ -3601,6 +3823,9 @@ class TiedContactCheckDialog(Window):
                 self.log("    No Contact Regions defined → All bodies suspect")
                 return list(all_bodies)
 
+            # One Id -> (face, body) index serves every contact below
+            face_index = kmesh.GeoFaceIndex(all_bodies)
+
             # Build adjacency map: body -> set of connected bodies
             adjacent = {}
             for body in all_bodies:
@@ -3614,18 +3839,18 @@ class TiedContactCheckDialog(Window):
                     # Get Contact side bodies
                     if hasattr(contact, 'SourceLocation'):
                         contact_bodies.update(self._get_bodies_from_selection(
-                            contact.SourceLocation, all_bodies))
+                            contact.SourceLocation, all_bodies, face_index))
                     elif hasattr(contact, 'ContactGeometry'):
                         contact_bodies.update(self._get_bodies_from_geometry(
-                            contact.ContactGeometry, all_bodies))
+                            contact.ContactGeometry, all_bodies, face_index))
 
                     # Get Target side bodies
                     if hasattr(contact, 'TargetLocation'):
                         contact_bodies.update(self._get_bodies_from_selection(
-                            contact.TargetLocation, all_bodies))
+                            contact.TargetLocation, all_bodies, face_index))
                     elif hasattr(contact, 'TargetGeometry'):
                         contact_bodies.update(self._get_bodies_from_geometry(
-                            contact.TargetGeometry, all_bodies))
+                            contact.TargetGeometry, all_bodies, face_index))
 
                     # Add edges between all pairs
                     contact_bodies_list = list(contact_bodies)
@@ -3677,39 +3902,37 @@ class TiedContactCheckDialog(Window):
             self.log("    Connectivity analysis failed: {}".format(str(ex)))
             return []
 
-    def _get_bodies_from_selection(self, selection_info, all_bodies):
+    def _get_bodies_from_selection(self, selection_info, all_bodies, face_index=None):
         """Extract bodies from SelectionInfo (face selection)"""
         bodies = set()
+        if face_index is None:
+            face_index = kmesh.GeoFaceIndex(all_bodies)
         try:
             for entity in selection_info.Entities:
                 # Entity is a face (GeoFace), find parent body
-                for body in all_bodies:
-                    try:
-                        geo_body = body.GetGeoBody()
-                        for face in geo_body.Faces:
-                            if face == entity:
-                                bodies.add(body)
-                                break
-                    except:
-                        continue
+                try:
+                    body = face_index.body_of(entity.Id)
+                except Exception:
+                    body = None
+                if body is None:
+                    body = next((b for f, b in face_index.by_id.values()
+                                 if f == entity), None)
+                if body is not None:
+                    bodies.add(body)
         except:
             pass
         return bodies
 
-    def _get_bodies_from_geometry(self, geometry, all_bodies):
+    def _get_bodies_from_geometry(self, geometry, all_bodies, face_index=None):
         """Extract bodies from geometry scoping (legacy API)"""
         bodies = set()
+        if face_index is None:
+            face_index = kmesh.GeoFaceIndex(all_bodies)
         try:
-            geo_ids = list(geometry.Ids)
-            for body in all_bodies:
-                try:
-                    geo_body = body.GetGeoBody()
-                    for face in geo_body.Faces:
-                        if hasattr(face, 'Id') and face.Id in geo_ids:
-                            bodies.add(body)
-                            break
-                except:
-                    continue
+            for gid in geometry.Ids:
+                body = face_index.body_of(gid)
+                if body is not None:
+                    bodies.add(body)
         except:
             pass
         return bodies
@@ -0,0 +1,28 @@
+# encoding: utf-8
+"""Shared fixtures: small meshes from the benchmark's synthetic MeshData."""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kfile import bench, meshdata    # noqa: E402
+
+
+def read_mesh(kind, nx=3, ny=3, nz_body=2):
+    """(NodeTable, ElementTable) of two stacked nx x ny x nz_body blocks,
+    parts 1 and 2, 1 mm cells."""
+    mesh = bench.SyntheticMeshData(kind, nx, ny, nz_body)
+    return meshdata.read_nodes(mesh), meshdata.read_elements(mesh)
+
+
+@pytest.fixture
+def hex_mesh():
+    return read_mesh('hex')
+
+
+@pytest.fixture
+def tet_mesh():
+    return read_mesh('tet')
@@ -0,0 +1,83 @@
+# encoding: utf-8
+from kfile import core, meshdata
+
+# Unit hex corners 1-4 at z=0, 5-8 at z=1 (MeshData hex order)
+_BOTTOM, _TOP = [1, 2, 3, 4], [5, 6, 7, 8]
+
+
+def _elements(*elements):
+    table = core.ElementTable()
+    for eid, nids in enumerate(elements, 1):
+        table.add(eid, 1, nids, False)
+    return table
+
+
+def _face_sets(faces):
+    return sorted(tuple(sorted(faces.face_nodes(f))) for f in range(len(faces)))
+
+
+def test_shared_face_is_interior():
+    faces = core.extract_boundary_faces(
+        _elements(_BOTTOM + _TOP, _TOP + [9, 10, 11, 12]))
+    assert len(faces) == 10
+    assert (5, 6, 7, 8) not in _face_sets(faces)
+
+
+def test_face_shared_by_three_elements_is_interior():
+    # Two elements stacked on the same face of a third: the face occurs
+    # three times and must not come back as a boundary face.
+    faces = core.extract_boundary_faces(_elements(
+        _BOTTOM + _TOP, _TOP + [9, 10, 11, 12], _TOP + [13, 14, 15, 16]))
+    assert len(faces) == 15
+    assert (5, 6, 7, 8) not in _face_sets(faces)
+
+
+def test_duplicated_element_has_no_boundary():
+    faces = core.extract_boundary_faces(_elements(_BOTTOM + _TOP, _BOTTOM + _TOP))
+    assert len(faces) == 0
+
+
+def test_collapsed_quad_matches_triangle():
+    # Wedge stored as a degenerate hex, capped by a tet on its top triangle
+    faces = core.extract_boundary_faces(
+        _elements([1, 2, 3, 3, 4, 5, 6, 6], [4, 5, 6, 7]))
+    tris = [f for f in _face_sets(faces) if len(set(f)) == 3]
+    assert (4, 5, 6) not in tris
+    assert len(faces) == 5 + 4 - 2
+
+
+def test_triangle_and_quad_keys_do_not_collide():
+    faces = core.extract_boundary_faces(
+        _elements(_BOTTOM + _TOP, [1, 2, 3, 9]))
+    assert len(faces) == 6 + 4
+
+
+def test_large_node_ids_pack_exactly():
+    big = 10 ** 7
+    lower = [big + n for n in _BOTTOM + _TOP]
+    upper = [big + n for n in _TOP + [9, 10, 11, 12]]
+    faces = core.extract_boundary_faces(_elements(lower, upper))
+    assert len(faces) == 10
+    assert tuple(big + n for n in (5, 6, 7, 8)) not in _face_sets(faces)
+
+
+def test_faces_of_matches_scan(tet_mesh):
+    _nodes, elems = tet_mesh
+    faces = core.extract_boundary_faces(elems)
+    for nid in range(1, max(elems.conn) + 1):
+        expected = [f for f in range(len(faces)) if nid in faces.face_nodes(f)]
+        assert list(faces.faces_of(nid)) == expected
+    assert list(faces.faces_of(0)) == []
+    assert list(faces.faces_of(10 ** 6)) == []
+
+
+def test_region_faces_needs_every_corner(hex_mesh):
+    _nodes, elems = hex_mesh
+    faces = core.extract_boundary_faces(elems)
+    top = [n for n in range(1, 49) if (n - 1) // 16 == 2]    # body 1, z = 2 mm
+    found = meshdata.region_faces(faces, top)
+    assert len(found) == 9
+    assert all(set(faces.face_nodes(f)) <= set(top) for f in found)
+    # Dropping one corner node loses the four faces around it
+    assert len(meshdata.region_faces(faces, top[:5] + top[6:])) == 9 - 4
+    assert len(meshdata.region_faces(faces, [])) == 0
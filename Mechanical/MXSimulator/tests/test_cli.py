@@ -0,0 +1,29 @@
+# encoding: utf-8
+import os
+from array import array
+
+import pytest
+
+from kfile import cli, core
+
+
+@pytest.fixture
+def dump_path(tmp_path, hex_mesh):
+    nodes, elems = hex_mesh
+    return core.write_dump(str(tmp_path / "model.kdump"), "mm", 1000.0, nodes, elems,
+                           {"Bottom": 1, "Top": 2},
+                           ns_sets=[("Fix", array('i', range(1, 17)))])
+
+
+@pytest.mark.parametrize("include", [False, True])
+def test_export_creates_missing_output_folders(tmp_path, dump_path, include):
+    out = tmp_path / "a" / "b" / "model.k"
+    argv = ['export', dump_path, '-o', str(out), '--threads', '1', '--check']
+    if include:
+        argv.append('--include')
+    assert cli.main(argv) == 0
+    assert out.exists()
+    if include:
+        assert os.path.exists(core.include_path(str(out), 'nodes'))
+    assert not [f for f in os.listdir(str(out.parent)) if f.endswith(".tmp")]
+
@@ -0,0 +1,81 @@
+# encoding: utf-8
+from array import array
+
+import pytest
+
+from kfile import core
+
+
+@pytest.mark.parametrize("ids, runs", [
+    ([], []),
+    ([7], [[7, 7]]),
+    ([1, 2, 3, 4], [[1, 4]]),
+    ([1, 2, 3, 7, 8, 10], [[1, 3], [7, 8], [10, 10]]),
+    (array('i', [5, 6, 9]), [[5, 6], [9, 9]]),
+])
+def test_id_runs(ids, runs):
+    assert core.id_runs(ids) == runs
+
+
+def _sets(ns_sets, compact):
+    out = []
+    core.write_named_selections(out, ns_sets, compact)
+    return out
+
+
+def _generate_ranges(lines):
+    """(lo, hi) pairs from the data lines of *SET_NODE_LIST_GENERATE_TITLE."""
+    start = lines.index("*SET_NODE_LIST_GENERATE_TITLE") + 5
+    ranges = []
+    for line in lines[start:]:
+        if line.startswith("$"):
+            break
+        f = [int(line[k:k + 10]) for k in range(0, len(line), 10)]
+        ranges.extend(zip(f[0::2], f[1::2]))
+    return ranges
+
+
+def test_compact_set_written_as_generate_ranges():
+    ids = list(range(1, 101)) + list(range(201, 251)) + [300, 301]
+    lines = _sets([("Fix", array('i', ids))], compact=True)
+    assert "*SET_NODE_TITLE" not in lines
+    i = lines.index("*SET_NODE_LIST_GENERATE_TITLE")
+    assert lines[i + 1] == "Fix"
+    assert lines[i + 3] == "{:10d}".format(1)
+    assert _generate_ranges(lines) == [(1, 100), (201, 250), (300, 301)]
+
+
+def test_generate_ranges_wrap_at_four_per_line():
+    ids = [k for k in range(1, 60) if k % 10]       # 6 runs of 9
+    lines = _sets([("Gaps", ids)], compact=True)
+    i = lines.index("*SET_NODE_LIST_GENERATE_TITLE")
+    assert len(lines[i + 5]) == 80 and len(lines[i + 6]) == 40
+    assert _generate_ranges(lines) == [(10 * k + 1, 10 * k + 9) for k in range(6)]
+
+
+def test_scattered_ids_stay_a_node_list():
+    lines = _sets([("Odd", [1, 3, 5, 7])], compact=True)
+    assert "*SET_NODE_LIST_GENERATE_TITLE" not in lines
+    assert "*SET_NODE_TITLE" in lines
+
+
+def test_compact_off_writes_every_id():
+    lines = _sets([("Fix", list(range(1, 11)))], compact=False)
+    assert "*SET_NODE_TITLE" in lines
+    assert lines[-3] == "".join("{:10d}".format(n) for n in range(1, 9))
+    assert lines[-2] == "{:10d}{:10d}".format(9, 10)
+
+
+def test_whole_part_side_references_the_part(hex_mesh):
+    _nodes, elems = hex_mesh
+    faces = core.extract_boundary_faces(elems)
+    part2 = array('i', [f for f in range(len(faces)) if elems.pids[faces.rows[f]] == 2])
+    contact = {'name': "C", 'kw': "*CONTACT_AUTOMATIC_SURFACE_TO_SURFACE", 'mu': 0.2,
+               'slave_id': 100, 'slave': part2, 'slave_pid': 2,
+               'master_id': 101, 'master': array('i', [0, 1]), 'master_pid': 0}
+    out = []
+    core.write_contacts(out, faces, [contact])
+    assert [l for l in out if l.startswith("*SET_SEGMENT")] == ["*SET_SEGMENT_TITLE"]
+    assert "C_SLAVE" not in out and "C_MASTER" in out
+    card1 = out[out.index(contact['kw']) + 2]
+    assert card1 == "{:10d}{:10d}{:10d}{:10d}".format(2, 101, 3, 0)
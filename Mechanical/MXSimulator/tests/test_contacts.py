@@ -0,0 +1,87 @@
+# encoding: utf-8
+from array import array
+
+from kfile import bench, contacts, core, meshdata
+
+
+def _setup(coarse_body=None, factor=4.0):
+    """Synthetic mesh + model; coarse_body (0/1) has its cells scaled by
+    factor so its mean edge length is larger."""
+    mesh = bench.SyntheticMeshData('hex', 3, 3, 2)
+    nodes, elems = meshdata.read_nodes(mesh), meshdata.read_elements(mesh)
+    if coarse_body is not None:
+        half = len(nodes) // 2
+        for i in range(coarse_body * half, (coarse_body + 1) * half):
+            for a in range(3):
+                nodes.xyz[3 * i + a] *= factor
+    resolver = meshdata.RegionNodeResolver(mesh)
+    model = bench.SyntheticModel()
+    cr_list = model.Connections.GetChildren(None, True)
+    for cr in cr_list:
+        resolver.request(cr.SourceLocation.Ids)
+        resolver.request(cr.TargetLocation.Ids)
+    resolver.resolve()
+    return nodes, elems, cr_list, resolver
+
+
+def test_read_contact_regions():
+    _nodes, _elems, cr_list, resolver = _setup()
+    regions = contacts.read_contact_regions(cr_list, resolver)
+    assert [(r['name'], r['kw'], r['mu'], r['seg_id']) for r in regions] == [
+        ("Bonded_1_2", "*CONTACT_TIED_SURFACE_TO_SURFACE", 0.0, 100),
+        ("Frictional_sides", "*CONTACT_AUTOMATIC_SURFACE_TO_SURFACE", 0.2, 102)]
+    assert list(regions[0]['source']) == list(resolver.nodes([3]))
+
+
+def test_contacts_outside_subset_are_skipped():
+    nodes, _elems, cr_list, resolver = _setup()
+    body_1 = core.NodeTable()
+    for i in range(len(nodes) // 2):
+        body_1.add(nodes.ids[i], *nodes.xyz[3 * i:3 * i + 3])
+    body_1.freeze()
+    log = []
+    assert contacts.read_contact_regions(cr_list, resolver, body_1, log.append) == []
+    assert log[0] == "  [CONTACT] Bonded_1_2: extends outside the subset (skipped)"
+
+
+def test_finer_side_is_slave():
+    for coarse_body, source_is_slave in ((1, True), (0, False)):
+        nodes, elems, cr_list, resolver = _setup(coarse_body)
+        regions = contacts.read_contact_regions(cr_list[:1], resolver)
+        faces = core.extract_boundary_faces(elems)
+        log = []
+        c, = contacts.pair_contacts(regions, faces, nodes, log.append)
+        source = meshdata.region_faces(faces, regions[0]['source'])
+        assert len(source) == 9
+        if source_is_slave:
+            assert (c['slave_id'], c['master_id']) == (100, 101)
+            assert list(c['slave']) == list(source)
+        else:
+            assert (c['slave_id'], c['master_id']) == (101, 100)
+            assert list(c['master']) == list(source)
+        assert any("mesh density differs 4.0x" in line for line in log)
+
+
+def test_unmatched_region_is_dropped():
+    nodes, elems, cr_list, resolver = _setup()
+    regions = [{'name': "Nowhere", 'kw': "*CONTACT_AUTOMATIC_SURFACE_TO_SURFACE",
+                'mu': 0.0, 'seg_id': 100, 'source': array('i', [9999]),
+                'target': array('i')}]
+    log = []
+    faces = core.extract_boundary_faces(elems)
+    assert contacts.pair_contacts(regions, faces, nodes, log.append) == []
+    assert log == ["  [CONTACT] No segments matched: Nowhere"]
+
+
+def test_whole_part_side_uses_part_id():
+    nodes, elems, cr_list, resolver = _setup()
+    faces = core.extract_boundary_faces(elems)
+    half = len(nodes) // 2
+    regions = [{'name': "Wrap", 'kw': "*CONTACT_TIED_SURFACE_TO_SURFACE", 'mu': 0.0,
+                'seg_id': 100, 'source': array('i', nodes.ids[:half]),
+                'target': resolver.nodes([4])}]
+    pairs = contacts.pair_contacts(regions, faces, nodes)
+    contacts.mark_whole_part_sides(elems, faces, pairs)
+    c, = pairs
+    sides = {c['slave_id']: c['slave_pid'], c['master_id']: c['master_pid']}
+    assert sides == {100: 1, 101: 0}
@@ -0,0 +1,79 @@
+# encoding: utf-8
+import sys
+from array import array
+
+import pytest
+
+from kfile import core
+
+
+def test_array_bytes():
+    a = array('i', [1, 2, 3])
+    assert core.array_bytes(a) == a.tobytes()
+    assert len(core.array_bytes(array('d', [0.5]))) == 8
+
+
+def test_dump_round_trip(tmp_path, hex_mesh):
+    nodes, elems = hex_mesh
+    faces = core.extract_boundary_faces(elems)
+    body_pid_map = {"Bottom": 1, "Top": 2}
+    mat_rows = [(1, 7850.0, 2.0e11, 0.3), (2, 2700.0, 7.0e10, 0.33)]
+    ns_sets = [("Fix", array('i', [1, 2, 3])), ("Empty", array('i'))]
+    contacts = [{'name': "C1", 'kw': "*CONTACT_AUTOMATIC_SURFACE_TO_SURFACE", 'mu': 0.2,
+                 'slave_id': 100, 'slave': array('i', [0, 2]), 'slave_pid': 0,
+                 'master_id': 101, 'master': array('i', [1]), 'master_pid': 2}]
+    path = core.write_dump(str(tmp_path / "m.kdump"), "mm", 1000.0, nodes, elems,
+                           body_pid_map, mat_rows, ns_sets, faces, contacts)
+    assert not (tmp_path / "m.kdump.tmp").exists()
+
+    dump = core.read_dump(path)
+    assert (dump.unit_label, dump.scale) == ("mm", 1000.0)
+    assert dump.body_pid_map == body_pid_map
+    assert dump.node_table.ids == nodes.ids and dump.node_table.xyz == nodes.xyz
+    for name in ('ids', 'pids', 'shell', 'conn', 'offsets'):
+        assert getattr(dump.elem_table, name) == getattr(elems, name)
+    assert dump.mat_rows == mat_rows
+    assert dump.ns_sets == ns_sets
+    assert dump.surface_faces.nodes == faces.nodes
+    assert dump.surface_faces.rows == faces.rows
+    c = dump.contacts[0]
+    assert (c['name'], c['mu'], c['slave_id'], c['master_pid']) == ("C1", 0.2, 100, 2)
+    assert list(c['slave']) == [0, 2] and list(c['master']) == [1]
+
+
+def test_dump_without_optional_sections(tmp_path, tet_mesh):
+    nodes, elems = tet_mesh
+    dump = core.read_dump(core.write_dump(str(tmp_path / "t.kdump"), "m", 1.0,
+                                          nodes, elems, {}))
+    assert dump.mat_rows is None and dump.ns_sets is None
+    assert dump.contact_data() is None
+    assert len(dump.node_table) == len(nodes) and len(dump.elem_table) == len(elems)
+
+
+def test_bad_magic_raises(tmp_path):
+    path = tmp_path / "bad.kdump"
+    path.write_bytes(b"NOTADUMP" + b"\0" * 16)
+    with pytest.raises(ValueError):
+        core.read_dump(str(path))
+
+
+def test_dump_from_other_byte_order(tmp_path, monkeypatch, hex_mesh):
+    nodes, elems = hex_mesh
+    other = 'big' if sys.byteorder == 'little' else 'little'
+
+    def _swapped_bytes(a):
+        a = array(a.typecode, a)
+        a.byteswap()
+        return a.tobytes()
+
+    # write as a machine of the other byte order would
+    monkeypatch.setattr(sys, 'byteorder', other)
+    monkeypatch.setattr(core, 'array_bytes', _swapped_bytes)
+    path = core.write_dump(str(tmp_path / "be.kdump"), "m", 1.0, nodes, elems,
+                           {"A": 1}, ns_sets=[("S", array('i', [1, 2]))])
+    monkeypatch.undo()
+
+    dump = core.read_dump(path)
+    assert dump.node_table.ids == nodes.ids and dump.node_table.xyz == nodes.xyz
+    assert dump.elem_table.conn == elems.conn
+    assert list(dump.ns_sets[0][1]) == [1, 2]
@@ -0,0 +1,54 @@
+# encoding: utf-8
+import math
+
+import pytest
+
+from kfile import core, meshdata
+
+
+def _stats(monkeypatch, faces, nodes, numpy):
+    if not numpy:
+        monkeypatch.setattr(core, '_np', None)
+    stats = core.FaceEdgeStats(faces, nodes)
+    monkeypatch.undo()
+    return stats
+
+
+def _without(nodes, nid):
+    table = core.NodeTable()
+    for i, n in enumerate(nodes.ids):
+        if n != nid:
+            table.add(n, *nodes.xyz[3 * i:3 * i + 3])
+    table.freeze()
+    return table
+
+
+def test_numpy_and_serial_tables_agree(monkeypatch, tet_mesh):
+    nodes, elems = tet_mesh
+    for i in range(len(nodes.xyz)):
+        nodes.xyz[i] += 1e-5 * math.sin(i)          # irregular edge lengths
+    nodes = _without(nodes, 1)                      # faces at node 1 have no edges
+    faces = core.extract_boundary_faces(elems)
+    serial = _stats(monkeypatch, faces, nodes, numpy=False)
+    fast = _stats(monkeypatch, faces, nodes, numpy=True)
+    assert list(fast.n_edges) == list(serial.n_edges)
+    assert 0 in serial.n_edges and set(serial.n_edges) == {0, 3}
+    for name in ('edge_sum', 'edge_max'):
+        assert list(getattr(fast, name)) == pytest.approx(list(getattr(serial, name)))
+    used = [f for f in range(len(faces)) if serial.n_edges[f]]
+    assert [fast.edge_min[f] for f in used] == pytest.approx(
+        [serial.edge_min[f] for f in used])
+
+
+@pytest.mark.parametrize("numpy", [True, False])
+def test_region_stats(monkeypatch, tet_mesh, numpy):
+    nodes, elems = tet_mesh
+    faces = core.extract_boundary_faces(elems)
+    stats = _stats(monkeypatch, faces, nodes, numpy)
+    top = meshdata.region_faces(faces, [n for n in range(1, 49) if (n - 1) // 16 == 2])
+    mean, lo, hi, n = stats.region(top)
+    # 9 cells x 2 triangles: two 1 mm legs and one diagonal each
+    assert n == 18 * 3
+    assert (lo, hi) == pytest.approx((1e-3, math.sqrt(2) * 1e-3))
+    assert mean == pytest.approx((2 + math.sqrt(2)) / 3 * 1e-3)
+    assert stats.region([]) == (0.0, 0.0, 0.0, 0)
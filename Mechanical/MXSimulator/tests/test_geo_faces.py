@@ -0,0 +1,40 @@
+# encoding: utf-8
+from kfile import meshdata
+
+
+class _Face(object):
+    def __init__(self, fid, pid):
+        self.Id, self.PersistentId = fid, pid
+
+
+class _Body(object):
+    def __init__(self, name, faces):
+        self.name, self._faces = name, faces
+
+    def GetGeoBody(self):
+        if self._faces is None:
+            raise RuntimeError("suppressed body")
+        return self
+
+    @property
+    def Faces(self):
+        return self._faces
+
+
+def test_index_maps_both_ids_to_face_and_body():
+    f1, f2, f3 = _Face(11, 9011), _Face(12, 9012), _Face(21, 9021)
+    b1, b2 = _Body("b1", [f1, f2]), _Body("b2", [f3])
+    index = meshdata.GeoFaceIndex([b1, b2])
+    assert index.n_faces == 3
+    assert index.body_of(12) is b1 and index.body_of(21) is b2
+    assert index.by_persistent_id[9021] == (f3, b2)
+    assert index.body_of(99) is None
+
+
+def test_first_body_wins_and_broken_bodies_are_skipped():
+    shared_a, shared_b = _Face(5, 500), _Face(5, 500)
+    b1, b2 = _Body("b1", [shared_a]), _Body("b2", [shared_b])
+    index = meshdata.GeoFaceIndex([_Body("broken", None), b1, b2])
+    assert index.n_faces == 2
+    assert index.body_of(5) is b1
+    assert index.by_persistent_id[500] == (shared_a, b1)
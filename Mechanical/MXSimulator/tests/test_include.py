@@ -0,0 +1,76 @@
+# encoding: utf-8
+import os
+from array import array
+
+import pytest
+
+from kfile import core
+
+
+def _sections(hex_mesh, tag):
+    nodes, elems = hex_mesh
+    return core.deck_sections(nodes, elems, {"Bottom": 1, "Top": 2}, 1000.0, 1,
+                              None, [(tag, array('i', [1, 2, 3]))], None)
+
+
+def _snapshot(folder):
+    return dict((name, open(os.path.join(str(folder), name)).read())
+                for name in sorted(os.listdir(str(folder))))
+
+
+def _cancel(out):
+    raise core.ExportCancelled()
+
+
+def test_cancelled_include_export_keeps_previous_deck(tmp_path, hex_mesh):
+    path = str(tmp_path / "m.k")
+    core.write_include_deck(path, core.deck_header("mm"), _sections(hex_mesh, "Old"), 1)
+    before = _snapshot(tmp_path)
+
+    sections = _sections(hex_mesh, "New")
+    sections.append(('contacts', _cancel))      # last include fails
+    with pytest.raises(core.ExportCancelled):
+        core.write_include_deck(path, core.deck_header("mm"), sections, 1)
+    assert _snapshot(tmp_path) == before
+
+
+def test_failed_include_job_leaves_no_files(tmp_path):
+    path = str(tmp_path / "m.k")
+    jobs = [('nodes', core.include_path(path, 'nodes'), lambda out: None),
+            ('sets', core.include_path(path, 'sets'), _cancel)]
+    with pytest.raises(core.ExportCancelled):
+        core.write_include_files(path, jobs, 1)
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_include_deck_matches_single_file(tmp_path, hex_mesh):
+    path = str(tmp_path / "m.k")
+    written = core.write_include_deck(
+        path, core.deck_header("mm"), _sections(hex_mesh, "Fix"), 4)
+    names = ['nodes', 'elements', 'sets']
+    assert written == [core.include_path(path, n) for n in names] + [path]
+    master = open(path).read().splitlines()
+    assert [master[i + 1] for i, l in enumerate(master) if l == "*INCLUDE"] == [
+        "m_" + n + ".k" for n in names]
+
+    single = str(tmp_path / "single.k")
+    header = core.deck_header("mm")
+    core.write_deck(single, header, _sections(hex_mesh, "Fix"))
+    included = []
+    for name in names:
+        lines = open(core.include_path(path, name)).read().splitlines()
+        assert lines[0] == "*KEYWORD" and lines[-1] == "*END"
+        included += lines[2:-1]         # minus *KEYWORD, comment and *END
+    assert included == open(single).read().splitlines()[len(header):-1]
+
+
+def test_kept_sections_stay_included(tmp_path, hex_mesh):
+    path = str(tmp_path / "m.k")
+    core.write_include_deck(path, core.deck_header("mm"), _sections(hex_mesh, "Fix"), 1)
+    sets = open(core.include_path(path, 'sets')).read()
+    nodes_only = [s for s in _sections(hex_mesh, "Fix") if s[0] == 'nodes']
+
+    core.write_include_deck(path, core.deck_header("mm"), nodes_only, 1, keep=('sets',))
+    master = open(path).read()
+    assert "m_sets.k" in master and "m_elements.k" not in master
+    assert open(core.include_path(path, 'sets')).read() == sets
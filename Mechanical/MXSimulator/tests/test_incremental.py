@@ -0,0 +1,100 @@
+# encoding: utf-8
+import os
+from array import array
+
+import pytest
+
+from kfile import core, incremental
+
+PARTS = {"Bottom": 1, "Top": 2}
+
+
+def _export(path, mesh, ns_sets, unit="mm"):
+    nodes, elems = mesh
+    log = []
+    sections = incremental.incremental_sections(
+        str(path), nodes, elems, PARTS, 1000.0, 1, None, ns_sets, None)
+    written = incremental.write_incremental_deck(
+        str(path), core.deck_header(unit), unit, sections, 1, log=log.append)
+    return [os.path.relpath(f, str(path.parent)) for f in written[:-2]], log
+
+
+def _ns(mesh):
+    return [("Fix", array('i', range(1, 17)))]
+
+
+def test_first_export_writes_everything(tmp_path, hex_mesh):
+    written, log = _export(tmp_path / "m.k", hex_mesh, _ns(hex_mesh))
+    assert sorted(written) == ["m_parts/part_1.k", "m_parts/part_2.k", "m_sets.k"]
+    assert log[0] == "Incremental: 3 of 3 include files rewritten, 0 reused"
+    master = (tmp_path / "m.k").read_text()
+    assert "*INCLUDE\nm_parts/part_1.k\n" in master and master.endswith("*END\n")
+    assert (tmp_path / "m.kmanifest.json").exists()
+
+
+def test_unchanged_export_reuses_every_file(tmp_path, hex_mesh):
+    _export(tmp_path / "m.k", hex_mesh, _ns(hex_mesh))
+    before = (tmp_path / "m_parts" / "part_1.k").stat().st_mtime_ns
+    written, log = _export(tmp_path / "m.k", hex_mesh, _ns(hex_mesh))
+    assert written == []
+    assert log == ["Incremental: 0 of 3 include files rewritten, 3 reused"]
+    assert (tmp_path / "m_parts" / "part_1.k").stat().st_mtime_ns == before
+
+
+def test_moved_node_rewrites_only_its_part(tmp_path, hex_mesh):
+    nodes, elems = hex_mesh
+    _export(tmp_path / "m.k", hex_mesh, _ns(hex_mesh))
+    nodes.xyz[3 * (len(nodes) - 1)] += 1e-4       # last node: body 2
+    written, _log = _export(tmp_path / "m.k", hex_mesh, _ns(hex_mesh))
+    assert written == ["m_parts/part_2.k"]
+
+
+def test_changed_set_is_reported(tmp_path, hex_mesh):
+    _export(tmp_path / "m.k", hex_mesh, _ns(hex_mesh))
+    ns_sets = [("Fix", array('i', range(1, 10))), ("Load", array('i', [90, 91]))]
+    written, log = _export(tmp_path / "m.k", hex_mesh, ns_sets)
+    assert written == ["m_sets.k"]
+    assert log[1] == "  Changed regions: NS:Fix, NS:Load"
+
+
+def test_missing_file_or_other_units_rewrite(tmp_path, hex_mesh):
+    _export(tmp_path / "m.k", hex_mesh, _ns(hex_mesh))
+    os.remove(str(tmp_path / "m_sets.k"))
+    assert _export(tmp_path / "m.k", hex_mesh, _ns(hex_mesh))[0] == ["m_sets.k"]
+    written, _log = _export(tmp_path / "m.k", hex_mesh, _ns(hex_mesh), unit="SI")
+    assert len(written) == 3
+
+
+def test_stale_part_file_is_removed(tmp_path, hex_mesh):
+    nodes, elems = hex_mesh
+    _export(tmp_path / "m.k", hex_mesh, _ns(hex_mesh))
+    bottom = core.ElementTable()
+    for r in range(len(elems)):
+        if elems.pids[r] == 1:
+            bottom.add(elems.ids[r], 1, elems.nodes(r), elems.shell[r])
+    _written, log = _export(tmp_path / "m.k", (nodes, bottom), _ns(hex_mesh))
+    assert "  Removed stale include: m_parts/part_2.k" in log
+    assert not (tmp_path / "m_parts" / "part_2.k").exists()
+    assert "part_2" not in (tmp_path / "m.k").read_text()
+
+
+def test_cancelled_export_keeps_previous_files(tmp_path, hex_mesh):
+    nodes, elems = hex_mesh
+    path = tmp_path / "m.k"
+    _export(path, hex_mesh, _ns(hex_mesh))
+    before = dict((str(p), p.read_bytes()) for p in tmp_path.rglob("*") if p.is_file())
+
+    nodes.xyz[0] += 1e-4                            # body 1 part changes
+    sections = incremental.incremental_sections(
+        str(path), nodes, elems, PARTS, 1000.0, 1, None,
+        [("Fix", array('i', range(1, 9)))], None)
+
+    def _cancel(out):
+        raise core.ExportCancelled()
+    sections = [s[:3] + (_cancel if s[0] == 'sets' else s[3],) + s[4:]
+                for s in sections]
+    with pytest.raises(core.ExportCancelled):
+        incremental.write_incremental_deck(
+            str(path), core.deck_header("mm"), "mm", sections, 1)
+    after = dict((str(p), p.read_bytes()) for p in tmp_path.rglob("*") if p.is_file())
+    assert after == before
@@ -0,0 +1,56 @@
+# encoding: utf-8
+import json
+import tracemalloc
+
+from kfile import bench, instrument, meshdata
+
+
+def test_call_counter_charges_calls_to_phases():
+    prof = instrument.PhaseProfile()
+    mesh = prof.count_calls(bench.SyntheticMeshData('hex', 2, 2, 1))
+    prof.mark("nodes")
+    nodes = meshdata.read_nodes(mesh)
+    prof.mark("elements")
+    meshdata.read_elements(mesh)
+    prof.mark("idle")
+    prof.finish()
+
+    assert [p['phase'] for p in prof.phases] == ["nodes", "elements", "idle"]
+    calls = [p['api_calls'] for p in prof.phases]
+    # NodeCount is read once; each NodeById is one counted call
+    assert calls == [1 + len(nodes), 1 + 8, 0]
+    assert prof.totals()['api_calls'] == sum(calls)
+    assert mesh.calls['NodeById'] == len(nodes)
+
+
+def test_python_peak_is_per_phase():
+    tracemalloc.start()
+    try:
+        prof = instrument.PhaseProfile()
+        prof.mark("big")
+        blob = bytearray(8 * 1048576)
+        del blob
+        prof.mark("small")
+        prof.finish()
+    finally:
+        tracemalloc.stop()
+    big, small = prof.phases
+    assert big['python_peak_mb'] >= 8.0 > small['python_peak_mb']
+    assert prof.totals()['python_peak_mb'] == big['python_peak_mb']
+
+
+def test_sidecar_and_table(tmp_path):
+    prof = instrument.PhaseProfile()
+    mesh = prof.count_calls(bench.SyntheticMeshData('tet', 1, 1, 1))
+    prof.mark("read")
+    meshdata.read_elements(mesh)
+    prof.finish()
+    path = prof.write(str(tmp_path / "deck.k"), info={'threads': 2})
+    assert path == str(tmp_path / "deck.kprofile.json")
+    data = json.load(open(path))
+    assert data['deck'] == "deck.k" and data['export'] == {'threads': 2}
+    assert data['api_calls_by_method'] == {'ElementCount': 1, 'ElementById': 12}
+    lines = prof.table()
+    row = lines[1].split()
+    assert row[0] == "read" and row[2] == "13"
+    assert lines[-1].split()[0] == "Total"
@@ -0,0 +1,105 @@
+# encoding: utf-8
+from kfile import bench, core, meshdata, transform
+
+TOL = 0.5e-3
+
+
+def _nodes(*points):
+    """NodeTable with ids 1..n at the given points."""
+    table = core.NodeTable()
+    for i, p in enumerate(points, 1):
+        table.add(i, *p)
+    table.freeze()
+    return table
+
+
+def _merger(table):
+    return transform.NodeMerger(table, transform.NodeGrid(table))
+
+
+def test_tolerance_is_inclusive():
+    table = _nodes((0.0, 0.0, 0.0), (TOL, 0.0, 0.0))
+    assert _merger(table).merge_interface([1], [2], TOL) == 1
+    assert _merger(table).merge_interface([1], [2], 0.999 * TOL) == -1
+
+
+def test_nearest_master_wins():
+    table = _nodes((0.0, 0.0, 0.0), (0.4e-3, 0.0, 0.0), (0.1e-3, 0.0, 0.0))
+    merger = _merger(table)
+    assert merger.merge_interface([1], [3], TOL) == 1
+    merger.apply(core.ElementTable())
+    assert merger.node_id(1) == 3 and merger.node_id(2) == 2
+
+
+def test_non_conforming_interface_is_left_alone():
+    # master node 3 has no slave partner
+    table = _nodes((0.0, 0.0, 0.0), (0.0, 0.0, 0.0), (1.0, 0.0, 0.0))
+    merger = _merger(table)
+    assert merger.merge_interface([1], [2, 3], TOL) == -1
+    assert merger.n_merged == 0
+
+
+def test_merges_are_transitive():
+    # 1 -> 2 on one interface, 2 -> 3 on the next: all three become node 3
+    for order in ([([1], [2]), ([2], [3])], [([2], [3]), ([1], [2])]):
+        table = _nodes((0.0, 0.0, 0.0), (0.0, 0.0, 0.0), (0.0, 0.0, 0.0))
+        merger = _merger(table)
+        for slave, master in order:
+            assert merger.merge_interface(slave, master, TOL) == 1
+        merger.apply(core.ElementTable())
+        assert [merger.node_id(n) for n in (1, 2, 3)] == [3, 3, 3]
+        assert list(merger.node_table.ids) == [3]
+        assert merger.n_merged == 2
+
+
+def _bonded_blocks():
+    mesh = bench.SyntheticMeshData('hex', 3, 3, 2)
+    nodes, elems = meshdata.read_nodes(mesh), meshdata.read_elements(mesh)
+    faces = core.extract_boundary_faces(elems)
+    resolver = meshdata.RegionNodeResolver(mesh)
+    bonded = {'name': "Bond", 'kw': "*CONTACT_TIED_SURFACE_TO_SURFACE", 'mu': 0.0,
+              'slave_id': 100, 'master_id': 101,
+              'slave': meshdata.region_faces(faces, resolver.nodes([4])),
+              'master': meshdata.region_faces(faces, resolver.nodes([3]))}
+    sliding = {'name': "Sides", 'kw': "*CONTACT_AUTOMATIC_SURFACE_TO_SURFACE", 'mu': 0.2,
+               'slave_id': 102, 'master_id': 103,
+               'slave': meshdata.region_faces(faces, resolver.nodes([6])),
+               'master': meshdata.region_faces(faces, resolver.nodes([5]))}
+    return nodes, elems, faces, resolver, [bonded, sliding]
+
+
+def test_bonded_interface_merge_remaps_sets_and_segments():
+    nodes, elems, faces, resolver, contacts = _bonded_blocks()
+    merger, kept = transform.merge_bonded_contacts(nodes, faces, contacts, TOL)
+    assert [c['name'] for c in kept] == ["Sides"]
+    assert merger.n_merged == 16
+    assert merger.apply(elems) == 0
+    assert len(merger.node_table) == len(nodes) - 16
+
+    # every element node still exists and sits where it did before
+    for r in range(len(elems)):
+        for old, new in zip(elems.nodes(r), merger.elem_table.nodes(r)):
+            assert merger.node_table.coords(new) == nodes.coords(old)
+    # the two blocks now share the interface: 2 x 9 faces become interior
+    merged_faces = core.extract_boundary_faces(merger.elem_table)
+    assert len(merged_faces) == len(faces) - 18
+
+    # an NS on the body 2 bottom now names the body 1 top nodes
+    bottom2 = merger.node_ids(resolver.nodes([4]))
+    assert list(bottom2) == list(resolver.nodes([3]))
+    # segment sets of kept contacts resolve to the same corner coordinates
+    new_faces = merger.boundary_faces(faces)
+    for f in list(kept[0]['slave']) + list(kept[0]['master']):
+        assert [merger.node_table.coords(n) for n in new_faces.face_nodes(f)] == \
+            [nodes.coords(n) for n in faces.face_nodes(f)]
+
+
+def test_oversized_tolerance_reports_collapsed_elements():
+    # one hex: its top face merged onto its bottom face
+    table = _nodes(*[(x, y, z) for z in (0.0, 1e-3) for y in (0.0, 1e-3)
+                     for x in (0.0, 1e-3)])
+    elems = core.ElementTable()
+    elems.add(1, 1, [1, 2, 4, 3, 5, 6, 8, 7], False)
+    merger = _merger(table)
+    assert merger.merge_interface([5, 6, 7, 8], [1, 2, 3, 4], 2e-3) == 4
+    assert merger.apply(elems) == 1
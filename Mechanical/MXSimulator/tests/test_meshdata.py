@@ -0,0 +1,155 @@
+# encoding: utf-8
+from kfile import bench, core, meshdata
+
+
+class _IndexOnlyMesh(bench.SyntheticMeshData):
+    """MeshData whose ElementById is unavailable (ElementByIndex fallback)."""
+
+    def ElementById(self, eid):
+        raise AttributeError("ElementById")
+
+    def ElementByIndex(self, i):
+        return bench.SyntheticMeshData.ElementById(self, i + 1)
+
+
+def test_read_elements_single_table():
+    mesh = bench.SyntheticMeshData('tet', 2, 2, 1)
+    calls = mesh.api_calls
+    elems = meshdata.read_elements(mesh)
+    assert mesh.api_calls - calls == mesh.ElementCount
+    assert len(elems) == 48 and list(elems.ids) == list(range(1, 49))
+    assert sorted(set(elems.pids)) == [1, 2] and not any(elems.shell)
+    assert list(elems.offsets) == list(range(0, 4 * 49, 4))
+    assert list(elems.nodes(0)) == list(mesh.ElementById(1).NodeIds)
+    # The same table feeds face extraction: 2 bodies x 16 cube faces x 2 tris
+    assert len(core.extract_boundary_faces(elems)) == 2 * 16 * 2
+
+
+def test_read_elements_falls_back_to_index():
+    log = []
+    elems = meshdata.read_elements(_IndexOnlyMesh('hex', 2, 2, 1), log.append)
+    assert len(elems) == 8 and list(elems.ids) == list(range(1, 9))
+    assert "  [ELEM] kHex8: 8 solids" in log
+
+
+def test_resolver_batches_every_requested_region():
+    mesh = bench.SyntheticMeshData('hex', 3, 3, 2)
+    resolver = meshdata.RegionNodeResolver(mesh)
+    resolver.request([1, 3])
+    resolver.request([3, 5])
+    resolver.resolve()
+    assert resolver.api_calls == 1 and len(resolver) == 3
+    top_and_side = resolver.nodes([3, 5])
+    assert resolver.api_calls == 1          # assembled from the cache
+    assert list(top_and_side) == sorted(set(mesh._region(3)) | set(mesh._region(5)))
+    assert list(resolver.nodes([1])) == sorted(mesh._region(1))
+
+
+def test_bad_region_falls_back_to_one_call_per_region():
+    mesh = bench.SyntheticMeshData('hex', 3, 3, 2)
+    resolver = meshdata.RegionNodeResolver(mesh)
+    resolver.request([2, 77, 4])
+    resolver.resolve()
+    assert resolver.api_calls == 1 + 3
+    assert len(resolver.nodes([77])) == 0
+    assert len(resolver.nodes([2, 4])) == 2 * 16
+    resolver.resolve()                      # nothing pending
+    assert resolver.api_calls == 4
+
+
+class _Elem(object):
+    def __init__(self, eid, nids, etype, **attrs):
+        self.Id, self.NodeIds, self.ElementType = eid, nids, etype
+        self.__dict__.update(attrs)
+
+
+class _ElemMesh(object):
+    """MeshData stand-in over a list of elements; None entries fail."""
+
+    def __init__(self, elems):
+        self.elems = elems
+
+    @property
+    def ElementCount(self):
+        return len(self.elems)
+
+    def ElementById(self, eid):
+        elem = self.elems[eid - 1]
+        if elem is None:
+            raise KeyError(eid)
+        return elem
+
+
+def test_accessor_probes_part_attribute_once():
+    acc = meshdata.ElementAccessor(_Elem(1, [1, 2, 3], 'kTri3', Part="x", BodyId=7))
+    assert acc.pid_attr == 'BodyId'
+    assert acc.part_id(_Elem(2, [1, 2, 3], 'kTri3', BodyId="12")) == 12
+    assert meshdata.ElementAccessor(_Elem(1, [1], 'kTri3')).part_id(None) == 1
+
+
+def test_element_types_are_classified_once():
+    elems = [_Elem(1, [1, 2, 3, 4], 'Type.kQuad4', PartId=1),
+             _Elem(2, [1, 2, 3, 4], 'Type.kTet4', PartId=2),
+             _Elem(3, [5, 6, 7, 8], 'Type.kQuad4', PartId=1),
+             _Elem(4, [1, 2, 3], 'Type.kShellTri', PartId=1)]
+    log = []
+    table = meshdata.read_elements(_ElemMesh(elems), log.append)
+    assert list(table.shell) == [1, 0, 1, 1]
+    assert list(table.pids) == [1, 2, 1, 1]
+    assert log == ["  [ELEM] part id from PartId", "  [ELEM] kQuad4: 2 shells",
+                   "  [ELEM] kTet4: 1 solids", "  [ELEM] kShellTri: 1 shells"]
+
+
+def test_unreadable_elements_are_counted_and_skipped():
+    elems = [None, _Elem(2, [1, 2, 3, 4], 'kTet4', PartId=3), None, None,
+             _Elem(5, [2, 3, 4, 5], 'kTet4', PartId=3), None]
+    log = []
+    table = meshdata.read_elements(_ElemMesh(elems), log.append)
+    assert list(table.ids) == [2, 5]
+    assert log[0] == "  [ELEM] WARNING: 4 elements could not be read (skipped)"
+
+
+class _Region(object):
+    def __init__(self, eids):
+        self.ElementIds = eids
+
+
+class _BodyMesh(bench.SyntheticMeshData):
+    """Synthetic MeshData with per-body mesh regions (region id = body 1/2)."""
+
+    def MeshRegionById(self, bid):
+        if bid not in (1, 2):
+            raise KeyError(bid)
+        per_body = self.ElementCount // 2
+        return _Region(range((bid - 1) * per_body + 1, bid * per_body + 1))
+
+
+def _same_tables(a, b):
+    (na, ea), (nb, eb) = a, b
+    assert list(na.ids) == list(nb.ids) and list(na.xyz) == list(nb.xyz)
+    assert list(ea.ids) == list(eb.ids) and list(ea.conn) == list(eb.conn)
+    assert list(ea.pids) == list(eb.pids)
+
+
+def test_subset_reads_only_the_selected_body():
+    mesh = _BodyMesh('tet', 2, 2, 1)
+    full = meshdata.read_nodes(mesh), meshdata.read_elements(mesh)
+    calls = mesh.api_calls
+    nodes, elems = meshdata.read_subset(mesh, [2])
+    assert mesh.api_calls - calls == 24 + 18       # body 2 elements + nodes
+    assert set(elems.pids) == {2} and len(elems) == 24
+    assert list(nodes.ids) == sorted(set(elems.conn))
+    _same_tables((nodes, elems), meshdata.filter_parts(full[0], full[1], [2]))
+    assert meshdata.contains_all(nodes, [19, 36])
+    assert not meshdata.contains_all(nodes, [1, 19])
+
+
+def test_subset_logs_missing_bodies():
+    log = []
+    nodes, elems = meshdata.read_subset(_BodyMesh('hex', 2, 2, 1), [1, 9], log.append)
+    assert len(elems) == 4 and len(nodes) == 18
+    assert log[0].startswith("  [SUBSET] body 9: no mesh region")
+
+
+def test_subset_needs_mesh_regions():
+    assert meshdata.read_subset(bench.SyntheticMeshData('hex', 2, 2, 1), [1]) is None
@@ -0,0 +1,58 @@
+# encoding: utf-8
+import math
+import random
+
+import pytest
+
+from kfile import transform
+
+
+def _brute_plane(nodes, c, nrm, tol):
+    xyz = nodes.xyz
+    return sorted(i for i in range(len(nodes))
+                  if abs(sum((xyz[3 * i + a] - c[a]) * nrm[a] for a in range(3))) <= tol)
+
+
+def _unit(v):
+    m = math.sqrt(sum(x * x for x in v))
+    return tuple(x / m for x in v)
+
+
+@pytest.mark.parametrize("nrm", [(0, 0, 1), (1, 0, 0), (0, -1, 0),
+                                 (1, 1, 0), (1, 2, 3), (-0.2, 0.1, 1.0)])
+@pytest.mark.parametrize("kind", ["hex", "tet"])
+def test_query_plane_matches_brute_force(request, kind, nrm):
+    nodes, _elems = request.getfixturevalue(kind + "_mesh")
+    grid = transform.NodeGrid(nodes)
+    nrm = _unit(nrm)
+    for c in [(0.0, 0.0, 0.0), (1e-3, 1e-3, 2e-3), (1.5e-3, 0.7e-3, 3.1e-3)]:
+        for tol in (1e-9, 0.3e-3, 1e-3):
+            assert sorted(grid.query_plane(c, nrm, tol)) == \
+                _brute_plane(nodes, c, nrm, tol)
+
+
+def test_query_box_and_radius(hex_mesh):
+    nodes, _elems = hex_mesh
+    grid = transform.NodeGrid(nodes)
+    xyz = nodes.xyz
+    rng = random.Random(3)
+    for _ in range(20):
+        p = [rng.uniform(-1e-3, 4e-3) for _ in range(3)]
+        r = rng.uniform(0.0, 2e-3)
+        brute = [i for i in range(len(nodes))
+                 if sum((xyz[3 * i + a] - p[a]) ** 2 for a in range(3)) <= r * r]
+        assert sorted(grid.query_radius(p, r)) == brute
+
+
+def test_plane_node_ids_unions_faces(hex_mesh):
+    nodes, _elems = hex_mesh
+    grid = transform.NodeGrid(nodes)
+    # the bottom (z = 0) and x = 0 faces of the stacked blocks
+    planes = [((1e-3, 1e-3, 0.0), (0.0, 0.0, -1.0)),
+              ((0.0, 1e-3, 1e-3), (-1.0, 0.0, 0.0))]
+    ids = transform.plane_node_ids(grid, planes, 1e-6)
+    expected = sorted(set(nodes.ids[i] for c, n in planes
+                          for i in _brute_plane(nodes, c, n, 1e-6)))
+    assert list(ids) == expected
+    assert len(ids) == 16 + 2 * 12 - 4    # z = 0 face + x = 0 face of each block
+    assert list(transform.plane_node_ids(grid, [], 1e-6)) == []
@@ -0,0 +1,51 @@
+# encoding: utf-8
+from array import array
+
+from kfile import cli, core, reader
+
+PARTS = {"Bottom": 1, "Top": 2}
+
+
+def _write(path, mesh, ns_sets, slave_pid=1):
+    nodes, elems = mesh
+    faces = core.extract_boundary_faces(elems)
+    top = array('i', [f for f in range(len(faces)) if elems.pids[faces.rows[f]] == 2])
+    contacts = [{'name': "Bond", 'kw': "*CONTACT_TIED_SURFACE_TO_SURFACE", 'mu': 0.0,
+                 'slave_id': 100, 'slave': array('i'), 'slave_pid': slave_pid,
+                 'master_id': 101, 'master': top, 'master_pid': 0}]
+    sections = core.deck_sections(nodes, elems, PARTS, 1000.0, 1, None,
+                                  ns_sets, (faces, contacts), compact_sets=True)
+    core.write_deck(str(path), core.deck_header("mm"), sections)
+    return reader.validate(reader.read_deck(str(path)))
+
+
+def test_exported_deck_validates(tmp_path, hex_mesh):
+    n = len(hex_mesh[0])
+    rep = _write(tmp_path / "ok.k", hex_mesh,
+                 [("All", array('i', range(1, n + 1))), ("Odd", array('i', [1, 3, 5]))])
+    assert rep.ok, rep.errors
+    deck = rep.deck
+    assert [ranges for _title, ranges in deck.node_ranges.values()] == [[(1, n)]]
+    assert [list(ids) for _title, ids in deck.node_sets.values()] == [[1, 3, 5]]
+    c = deck.contacts[0]
+    assert (c['ssid'], c['sstyp'], c['mstyp']) == (1, 3, 0)
+    assert len(deck.segment_sets) == 1
+
+
+def test_generate_range_with_undefined_nodes(tmp_path, hex_mesh):
+    n = len(hex_mesh[0])
+    rep = _write(tmp_path / "range.k", hex_mesh,
+                 [("Over", array('i', range(n - 4, n + 6)))])
+    assert not rep.ok
+    assert any("range {0}-{1} has undefined node ids".format(n - 4, n + 5) in e
+               for e in rep.errors)
+
+
+def test_part_side_with_undefined_part(tmp_path, hex_mesh):
+    rep = _write(tmp_path / "part.k", hex_mesh, None, slave_pid=9)
+    assert any("SURFA part 9 is not defined" in e for e in rep.errors), rep.errors
+
+
+def test_check_missing_file(tmp_path, capsys):
+    assert cli.main(['check', str(tmp_path / "missing.k")]) == 1
+    assert "ERROR: cannot read" in capsys.readouterr().out
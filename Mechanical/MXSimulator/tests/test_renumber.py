@@ -0,0 +1,91 @@
+# encoding: utf-8
+import random
+from array import array
+
+import pytest
+
+from kfile import core, transform
+
+
+def _coords_by_element(node_table, elem_table):
+    """Per element (in row order) the coordinates of its nodes."""
+    return [[node_table.coords(n) for n in elem_table.nodes(r)]
+            for r in range(len(elem_table))]
+
+
+def _scrambled(mesh, seed=1):
+    """Copy of a mesh with sparse, shuffled node and element ids."""
+    nodes, elems = mesh
+    rng = random.Random(seed)
+    new_ids = rng.sample(range(10, 10 * len(nodes)), len(nodes))
+    id_of = dict(zip(nodes.ids, new_ids))
+    out_nodes = core.NodeTable()
+    for i in rng.sample(range(len(nodes)), len(nodes)):
+        out_nodes.add(new_ids[i], *nodes.coords(nodes.ids[i]))
+    out_nodes.freeze()
+    out_elems = core.ElementTable()
+    for r in range(len(elems)):
+        out_elems.add(1000 + 7 * r, elems.pids[r],
+                      [id_of[n] for n in elems.nodes(r)], elems.shell[r])
+    return out_nodes, out_elems
+
+
+@pytest.mark.parametrize("rcm", [False, True])
+@pytest.mark.parametrize("kind", ["hex", "tet"])
+def test_connectivity_keeps_coordinates(request, kind, rcm):
+    nodes, elems = _scrambled(request.getfixturevalue(kind + "_mesh"))
+    renum = transform.Renumbering(nodes, elems, rcm=rcm)
+    assert list(renum.node_table.ids) == list(range(1, len(nodes) + 1))
+    assert list(renum.elem_table.ids) == list(range(1, len(elems) + 1))
+    assert renum.elem_table.pids == elems.pids
+    assert _coords_by_element(renum.node_table, renum.elem_table) == \
+        _coords_by_element(nodes, elems)
+
+
+def test_rcm_reduces_bandwidth_of_scrambled_mesh(hex_mesh):
+    nodes, elems = _scrambled(hex_mesh)
+    renum = transform.Renumbering(nodes, elems, rcm=True)
+    assert renum.rcm
+    assert renum.after[0] < renum.before[0] and renum.after[1] < renum.before[1]
+    plain = transform.Renumbering(nodes, elems, rcm=False)
+    assert renum.after[1] < plain.after[1]
+
+
+def test_rcm_kept_only_when_better(hex_mesh):
+    nodes, elems = hex_mesh
+    renum = transform.Renumbering(nodes, elems, rcm=True)
+    plain = transform.Renumbering(nodes, elems, rcm=False)
+    assert renum.after[1] <= plain.after[1]
+    if not renum.rcm:
+        assert renum.node_table.xyz == nodes.xyz
+
+
+def test_sets_and_faces_follow_the_node_map(hex_mesh):
+    nodes, elems = _scrambled(hex_mesh)
+    renum = transform.Renumbering(nodes, elems, rcm=True)
+    some = list(nodes.ids[:5])
+    new = renum.node_ids(some + [999999])          # unknown id is dropped
+    assert sorted(renum.node_table.coords(n) for n in new) == \
+        sorted(nodes.coords(n) for n in some)
+    assert renum.node_id(999999) == 0
+
+    faces = core.extract_boundary_faces(elems)
+    new_faces = renum.boundary_faces(faces)
+    assert new_faces.rows == faces.rows
+    assert list(new_faces.eids) == [r + 1 for r in faces.rows]
+    for f in range(len(faces)):
+        assert [renum.node_table.coords(n) for n in new_faces.face_nodes(f)] == \
+            [nodes.coords(n) for n in faces.face_nodes(f)]
+
+
+def test_unreferenced_nodes_are_numbered_last(hex_mesh):
+    nodes, elems = _scrambled(hex_mesh)
+    extra = core.NodeTable()
+    extra.add(5, 9.0, 9.0, 9.0)                  # no element uses it
+    for i in range(len(nodes)):
+        extra.add(nodes.ids[i], *nodes.coords(nodes.ids[i]))
+    extra.freeze()
+    renum = transform.Renumbering(extra, elems, rcm=True)
+    assert renum.rcm
+    assert renum.node_id(5) == len(extra)
+    assert renum.node_table.coords(len(extra)) == (9.0, 9.0, 9.0)
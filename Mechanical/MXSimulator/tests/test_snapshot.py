@@ -0,0 +1,76 @@
+# encoding: utf-8
+import pytest
+
+from kfile import snapshot
+
+
+@pytest.mark.parametrize("n, k, ids", [
+    (0, 8, []),
+    (-1, 8, []),
+    (1, 8, [1]),
+    (5, 8, [1, 2, 3, 4, 5]),
+    (8, 8, list(range(1, 9))),
+])
+def test_sample_ids_small(n, k, ids):
+    assert snapshot._sample_ids(n, k) == ids
+
+
+@pytest.mark.parametrize("n, k", [(9, 8), (100, 32), (12345, 32), (10 ** 7, 64)])
+def test_sample_ids_spread(n, k):
+    ids = snapshot._sample_ids(n, k)
+    assert ids[0] == 1 and ids[-1] == n
+    assert 2 <= len(ids) <= k
+    assert ids == sorted(set(ids))
+
+
+def test_table_digest_sees_every_node(hex_mesh):
+    nodes, elems = hex_mesh
+    before = snapshot.table_digest(nodes, elems)
+    assert snapshot.table_digest(nodes, elems) == before
+    nodes.xyz[3 * (len(nodes) // 2) + 2] += 1e-9       # not a sampled node
+    assert snapshot.table_digest(nodes, elems) != before
+
+
+@pytest.fixture
+def cache():
+    c = snapshot.NodeSetCache()
+    c.put(7, "def", "mesh", [1, 2, 3])
+    return c
+
+
+def _counts(c):
+    return c.hits, c.misses, c.stale
+
+
+def test_node_set_cache_hit(cache):
+    assert cache.get(7, "def", "mesh") == [1, 2, 3]
+    assert cache.get(7, "def", "mesh", lambda ids: True) == [1, 2, 3]
+    assert _counts(cache) == (2, 0, 0)
+
+
+def test_node_set_cache_miss(cache):
+    assert cache.get(8, "def", "mesh") is None
+    assert _counts(cache) == (0, 1, 0)
+
+
+@pytest.mark.parametrize("definition, mesh", [("def2", "mesh"), ("def", "mesh2")])
+def test_node_set_cache_stale(cache, definition, mesh):
+    assert cache.get(7, definition, mesh) is None
+    assert _counts(cache) == (0, 1, 1)
+    cache.put(7, definition, mesh, [4])
+    assert cache.get(7, definition, mesh) == [4]
+
+
+def test_node_set_cache_invalid_entry_dropped(cache):
+    assert cache.get(7, "def", "mesh", lambda ids: False) is None
+    assert _counts(cache) == (0, 1, 1)
+    assert len(cache) == 0
+    assert cache.get(7, "def", "mesh") is None
+
+
+def test_node_set_cache_unknown_definition(cache):
+    assert cache.get(7, None, "mesh") is None
+    cache.put(7, None, "mesh", [1])
+    assert len(cache) == 0
+    cache.reset_counts()
+    assert _counts(cache) == (0, 0, 0)
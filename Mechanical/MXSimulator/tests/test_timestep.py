@@ -0,0 +1,68 @@
+# encoding: utf-8
+import math
+
+import pytest
+
+from kfile import core
+
+STEEL = (1, "steel", 7850.0, 2.0e11, 0.3)
+ALU = (2, "aluminium", 2700.0, 7.0e10, 0.33)
+
+
+def _solid_c(rho, E, nu):
+    return math.sqrt(E * (1 - nu) / ((1 + nu) * (1 - 2 * nu) * rho))
+
+
+def test_hex_cell_dt_is_edge_over_wave_speed(hex_mesh):
+    nodes, elems = hex_mesh
+    est = core.TimeStepEstimate(nodes, elems, [STEEL, ALU], 1.0)
+    steel = _solid_c(*STEEL[2:])
+    alu = _solid_c(*ALU[2:])
+    for r in range(len(elems)):
+        c = steel if elems.pids[r] == 1 else alu
+        assert est.le[r] == pytest.approx(1e-3)
+        assert est.dt[r] == pytest.approx(1e-3 / c)
+        assert est.mass[r] == pytest.approx((7850.0 if elems.pids[r] == 1 else 2700.0) * 1e-9)
+
+
+def test_scale_applies_to_lengths(hex_mesh):
+    nodes, elems = hex_mesh
+    est = core.TimeStepEstimate(nodes, elems, [STEEL, ALU], 1000.0)
+    assert est.le[0] == pytest.approx(1.0)
+
+
+def test_part_without_material_is_skipped(hex_mesh):
+    nodes, elems = hex_mesh
+    est = core.TimeStepEstimate(nodes, elems, [STEEL], 1.0)
+    for r in range(len(elems)):
+        if elems.pids[r] == 2:
+            assert est.dt[r] == float('inf') and est.mass[r] == 0.0
+    assert set(est.per_part()) == {1, 2}
+    assert elems.pids[est.smallest(1)[0]] == 1
+
+
+@pytest.mark.skipif(core._np is None, reason="NumPy not installed")
+@pytest.mark.parametrize("mesh", ["hex_mesh", "tet_mesh"])
+def test_numpy_and_serial_paths_agree(mesh, request, monkeypatch):
+    nodes, elems = request.getfixturevalue(mesh)
+    vectorised = core.TimeStepEstimate(nodes, elems, [STEEL, ALU], 1000.0)
+    monkeypatch.setattr(core, "_np", None)
+    serial = core.TimeStepEstimate(nodes, elems, [STEEL, ALU], 1000.0)
+    assert list(vectorised.dt) == pytest.approx(list(serial.dt), rel=1e-12)
+    assert list(vectorised.mass) == pytest.approx(list(serial.mass), rel=1e-12)
+    assert vectorised.mass_scaling() == pytest.approx(serial.mass_scaling())
+
+
+def test_shell_characteristic_length():
+    nodes = core.NodeTable()
+    for nid, xyz in enumerate([(0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0)], 1):
+        nodes.add(nid, *map(float, xyz))
+    nodes.freeze()
+    elems = core.ElementTable()
+    elems.add(1, 1, [1, 2, 3, 4], True)     # unit quad: Le = A / L_max
+    elems.add(2, 1, [1, 2, 3], True)        # right triangle: Le = 2A / L_max
+    est = core.TimeStepEstimate(nodes, elems, [STEEL], 1.0)
+    assert est.le[0] == pytest.approx(1.0)
+    assert est.le[1] == pytest.approx(1.0 / math.sqrt(2.0))
+    c_shell = math.sqrt(2.0e11 / (7850.0 * (1 - 0.09)))
+    assert est.dt[0] == pytest.approx(1.0 / c_shell)
@@ -0,0 +1,93 @@
+# encoding: utf-8
+from array import array
+
+import pytest
+
+from kfile import core
+
+
+class _Lines(list):
+    """KFileWriter stand-in collecting appended lines and written blocks."""
+
+    def write_block(self, text, n_lines):
+        self.append(text)
+
+
+@pytest.mark.parametrize("rows", [None, array('i', [5, 0, 17, 3])])
+def test_node_cards_same_with_and_without_numpy(monkeypatch, hex_mesh, rows):
+    nodes, _elems = hex_mesh
+    nodes.xyz[4] = -0.0
+    nodes.xyz[7] = -1.25e-7
+
+    def _cards():
+        out = _Lines()
+        core.write_nodes(out, nodes, 1000.0, 1, rows)
+        return "".join(line if line.endswith("\n") else line + "\n" for line in out)
+
+    with_np = _cards()
+    monkeypatch.setattr(core, '_np', None)
+    assert _cards() == with_np
+    assert with_np.count("\n") == 3 + (len(rows) if rows is not None else len(nodes))
+
+
+def test_writer_flushes_in_chunks(tmp_path):
+    path = str(tmp_path / "deck.k")
+    with core.KFileWriter(path, chunk_lines=3) as out:
+        for i in range(7):
+            out.append("line %d" % i)
+            assert out.lines_written == 3 * ((i + 1) // 3)
+        out.write_block("block a\nblock b\n", 2)
+        assert out.lines_written == 9
+        assert not (tmp_path / "deck.k").exists()
+    assert (tmp_path / "deck.k").read_text() == "".join(
+        "line %d\n" % i for i in range(7)) + "block a\nblock b\n"
+    assert not (tmp_path / "deck.k.tmp").exists()
+
+
+def test_failed_write_keeps_previous_file(tmp_path):
+    path = tmp_path / "deck.k"
+    path.write_text("old deck\n")
+    with pytest.raises(ValueError):
+        with core.KFileWriter(str(path), chunk_lines=2) as out:
+            for i in range(5):
+                out.append("new %d" % i)
+            raise ValueError("formatting failed")
+    assert path.read_text() == "old deck\n"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["deck.k"]
+
+
+def test_cancel_stops_at_next_flush(tmp_path):
+    progress = core.Progress()
+    path = str(tmp_path / "deck.k")
+    with pytest.raises(core.ExportCancelled):
+        with core.KFileWriter(path, chunk_lines=2, progress=progress) as out:
+            out.append("a")
+            progress.cancel()
+            out.append("b")
+    assert list(tmp_path.iterdir()) == []
+
+
+def _fmt(lo, hi):
+    return "".join("%8d\n" % i for i in range(lo, hi))
+
+
+def test_format_chunks_same_for_any_worker_count():
+    serial = list(core.format_chunks(50, _fmt, 1, chunk=7))
+    assert [n for _t, n in serial] == [7] * 7 + [1]
+    assert "".join(t for t, _n in serial) == _fmt(0, 50)
+    assert list(core.format_chunks(50, _fmt, 3, chunk=7)) == serial
+
+
+def test_cards_same_for_any_worker_count(monkeypatch, tet_mesh):
+    nodes, elems = tet_mesh
+    chunks = core.format_chunks
+    monkeypatch.setattr(core, 'format_chunks',
+                        lambda n, fmt, threads: chunks(n, fmt, threads, chunk=7))
+
+    def _deck(threads):
+        out = _Lines()
+        core.write_nodes(out, nodes, 1000.0, threads)
+        core.write_elements_parts(out, elems, {"Bottom": 1, "Top": 2}, threads)
+        return "".join(line if line.endswith("\n") else line + "\n" for line in out)
+
+    assert _deck(4) == _deck(1)